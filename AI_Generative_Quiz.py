@@ -1,7 +1,17 @@
 import streamlit as st
 from google import genai
+import json
+import logging
 import os
+import random
 import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
 
 def initialize_session_state():
     if 'quiz' not in st.session_state:
@@ -15,94 +25,435 @@ def initialize_session_state():
     if 'quiz_finished' not in st.session_state:
         st.session_state.quiz_finished = False
 
-# Configure Gemini client
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY", "REPLACE_API_KEY"))
+# Built once per server process, not on every rerun of the script
+@st.cache_resource
+def get_client():
+    return genai.Client(api_key=os.getenv("GEMINI_API_KEY", "REPLACE_API_KEY"))
 
-def generate_quiz(topic, num_questions):
-    quiz = []
-    for _ in range(num_questions):
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=f"""
-            Create a multiple choice question about {topic} with exactly four options (A-D). 
-            Follow this exact format:
-
-            **Question:** [Your question here]
-            
-            A) [Option A]
-            B) [Option B]
-            C) [Option C]
-            D) [Option D]
-            
-            **Correct Answer:** [Letter only: A/B/C/D]
-
-            Example:
-            **Question:** What is the capital of France?
-            
-            A) London
-            B) Berlin
-            C) Paris
-            D) Madrid
-            
-            **Correct Answer:** C
+MODEL = "gemini-2.0-flash"
+MAX_CONCURRENT_REQUESTS = 5
+MAX_ATTEMPTS_PER_QUESTION = 3
+JSON_CONFIG = {"response_mime_type": "application/json"}
+
+QUESTION_FORMAT = """
+            Each question is a JSON object with exactly these keys:
+            {"question": "What is the capital of France?",
+             "options": ["London", "Berlin", "Paris", "Madrid"],
+             "answer": "C"}
+            "options" holds exactly four answer texts (without A-D labels) and
+            "answer" is the letter (A, B, C or D) of the correct option.
+            """
+
+def build_prompt(topic):
+    return f"""
+            Create a multiple choice question about {topic} with exactly four options.
+            Reply with a single JSON object and nothing else.
+            {QUESTION_FORMAT}
             """
+
+def build_batch_prompt(topic, num_questions):
+    return f"""
+            Create {num_questions} different multiple choice questions about {topic},
+            each with exactly four options.
+            Reply with a JSON array of {num_questions} objects and nothing else.
+            {QUESTION_FORMAT}
+            """
+
+OPTION_LABEL = re.compile(r'^\s*[A-D][).:]\s+')
+
+def validate_question(item):
+    """Check one decoded question against QUESTION_FORMAT.
+
+    Returns the question in the shape the app uses ('A) ...' options plus
+    the full text of the correct one), or None if anything is off.
+    """
+    if not isinstance(item, dict):
+        return None
+    question, options, answer = item.get('question'), item.get('options'), item.get('answer')
+    if not isinstance(question, str) or not question.strip():
+        return None
+    if not isinstance(options, list) or len(options) != 4:
+        return None
+    if not all(isinstance(option, str) and option.strip() for option in options):
+        return None
+    if not isinstance(answer, str) or answer.strip().upper() not in ('A', 'B', 'C', 'D'):
+        return None
+
+    # Models sometimes label the options themselves; don't end up with "A) A) ..."
+    texts = [OPTION_LABEL.sub('', option).strip() for option in options]
+    if len(set(texts)) != 4:
+        return None
+    labelled = [f"{chr(65 + i)}) {text}" for i, text in enumerate(texts)]
+    return {
+        'question': question.strip(),
+        'options': labelled,
+        'correct_answer': labelled[ord(answer.strip().upper()) - ord('A')]
+    }
+
+def parse_questions(raw_text):
+    """Decode a JSON reply (object or array) into its valid questions."""
+    text = raw_text.strip()
+    if text.startswith("```"):
+        # Strip a ```json ... ``` fence if the model added one
+        text = text.split('\n', 1)[-1].rsplit("```", 1)[0]
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return []
+    items = data if isinstance(data, list) else [data]
+    return [question for question in map(validate_question, items) if question is not None]
+
+def parse_question(raw_text):
+    """One model response turned into a question dict, or None if it is malformed."""
+    questions = parse_questions(raw_text)
+    return questions[0] if questions else None
+
+def generate_question(topic, quiz_client=None):
+    """One API call for one question; None if the call fails or the answer is malformed."""
+    try:
+        response = (quiz_client or get_client()).models.generate_content(
+            model=MODEL,
+            contents=build_prompt(topic),
+            config=JSON_CONFIG
         )
-        
-        raw_text = response.text.strip()
-        lines = [line.strip() for line in raw_text.split('\n') if line.strip()]
-        
-        # Debugging line to see raw response
-        # print("Raw response lines:", lines)
-        # Extract question
-        question = None
-        for i, line in enumerate(lines):
-            if "**Question:**" in line:
-                question = line.replace("**Question:**", "").strip()
-                if not question and i+1 < len(lines):
-                    question = lines[i+1].strip()
-                break
-
-        # Extract options with more robust pattern
-        options = []
-        option_pattern = re.compile(r'^[A-D][).]\s*')
-        for line in lines:
-            if option_pattern.match(line):
-                cleaned_option = option_pattern.sub('', line).strip()
-                options.append(f"{chr(65 + len(options))}) {cleaned_option}")
-                if len(options) == 4:
-                    break
-
-        # Ensure exactly 4 options
-        if len(options) != 4:
-            continue  # Skip this question and retry
-
-        # Extract correct answer with flexible matching
-        correct_letter = None
-        for line in reversed(lines):
-            if "correct answer" in line.lower():
-                match = re.search(r'\b([A-D])\b', line, re.IGNORECASE)
-                if match:
-                    correct_letter = match.group(1).upper()
-                    break
-
-        if not correct_letter:
-            continue  # Skip invalid questions
-
-        # Map letter to full option text
-        try:
-            correct_index = ord(correct_letter) - ord('A')
-            correct_answer = options[correct_index]
-        except (IndexError, TypeError):
-            continue  # Handle invalid letter mapping
-
-        quiz.append({
-            'question': question,
-            'options': options,
-            'correct_answer': correct_answer
-        })
-    
+        return parse_question(response.text or "")
+    except Exception as e:
+        logger.warning("Question generation for %r failed: %s", topic, e, exc_info=True)
+        return None
+
+def generate_question_batch(topic, num_questions, quiz_client=None):
+    """All questions from a single API call; invalid or repeated ones are dropped."""
+    try:
+        response = (quiz_client or get_client()).models.generate_content(
+            model=MODEL,
+            contents=build_batch_prompt(topic, num_questions),
+            config=JSON_CONFIG
+        )
+    except Exception as e:
+        logger.warning("Batch generation for %r failed: %s", topic, e, exc_info=True)
+        return []
+
+    questions, seen = [], set()
+    for question in parse_questions(response.text or ""):
+        if question['question'] not in seen:
+            seen.add(question['question'])
+            questions.append(question)
+    return questions[:num_questions]
+
+def iter_questions_individually(topic, num_questions, quiz_client=None,
+                                max_workers=MAX_CONCURRENT_REQUESTS,
+                                max_attempts=MAX_ATTEMPTS_PER_QUESTION):
+    """One request per question, run concurrently, retrying only the slots that failed.
+
+    Up to `max_workers` requests run at once and questions are yielded in
+    the order they arrive. A slot whose response is malformed (or whose
+    request errors) is asked again, up to `max_attempts` times.
+    """
+    attempts = [0] * num_questions
+    # Resolve the shared client here: worker threads have no Streamlit context
+    quiz_client = quiz_client or get_client()
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, num_questions)))
+    try:
+        def submit(slot):
+            attempts[slot] += 1
+            return executor.submit(generate_question, topic, quiz_client)
+
+        pending = {submit(slot): slot for slot in range(num_questions)}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                slot = pending.pop(future)
+                question = future.result()
+                if question is not None:
+                    yield question
+                elif attempts[slot] < max_attempts:
+                    pending[submit(slot)] = slot
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def generate_questions_individually(topic, num_questions, quiz_client=None,
+                                    max_workers=MAX_CONCURRENT_REQUESTS,
+                                    max_attempts=MAX_ATTEMPTS_PER_QUESTION, on_progress=None):
+    """iter_questions_individually collected into a list.
+
+    `on_progress(ready, total)` is called from this thread as questions arrive.
+    """
+    quiz = []
+    for question in iter_questions_individually(topic, num_questions, quiz_client,
+                                                max_workers, max_attempts):
+        quiz.append(question)
+        if on_progress:
+            on_progress(len(quiz), num_questions)
+    return quiz
+
+QUESTION_BANK_PATH = os.getenv("QUIZ_BANK_PATH", "question_bank.sqlite3")
+
+def normalize_topic(topic):
+    """'  Python Basics! ' and 'python basics' share cached questions (but 'C++' and 'C#' don't)."""
+    return ' '.join(topic.lower().split()).strip(' .!?')
+
+class QuestionBank:
+    """Validated questions cached per (topic, model): in memory and in SQLite.
+
+    Recently used topics are kept in an LRU of at most `max_topics` entries;
+    everything ever generated stays on disk, so the bank survives restarts.
+    Hit-rate metrics count how many requested questions came from the bank.
+    """
+
+    def __init__(self, path=QUESTION_BANK_PATH, max_topics=50, model=MODEL):
+        self.path = path
+        self.max_topics = max_topics
+        self.model = model
+        self._memory = OrderedDict()  # normalized topic -> list of questions
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.full_hits = 0
+        self.questions_requested = 0
+        self.questions_from_bank = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS questions (
+                topic TEXT,
+                model TEXT,
+                question TEXT,
+                payload TEXT,
+                created_at REAL,
+                PRIMARY KEY (topic, model, question)
+            )
+        """)
+        self._conn.commit()
+
+    def _questions(self, key):
+        # Caller holds the lock
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+        rows = self._conn.execute(
+            "SELECT payload FROM questions WHERE topic = ? AND model = ? ORDER BY created_at",
+            (key, self.model)
+        ).fetchall()
+        questions = [json.loads(row[0]) for row in rows]
+        self._memory[key] = questions
+        if len(self._memory) > self.max_topics:
+            self._memory.popitem(last=False)
+        return questions
+
+    def get(self, topic):
+        with self._lock:
+            return list(self._questions(normalize_topic(topic)))
+
+    def add(self, topic, questions):
+        """Store new questions for a topic, ignoring ones already in the bank."""
+        key = normalize_topic(topic)
+        with self._lock:
+            known = self._questions(key)
+            seen = {question['question'] for question in known}
+            fresh = [question for question in questions if question['question'] not in seen]
+            now = time.time()
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO questions VALUES (?, ?, ?, ?, ?)",
+                [(key, self.model, question['question'], json.dumps(question), now) for question in fresh]
+            )
+            self._conn.commit()
+            known.extend(fresh)
+        return len(fresh)
+
+    def sample(self, topic, count):
+        """Up to `count` random cached questions for a topic, recorded in the metrics."""
+        with self._lock:
+            questions = self._questions(normalize_topic(topic))
+            picked = random.sample(questions, min(count, len(questions)))
+            self.lookups += 1
+            self.full_hits += len(picked) == count
+            self.questions_requested += count
+            self.questions_from_bank += len(picked)
+        return picked
+
+    def stats(self):
+        with self._lock:
+            return {
+                'lookups': self.lookups,
+                'full_hits': self.full_hits,
+                'hit_rate': self.full_hits / self.lookups if self.lookups else 0.0,
+                'question_hit_rate': (self.questions_from_bank / self.questions_requested
+                                      if self.questions_requested else 0.0),
+                'questions_from_bank': self.questions_from_bank,
+                'questions_missed': self.questions_requested - self.questions_from_bank,
+                'topics_in_memory': len(self._memory)
+            }
+
+    def close(self):
+        self._conn.close()
+
+@st.cache_resource
+def get_question_bank():
+    return QuestionBank()
+
+def generate_quiz(topic, num_questions, quiz_client=None, batched=True,
+                  max_workers=MAX_CONCURRENT_REQUESTS, max_attempts=MAX_ATTEMPTS_PER_QUESTION,
+                  on_progress=None, bank=None):
+    """iter_quiz collected into a list, asking for all new questions in one batch.
+
+    `on_progress(ready, total)` is called from this thread as questions arrive.
+    """
+    quiz = []
+    for question in iter_quiz(topic, num_questions, quiz_client, bank, max_workers, max_attempts,
+                              batched=batched, first_alone=False):
+        quiz.append(question)
+        if on_progress:
+            on_progress(len(quiz), num_questions)
     return quiz
 
+POLL_INTERVAL = 0.5  # seconds between checks for newly generated questions
+
+def iter_quiz(topic, num_questions, quiz_client=None, bank=None,
+              max_workers=MAX_CONCURRENT_REQUESTS, max_attempts=MAX_ATTEMPTS_PER_QUESTION,
+              batched=True, first_alone=True, stop=None):
+    """Yield quiz questions one by one, as early as possible.
+
+    Cached questions from the bank come first, and new ones are added to it.
+    In batched mode the rest are requested as one JSON array, which saves a
+    round-trip and the repeated instructions per question; with
+    `first_alone`, a single-question request runs alongside that batch so
+    the first question arrives after one model round-trip. Whatever is
+    still missing (invalid items, a short array, an error) is topped up
+    with concurrent per-question calls.
+
+    Setting the `stop` event ends generation before the next request.
+    """
+    cached = bank.sample(topic, num_questions) if bank is not None else []
+    yield from cached
+    needed = num_questions - len(cached)
+    if needed == 0:
+        return
+
+    quiz_client = quiz_client or get_client()
+    seen = {question['question'] for question in cached}
+    new_questions = []
+
+    def stopped():
+        return stop is not None and stop.is_set()
+
+    def fresh(questions):
+        for question in questions:
+            if stopped():
+                return
+            if question['question'] not in seen and len(new_questions) < needed:
+                seen.add(question['question'])
+                new_questions.append(question)
+                yield question
+
+    try:
+        if batched and not stopped():
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                first = executor.submit(generate_question, topic, quiz_client) \
+                    if first_alone else None
+                batch_size = needed - 1 if first_alone else needed
+                rest = executor.submit(generate_question_batch, topic, batch_size, quiz_client) \
+                    if batch_size > 0 else None
+                if first is not None:
+                    first_question = first.result()
+                    yield from fresh([first_question] if first_question else [])
+                if rest is not None:
+                    yield from fresh(rest.result())
+
+        missing = needed - len(new_questions)
+        if missing > 0 and not stopped():
+            # Closing the generator on stop cancels the calls not yet started
+            yield from fresh(iter_questions_individually(topic, missing, quiz_client,
+                                                         max_workers, max_attempts))
+    finally:
+        if bank is not None and new_questions:
+            bank.add(topic, new_questions)
+
+class QuizStream:
+    """Generates a quiz on a background thread, one question at a time.
+
+    `questions` is a plain list the thread appends to, so the app can put it
+    straight into st.session_state.quiz and show question 1 while the rest
+    are still being written. The thread never touches Streamlit itself.
+    """
+
+    def __init__(self, topic, num_questions, quiz_client=None, bank=None, questions=None):
+        self.topic = topic
+        self.target = num_questions
+        self.quiz_client = quiz_client
+        self.bank = bank
+        self.questions = questions if questions is not None else []
+        self.finished = False
+        self.error = None
+        self.started_at = None
+        self.time_to_first_question = None
+        self._ready = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            for question in iter_quiz(self.topic, self.target, self.quiz_client, self.bank,
+                                      stop=self._stop):
+                with self._ready:
+                    if self.time_to_first_question is None:
+                        self.time_to_first_question = time.perf_counter() - self.started_at
+                    self.questions.append(question)
+                    self._ready.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            with self._ready:
+                self.finished = True
+                self._ready.notify_all()
+
+    def stop(self):
+        """Ask the thread to stop before its next model request."""
+        self._stop.set()
+
+    def expected(self):
+        """How many questions the quiz will have, as far as we know now."""
+        return len(self.questions) if self.finished else self.target
+
+    def join(self, timeout=None):
+        """Block until generation ends; True if it has."""
+        self._thread.join(timeout)
+        return self.finished
+
+    def wait_for(self, count, timeout=None):
+        """Block until `count` questions exist or generation ends; True if they exist."""
+        with self._ready:
+            self._ready.wait_for(lambda: len(self.questions) >= count or self.finished, timeout)
+            return len(self.questions) >= count
+
+def start_quiz(topic, num_questions):
+    """Reset the quiz state and start generating questions in the background."""
+    previous = st.session_state.get('quiz_stream')
+    if previous is not None:
+        # Don't keep paying for questions nobody will see
+        previous.stop()
+    st.session_state.quiz = []
+    st.session_state.quiz_stream = QuizStream(
+        topic, num_questions, quiz_client=get_client(), bank=get_question_bank(),
+        questions=st.session_state.quiz  # The stream fills the session's own list
+    ).start()
+    st.session_state.quiz_notice = None
+    st.session_state.current_question = 0
+    st.session_state.player_score = 0
+    st.session_state.user_answers = [None] * num_questions
+    st.session_state.quiz_finished = False
+
+def generating():
+    stream = st.session_state.get('quiz_stream')
+    return stream is not None and not stream.finished
+
+def expected_questions():
+    stream = st.session_state.get('quiz_stream')
+    return stream.expected() if stream is not None else len(st.session_state.quiz)
+
 def display_question(question_idx):
     question = st.session_state.quiz[question_idx]
     with st.container(border=True):
@@ -110,30 +461,59 @@ def display_question(question_idx):
         st.markdown(f"**{question['question']}**")
         
         cols = st.columns(2)
-        option_indices = {}
         for idx, option in enumerate(question['options']):
             with cols[idx % 2]:
-                if st.button(
+                st.button(
                     f"🔘 {option}",
                     key=f"q{question_idx}_opt{idx}",
-                    use_container_width=True
-                ):
-                    st.session_state.user_answers[question_idx] = idx
-                    handle_answer_selection(question_idx, idx)
+                    use_container_width=True,
+                    on_click=handle_answer_selection,
+                    args=(question_idx, idx)
+                )
 
 def handle_answer_selection(question_idx, selected_idx):
+    # Runs as a button callback, before the fragment re-renders, so no
+    # explicit st.rerun() is needed
     question = st.session_state.quiz[question_idx]
+    st.session_state.user_answers[question_idx] = selected_idx
     if question['options'][selected_idx] == question['correct_answer']:
         st.session_state.player_score += 1
-    if question_idx < len(st.session_state.quiz) - 1:
+    if question_idx < expected_questions() - 1:
         st.session_state.current_question += 1
     else:
         st.session_state.quiz_finished = True
-    st.rerun()
+
+def render_question_panel():
+    if st.session_state.current_question >= expected_questions():
+        # Generation ended short and every question that exists is answered
+        st.session_state.quiz_finished = True
+    if st.session_state.quiz_finished:
+        st.rerun()  # Full rerun to replace the panel with the results
+    show_progress()
+    if st.session_state.current_question < len(st.session_state.quiz):
+        display_question(st.session_state.current_question)
+    else:
+        st.info(f"⏳ Generating question {st.session_state.current_question + 1}...")
+
+@st.fragment
+def question_panel():
+    # Answering a question reruns only this function, not the whole page
+    render_question_panel()
+
+@st.fragment(run_every=POLL_INTERVAL)
+def streaming_question_panel():
+    # Same panel, but it also re-renders on a timer to pick up questions
+    # the background thread has added
+    stream = st.session_state.quiz_stream
+    if stream.finished:
+        st.rerun()  # Switch to the panel that doesn't poll
+    render_question_panel()
+    st.caption(f"🧠 {len(stream.questions)} of {stream.target} questions ready")
 
 def show_progress():
-    progress = (st.session_state.current_question + 1) / len(st.session_state.quiz)
-    st.progress(progress, text=f"📊 Progress: Question {st.session_state.current_question + 1} of {len(st.session_state.quiz)}")
+    total = expected_questions()
+    progress = (st.session_state.current_question + 1) / total
+    st.progress(min(progress, 1.0), text=f"📊 Progress: Question {st.session_state.current_question + 1} of {total}")
 
 def quiz_app():
     st.set_page_config(page_title="AI Quiz Master", page_icon="🧠")
@@ -154,21 +534,35 @@ def quiz_app():
     with st.expander("⚙️ Quiz Settings", expanded=True):
         topic = st.text_input("📚 Enter quiz topic:")
         num_questions = st.number_input("🔢 Number of questions:", min_value=1, max_value=10)
+        bank_stats = get_question_bank().stats()
+        if bank_stats['lookups']:
+            st.caption(f"📦 Question bank: {bank_stats['question_hit_rate']:.0%} of questions served "
+                       f"from cache ({bank_stats['questions_from_bank']} cached, "
+                       f"{bank_stats['questions_missed']} generated)")
 
     if st.button("🚀 Generate Quiz", use_container_width=True):
         if topic and num_questions > 0:
-            st.session_state.quiz = generate_quiz(topic, num_questions)
-            st.session_state.current_question = 0
-            st.session_state.player_score = 0
-            st.session_state.user_answers = [None] * num_questions
-            st.session_state.quiz_finished = False
+            start_quiz(topic.strip(), num_questions)
             st.rerun()
         else:
             st.error("❌ Please enter both a topic and number of questions")
 
-    if st.session_state.quiz and not st.session_state.quiz_finished:
-        show_progress()
-        display_question(st.session_state.current_question)
+    stream = st.session_state.get('quiz_stream')
+    if stream is not None and stream.finished and len(stream.questions) < stream.target:
+        st.session_state.quiz_notice = (
+            f"⚠️ Only {len(stream.questions)} of {stream.target} questions could be generated"
+        )
+
+    if st.session_state.get('quiz_notice'):
+        st.warning(st.session_state.quiz_notice)
+
+    if generating() and not st.session_state.quiz_finished:
+        streaming_question_panel()
+    elif st.session_state.quiz and not st.session_state.quiz_finished:
+        question_panel()
+
+    if stream is not None and stream.time_to_first_question is not None:
+        st.caption(f"⚡ First question ready after {stream.time_to_first_question:.1f}s")
 
     if st.session_state.quiz_finished:
         st.balloons()
@@ -193,4 +587,5 @@ def quiz_app():
                 else:
                     st.warning("⚠️ No answer selected")
 
-quiz_app()
+if __name__ == "__main__":
+    quiz_app()
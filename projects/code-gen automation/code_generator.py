@@ -4,22 +4,41 @@ Code Generator CLI using GitHub Models (OpenAI-compatible API)
 
 Usage:
   python code_generator.py "Program description" language
+  python code_generator.py --manifest jobs.csv --workers 4
 
 Reads the token from secret.txt (same directory) and prints the generated code.
+In batch mode the manifest lists program/language pairs and each result is
+saved to output/.
 """
 
 import sys
 import argparse
+import csv
+import hashlib
+import json
 import logging
+import os
 import socket
 import ssl
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
 from urllib.parse import urlparse
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 from openai import OpenAI, APIConnectionError, RateLimitError, APIStatusError
 
 DEFAULT_ENDPOINT = "https://models.github.ai/inference"
 DEFAULT_MODEL = "openai/gpt-4o-mini"
+DEFAULT_WORKERS = 4
+MAX_ATTEMPTS = 5
+MAX_BACKOFF_SECONDS = 60.0
+GENERATION_PARAMS = {"max_tokens": 2000, "temperature": 0.7}
+DEFAULT_CACHE_DIR = ".codegen_cache"
+DEFAULT_CACHE_MAX_BYTES = 50 * 1024 * 1024
+DEFAULT_CACHE_TTL = 7 * 24 * 3600  # seconds
 
 
 def load_token_from_secret() -> str:
@@ -34,9 +53,59 @@ def load_token_from_secret() -> str:
     return token
 
 
-def generate_code(program_name: str, language: str, token: str, endpoint: str = DEFAULT_ENDPOINT, model: str = DEFAULT_MODEL) -> str:
-    client = OpenAI(api_key=token, base_url=endpoint, timeout=30.0)
+def create_client(token: str, endpoint: str = DEFAULT_ENDPOINT, timeout: float = 30.0) -> OpenAI:
+    """Build an OpenAI client that can be shared by every request in a run.
+
+    The SDK's own retries are turned off so generate_code can handle them,
+    including pausing all workers when the API returns 429.
+    """
+    return OpenAI(api_key=token, base_url=endpoint, timeout=timeout, max_retries=0)
+
+
+class RateLimiter:
+    """Decides when each request may start.
+
+    Start times are spaced out to stay under `requests_per_minute` (if set).
+    After a 429, pause() holds back every worker until the server's
+    Retry-After time, instead of letting each worker retry right away.
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self.rate_limited = 0
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+        self._paused_until = 0.0
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start, self._paused_until)
+            self._next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self.rate_limited += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """Seconds to wait before retrying: the server's Retry-After if given, else exponential backoff."""
+    response = getattr(error, "response", None)
+    headers = response.headers if response is not None else {}
+    try:
+        if headers.get("retry-after-ms"):
+            return min(float(headers["retry-after-ms"]) / 1000, MAX_BACKOFF_SECONDS)
+        if headers.get("retry-after"):
+            return min(float(headers["retry-after"]), MAX_BACKOFF_SECONDS)
+    except ValueError:
+        pass  # An HTTP date rather than seconds; fall back to backoff
+    return min(0.5 * 2 ** attempt, MAX_BACKOFF_SECONDS)
+
 
+def build_messages(program_name: str, language: str) -> List[dict]:
     prompt = f"""
     Generate a complete, working {language} program for: {program_name}
 
@@ -46,23 +115,180 @@ def generate_code(program_name: str, language: str, token: str, endpoint: str =
     - Follow best practices for {language}
     - Only return the code, no explanations or markdown formatting
     """
+    return [
+        {"role": "system", "content": f"You are an expert {language} programmer. Generate clean, well-documented code."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+class ResultCache:
+    """On-disk cache of generated code, keyed by a hash of the whole request.
+
+    The key is the SHA-256 of the messages, model and sampling parameters,
+    so changing any of them gives a new entry. Each entry is one JSON file
+    under `directory`. Entries older than `ttl` seconds, and unreadable
+    ones, count as misses and are removed.
+
+    Recency and sizes are kept in memory (an OrderedDict in least recently
+    used order), seeded from the files' mtimes when the cache is opened.
+    When the total goes over `max_bytes`, the least recently used entries
+    are deleted. The budget is enforced per process: entries another
+    process writes are only counted once this one reads them, so run one
+    writer at a time if the limit must be exact.
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_CACHE_MAX_BYTES,
+                 ttl: Optional[float] = DEFAULT_CACHE_TTL):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        files = [(path, path.stat()) for path in self.directory.glob("*.json")]
+        files.sort(key=lambda item: item[1].st_mtime)
+        self._sizes = OrderedDict((path, st.st_size) for path, st in files)
+        self._total = sum(self._sizes.values())
+
+    @staticmethod
+    def key(messages: List[dict], model: str, params: dict) -> str:
+        request = json.dumps({"messages": messages, "model": model, "params": params}, sort_keys=True)
+        return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        with self._lock:
+            try:
+                data = path.read_text(encoding="utf-8")
+            except OSError:
+                self._forget(path)  # Deleted behind our back, e.g. by another process
+                self.misses += 1
+                return None
+            try:
+                entry = json.loads(data)
+                created, content = float(entry["created"]), entry["content"]
+                if not isinstance(content, str):
+                    raise TypeError("content is not a string")
+            except (ValueError, KeyError, TypeError) as e:
+                logging.warning("Removing unreadable cache entry %s: %s", path.name, e)
+                self.misses += 1
+                self._remove(path)
+                return None
+            if self.ttl is not None and time.time() - created > self.ttl:
+                self.expired += 1
+                self.misses += 1
+                self._remove(path)
+                return None
+            try:
+                os.utime(path)  # Persist the recency for the next run
+            except OSError:
+                self._forget(path)  # Removed or read-only since we read it
+                self.misses += 1
+                return None
+            self._track(path, len(data.encode("utf-8")))
+            self.hits += 1
+            return content
+
+    def put(self, key: str, content: str, model: str = "") -> None:
+        path = self._path(key)
+        data = json.dumps({"created": time.time(), "model": model, "content": content})
+        with self._lock:
+            tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp.write_text(data, encoding="utf-8")
+            os.replace(tmp, path)  # Readers never see a half-written entry
+            self._track(path, len(data.encode("utf-8")))
+            self._evict()
+
+    def _track(self, path: Path, size: int) -> None:
+        """Record `path` as the most recently used entry."""
+        self._forget(path)
+        self._sizes[path] = size
+        self._total += size
+
+    def _forget(self, path: Path) -> None:
+        self._total -= self._sizes.pop(path, 0)
+
+    def _remove(self, path: Path) -> None:
+        self._forget(path)
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _evict(self) -> None:
+        while self._total > self.max_bytes and self._sizes:
+            oldest = next(iter(self._sizes))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._sizes),
+                "bytes": self._total,
+            }
+
+    def summary(self) -> str:
+        stats = self.stats()
+        return (f"Cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), "
+                f"{stats['entries']} entries / {stats['bytes'] / 1024:.0f} KiB, {stats['evictions']} evicted")
 
-    # Minimal retry loop for transient network errors
+
+def generate_code(program_name: str, language: str, token: str, endpoint: str = DEFAULT_ENDPOINT,
+                  model: str = DEFAULT_MODEL, client: Optional[OpenAI] = None,
+                  limiter: Optional[RateLimiter] = None, cache: Optional[ResultCache] = None) -> str:
+    messages = build_messages(program_name, language)
+    cache_key = ResultCache.key(messages, model, GENERATION_PARAMS) if cache is not None else None
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            logging.info("Cache hit for %r (%s)", program_name, language)
+            return cached
+
+    client = client or create_client(token, endpoint)
+    limiter = limiter or RateLimiter()
+
+    # Retry transient network errors; back off (everyone, via the limiter) on 429
     last_error: Optional[Exception] = None
-    for _ in range(3):
+    for attempt in range(MAX_ATTEMPTS):
+        limiter.acquire()
         try:
             response = client.chat.completions.create(
                 model=model,
-                messages=[
-                    {"role": "system", "content": f"You are an expert {language} programmer. Generate clean, well-documented code."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=2000,
-                temperature=0.7,
+                messages=messages,
+                **GENERATION_PARAMS,
             )
-            return response.choices[0].message.content.strip()
-        except (APIConnectionError, RateLimitError, APIStatusError) as e:
+            content = response.choices[0].message.content.strip()
+            if cache is not None:
+                try:
+                    cache.put(cache_key, content, model)
+                except OSError as e:
+                    # A full or read-only disk shouldn't cost us the result
+                    logging.warning("Could not cache result for %r: %s", program_name, e)
+            return content
+        except RateLimitError as e:
+            last_error = e
+            delay = _retry_delay(e, attempt)
+            logging.warning("Rate limited on %r, pausing %.1fs", program_name, delay)
+            limiter.pause(delay)
+        except (APIConnectionError, APIStatusError) as e:
             last_error = e
+            if isinstance(e, APIStatusError) and e.status_code < 500:
+                break  # Bad request or credentials: retrying won't help
+            if attempt < MAX_ATTEMPTS - 1:
+                time.sleep(_retry_delay(e, attempt))
 
     raise Exception(f"Failed to generate after retries: {last_error}")
 
@@ -82,7 +308,130 @@ def save_output(program_name: str, language: str, content: str) -> str:
     out_path.write_text(content, encoding="utf-8")
     return str(out_path)
 
-import os
+
+@dataclass(frozen=True)
+class GenerationJob:
+    program_name: str
+    language: str
+
+
+@dataclass
+class JobResult:
+    job: GenerationJob
+    seconds: float
+    path: Optional[str] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class BatchReport:
+    results: List[JobResult] = field(default_factory=list)
+    elapsed: float = 0.0
+    rate_limited: int = 0
+
+    @property
+    def succeeded(self) -> List[JobResult]:
+        return [r for r in self.results if r.error is None]
+
+    @property
+    def failed(self) -> List[JobResult]:
+        return [r for r in self.results if r.error is not None]
+
+    @property
+    def jobs_per_minute(self) -> float:
+        return len(self.succeeded) / self.elapsed * 60 if self.elapsed else 0.0
+
+    def summary(self) -> str:
+        latencies = sorted(r.seconds for r in self.succeeded)
+        mean = sum(latencies) / len(latencies) if latencies else 0.0
+        return (f"{len(self.succeeded)}/{len(self.results)} programs generated in {self.elapsed:.1f}s "
+                f"({self.jobs_per_minute:.1f}/min, mean latency {mean:.1f}s, "
+                f"{len(self.failed)} failed, {self.rate_limited} rate-limit pauses)")
+
+
+def load_manifest(path: str) -> List[GenerationJob]:
+    """Read program/language pairs from a CSV (with a header row) or JSONL file.
+
+    Both formats use the keys `program_name` and `language`. A job whose
+    output file (see _safe_filename) is already taken by an earlier line is
+    skipped with a warning: generating both would write the same file.
+    """
+    manifest = Path(path)
+    with manifest.open(encoding="utf-8", newline="") as f:
+        if manifest.suffix.lower() in (".jsonl", ".ndjson"):
+            rows = []
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    rows.append((line_no, json.loads(line)))
+                except ValueError as e:
+                    raise ValueError(f"{path}:{line_no}: invalid JSON: {e}") from None
+        else:
+            rows = list(enumerate(csv.DictReader(f), 2))
+
+    jobs: List[GenerationJob] = []
+    claimed = {}  # output filename -> line that claimed it
+    for line_no, row in rows:
+        if not isinstance(row, dict):
+            raise ValueError(f"{path}:{line_no}: expected an object with program_name and language")
+        program_name = str(row.get("program_name") or "").strip()
+        language = str(row.get("language") or "").strip()
+        if not program_name or not language:
+            raise ValueError(f"{path}:{line_no}: expected program_name and language")
+        filename = _safe_filename(program_name, language)
+        if filename in claimed:
+            logging.warning("%s:%d: skipping %r (%s), its output %s is already written by line %d",
+                            path, line_no, program_name, language, filename, claimed[filename])
+            continue
+        claimed[filename] = line_no
+        jobs.append(GenerationJob(program_name, language))
+    return jobs
+
+
+def generate_batch(jobs: List[GenerationJob], token: str, endpoint: str = DEFAULT_ENDPOINT,
+                   model: str = DEFAULT_MODEL, workers: int = DEFAULT_WORKERS,
+                   requests_per_minute: Optional[float] = None,
+                   cache: Optional[ResultCache] = None) -> BatchReport:
+    """Generate and save every job, at most `workers` requests in flight at once.
+
+    All requests share one client (and so one connection pool) and one
+    RateLimiter. A failed job is recorded in the report and does not stop the others.
+    """
+    limiter = RateLimiter(requests_per_minute)
+    report = BatchReport()
+    client = create_client(token, endpoint)
+
+    def run(job: GenerationJob) -> JobResult:
+        start = time.perf_counter()
+        try:
+            code = generate_code(job.program_name, job.language, token, endpoint, model,
+                                 client=client, limiter=limiter, cache=cache)
+            path = save_output(job.program_name, job.language, code)
+            return JobResult(job, time.perf_counter() - start, path=path)
+        except Exception as e:
+            return JobResult(job, time.perf_counter() - start, error=str(e))
+
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = [executor.submit(run, job) for job in jobs]
+            for future in as_completed(futures):
+                result = future.result()
+                report.results.append(result)
+                if result.error:
+                    logging.error("%s (%s) failed: %s", result.job.program_name,
+                                  result.job.language, result.error)
+                else:
+                    logging.info("%s (%s) saved to %s in %.1fs", result.job.program_name,
+                                 result.job.language, result.path, result.seconds)
+    finally:
+        client.close()
+    report.elapsed = time.perf_counter() - start
+    report.rate_limited = limiter.rate_limited
+    return report
+
+
 def debug_connection(token: str, endpoint: str = DEFAULT_ENDPOINT) -> None:
     """Deep connectivity diagnostics with extensive logging."""
     logging.info("Starting connection diagnostics")
@@ -144,11 +493,19 @@ def debug_connection(token: str, endpoint: str = DEFAULT_ENDPOINT) -> None:
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Generate code using GitHub Models")
-    parser.add_argument("program_name", help="Name or description of the program to generate")
-    parser.add_argument("language", help="Programming language for the generated code")
+    parser.add_argument("program_name", nargs="?", help="Name or description of the program to generate")
+    parser.add_argument("language", nargs="?", help="Programming language for the generated code")
+    parser.add_argument("--manifest", help="CSV or JSONL file of program_name/language pairs to generate in one batch")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Concurrent requests in batch mode")
+    parser.add_argument("--rpm", type=float, help="Maximum requests started per minute in batch mode")
+    parser.add_argument("--no-cache", action="store_true", help="Always call the API, bypassing the result cache")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Directory for cached results")
     parser.add_argument("--log-level", default="INFO", choices=["DEBUG","INFO","WARNING","ERROR","CRITICAL"], help="Logging level")
     parser.add_argument("--debug-connect", action="store_true", help="Run deep connection diagnostics before generation")
-    return parser.parse_args()
+    args = parser.parse_args()
+    if not args.manifest and not (args.program_name and args.language):
+        parser.error("give a program_name and language, or --manifest")
+    return args
 
 
 def main() -> None:
@@ -161,11 +518,27 @@ def main() -> None:
     token = load_token_from_secret()
     if args.debug_connect:
         debug_connection(token, DEFAULT_ENDPOINT)
+    cache = None if args.no_cache else ResultCache(args.cache_dir)
+    if args.manifest:
+        try:
+            jobs = load_manifest(args.manifest)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        report = generate_batch(jobs, token, workers=args.workers, requests_per_minute=args.rpm, cache=cache)
+        for result in report.failed:
+            print(f"Failed: {result.job.program_name} ({result.job.language}): {result.error}")
+        print(report.summary())
+        if cache is not None:
+            print(cache.summary())
+        sys.exit(1 if report.failed else 0)
     try:
-        code = generate_code(args.program_name, args.language, token)
+        code = generate_code(args.program_name, args.language, token, cache=cache)
         saved_path = save_output(args.program_name, args.language, code)
         print(code)
         print(f"\nSaved to: {saved_path}")
+        if cache is not None:
+            print(cache.summary())
     except KeyboardInterrupt:
         print("\nOperation cancelled.")
         sys.exit(1)
@@ -1,8 +1,21 @@
+import json
 import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 import pytest
 
-from code_generator import _safe_filename, save_output
+from code_generator import (
+    GenerationJob,
+    RateLimiter,
+    ResultCache,
+    _safe_filename,
+    generate_batch,
+    generate_code,
+    load_manifest,
+    save_output,
+)
 
 
 @pytest.mark.parametrize(
@@ -36,3 +49,218 @@ def test_save_output_writes_file(tmp_path: Path):
         os.chdir(cwd)
 
 
+class StubModelServer:
+    """A local OpenAI-compatible /chat/completions endpoint.
+
+    Each reply takes `delay` seconds. The first `rate_limit` requests get a
+    429 with a short Retry-After.
+    """
+
+    def __init__(self, delay=0.0, rate_limit=0):
+        self.delay = delay
+        self.rate_limit = rate_limit
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with stub.lock:
+                    stub.requests += 1
+                    limited = stub.requests <= stub.rate_limit
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                try:
+                    if limited:
+                        self.reply(429, {"error": {"message": "slow down"}}, {"retry-after-ms": "100"})
+                        return
+                    time.sleep(stub.delay)
+                    prompt = body["messages"][-1]["content"]
+                    self.reply(200, {
+                        "id": "stub", "object": "chat.completion", "created": 0, "model": body["model"],
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": f"// {prompt.strip()[:60]}\n"}}],
+                    })
+                finally:
+                    with stub.lock:
+                        stub.in_flight -= 1
+
+            def reply(self, status, payload, headers=None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.endpoint = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def test_load_manifest_reads_csv_and_jsonl(tmp_path: Path, caplog):
+    csv_path = tmp_path / "jobs.csv"
+    csv_path.write_text("program_name,language\nTwo Sum,python\nFizzBuzz,go\nTwo Sum,python\n", encoding="utf-8")
+    jsonl_path = tmp_path / "jobs.jsonl"
+    jsonl_path.write_text('{"program_name": "Two Sum", "language": "python"}\n\n'
+                          '{"program_name": "FizzBuzz", "language": "go"}\n', encoding="utf-8")
+
+    expected = [GenerationJob("Two Sum", "python"), GenerationJob("FizzBuzz", "go")]
+    assert load_manifest(str(csv_path)) == expected
+    assert load_manifest(str(jsonl_path)) == expected
+
+    colliding = tmp_path / "colliding.csv"
+    colliding.write_text("program_name,language\nTwo Sum,python\nTwo Sum!,Python\n", encoding="utf-8")
+    assert load_manifest(str(colliding)) == [GenerationJob("Two Sum", "python")]
+    assert "two_sum_in_python.txt is already written by line 2" in caplog.text
+
+    jsonl_path.write_text('["Two Sum", "python"]\n', encoding="utf-8")
+    with pytest.raises(ValueError, match=":1: expected an object"):
+        load_manifest(str(jsonl_path))
+    jsonl_path.write_text('{"program_name": "Two Sum"\n', encoding="utf-8")
+    with pytest.raises(ValueError, match=":1: invalid JSON"):
+        load_manifest(str(jsonl_path))
+
+    csv_path.write_text("program_name,language\nTwo Sum,\n", encoding="utf-8")
+    with pytest.raises(ValueError, match=":2:"):
+        load_manifest(str(csv_path))
+
+
+def test_generate_batch_runs_concurrently_and_saves_output(tmp_path: Path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    jobs = [GenerationJob(f"Program {n}", "python") for n in range(8)]
+
+    with StubModelServer(delay=0.2) as server:
+        report = generate_batch(jobs, "token", endpoint=server.endpoint, workers=4)
+
+    assert len(report.succeeded) == 8 and not report.failed
+    assert server.max_in_flight == 4
+    assert report.elapsed < 8 * 0.2 / 2
+    assert sorted(Path(r.path).name for r in report.results) == sorted(
+        f"program_{n}_in_python.txt" for n in range(8))
+    assert "Program 3" in (tmp_path / "output" / "program_3_in_python.txt").read_text(encoding="utf-8")
+
+
+def test_generate_code_waits_out_rate_limits():
+    with StubModelServer(rate_limit=2) as server:
+        start = time.perf_counter()
+        code = generate_code("Two Sum", "python", "token", endpoint=server.endpoint)
+        elapsed = time.perf_counter() - start
+
+    assert code.startswith("//") and server.requests == 3
+    assert elapsed >= 0.2  # two Retry-After pauses of 100 ms
+
+
+def test_rate_limiter_spaces_requests():
+    limiter = RateLimiter(requests_per_minute=600)  # one start every 100 ms
+    start = time.perf_counter()
+    for _ in range(4):
+        limiter.acquire()
+    assert time.perf_counter() - start >= 0.3
+
+
+def test_generate_batch_reports_failures(tmp_path: Path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("code_generator.MAX_ATTEMPTS", 2)
+
+    with StubModelServer(rate_limit=100) as server:
+        report = generate_batch([GenerationJob("Two Sum", "python")], "token", endpoint=server.endpoint)
+
+    assert len(report.failed) == 1 and report.rate_limited == 2
+    assert "slow down" in report.failed[0].error
+    assert not (tmp_path / "output").exists()
+
+
+def test_result_cache_skips_the_api_for_repeat_requests(tmp_path: Path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    with StubModelServer() as server:
+        first = generate_code("Two Sum", "python", "token", endpoint=server.endpoint, cache=cache)
+        again = generate_code("Two Sum", "python", "token", endpoint=server.endpoint, cache=cache)
+        generate_code("Two Sum", "python", "token", endpoint=server.endpoint, model="other", cache=cache)
+        generate_code("Two Sum", "python", "token", endpoint=server.endpoint)  # cache disabled
+
+    assert again == first
+    assert server.requests == 3
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 2 and stats["entries"] == 2
+    assert ResultCache(str(tmp_path / "cache")).stats()["entries"] == 2  # persisted on disk
+
+
+def test_result_cache_expires_and_evicts_least_recently_used(tmp_path: Path):
+    cache = ResultCache(str(tmp_path / "cache"), ttl=60)
+    cache.put("old", "print(1)")
+    entry = tmp_path / "cache" / "old.json"
+    data = json.loads(entry.read_text(encoding="utf-8"))
+    entry.write_text(json.dumps(dict(data, created=data["created"] - 120)), encoding="utf-8")
+    assert cache.get("old") is None and not entry.exists()
+    assert cache.stats()["expired"] == 1
+
+    cache.max_bytes = 3.5 * len(json.dumps({"created": time.time(), "model": "", "content": "x" * 100}))
+    for key in ("a", "b", "c"):
+        cache.put(key, "x" * 100)
+    cache.get("a")  # Now the most recently used
+    cache.put("d", "x" * 100)
+
+    assert cache.get("b") is None
+    assert all(cache.get(key) for key in ("a", "c", "d"))
+    assert cache.stats()["evictions"] == 1
+
+    # Reopening restores the recency order from the files' mtimes
+    for n, key in enumerate(("d", "c", "a")):
+        os.utime(tmp_path / "cache" / f"{key}.json", (n, n))
+    reopened = ResultCache(str(tmp_path / "cache"), max_bytes=cache.max_bytes)
+    reopened.put("e", "x" * 100)
+    assert sorted(p.stem for p in (tmp_path / "cache").glob("*.json")) == ["a", "c", "e"]
+
+
+def test_result_cache_treats_malformed_entries_as_misses(tmp_path: Path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    for key, text in (("empty", "{}"), ("list", "[1]"), ("bad_time", '{"created": "x", "content": "c"}'),
+                      ("not_json", "{")):
+        (tmp_path / "cache" / f"{key}.json").write_text(text, encoding="utf-8")
+        assert cache.get(key) is None
+        assert not (tmp_path / "cache" / f"{key}.json").exists()
+
+    assert cache.stats()["misses"] == 4 and cache.stats()["entries"] == 0
+
+
+def test_cache_write_failures_do_not_lose_the_result(tmp_path: Path, monkeypatch, caplog):
+    cache = ResultCache(str(tmp_path / "cache"))
+
+    def disk_full(*args, **kwargs):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(cache, "put", disk_full)
+    with StubModelServer() as server:
+        content = generate_code("Two Sum", "python", "token", endpoint=server.endpoint, cache=cache)
+
+    assert content
+    assert "Could not cache result for 'Two Sum'" in caplog.text
+
+
+def test_result_cache_treats_untouchable_entries_as_misses(tmp_path: Path, monkeypatch):
+    cache = ResultCache(str(tmp_path / "cache"))
+    cache.put("key", "print(1)")
+
+    def read_only(*args, **kwargs):
+        raise PermissionError("Read-only file system")
+
+    monkeypatch.setattr("code_generator.os.utime", read_only)
+
+    assert cache.get("key") is None
+    assert cache.stats()["misses"] == 1 and cache.stats()["entries"] == 0
@@ -0,0 +1,2058 @@
+"""
+Reusable building blocks for the web scraping tutorial.
+
+web_scraping_tutorial.py runs its demos when imported, so everything meant
+to be reused lives here instead: rate limiting and robots.txt handling,
+HTTP caching, metrics, streaming exports, duplicate detection, record
+validation, the asyncio scraper and pipeline, a local mock site and the
+crawl frontier. Importing this module has no side effects. That matters
+for ScrapingPipeline too: ProcessPoolExecutor workers started with "spawn"
+or "forkserver" (the default on macOS, Windows, and Linux from Python 3.14)
+re-import the module that defines parse_page_in_worker.
+"""
+
+import asyncio
+import base64
+import bisect
+import codecs
+import csv
+import gzip
+import hashlib
+import heapq
+import json
+import math
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from html.parser import HTMLParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from importlib.util import find_spec
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urljoin, urlparse
+
+import requests
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import aiohttp  # Optional: only needed for the asyncio scraper
+except ImportError:
+    aiohttp = None
+
+try:
+    import zstandard  # Optional: only needed for .zst exports
+except ImportError:
+    zstandard = None
+
+try:
+    import pyarrow as pa  # Optional: only needed for Parquet export
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+
+# =============================================================================
+# Politeness: rate limits and robots.txt
+# =============================================================================
+
+class TokenBucket:
+    """Token bucket: refills at `rate` tokens per second, holds up to `burst`."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """Take one token and return how many seconds to wait before using it.
+
+        The balance may go negative: each extra caller queues up behind the
+        previous one instead of all of them waking up at the same moment.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def set_rate(self, rate: float, burst: Optional[int] = None):
+        """Change the refill rate, keeping the balance earned so far."""
+        now = time.monotonic()
+        # Settle the tokens earned at the old rate before switching over
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.rate = rate
+        if burst is not None:
+            self.burst = burst
+            self.tokens = min(self.tokens, float(burst))
+
+
+class RateLimiter:
+    """Per-domain token buckets, shared safely between threads and asyncio tasks."""
+
+    def __init__(self, requests_per_second: Optional[float] = 0.5, burst: int = 1):
+        # requests_per_second=None disables limiting (useful for local testing)
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def domain_of(url: str) -> str:
+        """Accept either a full URL or a bare domain."""
+        return urlparse(url).netloc if '://' in url else url
+
+    def set_crawl_delay(self, url: str, crawl_delay: float):
+        """Honour a robots.txt Crawl-delay: one request every `crawl_delay` seconds."""
+        if crawl_delay <= 0:
+            return
+        # Never go faster than our own configured rate
+        if self.requests_per_second is not None and 1.0 / crawl_delay > self.requests_per_second:
+            return
+        domain = self.domain_of(url)
+        with self._lock:
+            bucket = self._buckets.get(domain)
+            if bucket is None:
+                self._buckets[domain] = TokenBucket(1.0 / crawl_delay, burst=1)
+            else:
+                # Refreshing robots.txt must not hand out a fresh token balance
+                bucket.set_rate(1.0 / crawl_delay, burst=1)
+
+    def reserve(self, url: str) -> float:
+        """Reserve a request slot for this domain and return the wait in seconds."""
+        domain = self.domain_of(url)
+        with self._lock:
+            bucket = self._buckets.get(domain)
+            if bucket is None:
+                if self.requests_per_second is None:
+                    return 0.0
+                bucket = TokenBucket(self.requests_per_second, self.burst)
+                self._buckets[domain] = bucket
+            return bucket.reserve()
+
+    def acquire(self, url: str) -> float:
+        """Block the calling thread until a request to this domain is allowed."""
+        wait = self.reserve(url)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, url: str) -> float:
+        """Like acquire, but only suspends the calling task."""
+        wait = self.reserve(url)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+
+class RobotsRules:
+    """The allow/disallow rules of one robots.txt, compiled for fast matching.
+
+    Follows the usual conventions: the longest matching rule wins, Allow wins
+    ties, `*` matches anything and a trailing `$` anchors the end of the path.
+    """
+
+    def __init__(self, rules=None, crawl_delay: Optional[float] = None):
+        self.rules = list(rules or [])  # (pattern, allowed) pairs
+        self.crawl_delay = crawl_delay
+
+        self._matchers = []
+        for pattern, allowed in self.rules:
+            if '*' in pattern or pattern.endswith('$'):
+                regex = re.escape(pattern).replace(r'\*', '.*')
+                if regex.endswith(r'\$'):
+                    regex = regex[:-2] + '$'
+                matcher = re.compile(regex).match
+            else:
+                # Plain prefixes are by far the most common rule, and cheapest
+                matcher = lambda path, prefix=pattern: path.startswith(prefix)
+            self._matchers.append((len(pattern), allowed, matcher))
+        self._matchers.sort(key=lambda rule: (-rule[0], not rule[1]))
+
+    @classmethod
+    def parse(cls, text: str, user_agent: str = '*') -> 'RobotsRules':
+        """Parse robots.txt text, keeping only the group that applies to us."""
+        groups = []
+        current = None
+        for line in text.splitlines():
+            line = line.split('#', 1)[0].strip()
+            if ':' not in line:
+                continue
+            key, value = (part.strip() for part in line.split(':', 1))
+            key = key.lower()
+
+            if key == 'user-agent':
+                # Consecutive User-agent lines share one group of rules
+                if current is None or current['rules'] or current['crawl_delay'] is not None:
+                    current = {'agents': [], 'rules': [], 'crawl_delay': None}
+                    groups.append(current)
+                current['agents'].append(value.lower())
+            elif current is None:
+                continue
+            elif key in ('allow', 'disallow'):
+                if value:  # An empty Disallow means "allow everything"
+                    current['rules'].append((value, key == 'allow'))
+            elif key == 'crawl-delay':
+                try:
+                    current['crawl_delay'] = float(value)
+                except ValueError:
+                    pass
+
+        agent = user_agent.lower()
+        matching = [g for g in groups if any(a != '*' and a in agent for a in g['agents'])]
+        if not matching:
+            matching = [g for g in groups if '*' in g['agents']]
+
+        rules = [rule for group in matching for rule in group['rules']]
+        delays = [g['crawl_delay'] for g in matching if g['crawl_delay'] is not None]
+        return cls(rules, max(delays) if delays else None)
+
+    @classmethod
+    def disallow_all(cls) -> 'RobotsRules':
+        return cls([('/', False)])
+
+    def is_allowed(self, url: str) -> bool:
+        """Check a URL (or a path) against the compiled rules."""
+        if '://' in url:
+            parsed = urlparse(url)
+            path = (parsed.path or '/') + (f'?{parsed.query}' if parsed.query else '')
+        else:
+            path = url
+        for _, allowed, matcher in self._matchers:
+            if matcher(path):
+                return allowed
+        return True
+
+
+class RobotsCache:
+    """Fetch robots.txt once per host and keep the compiled rules.
+
+    Entries expire after `ttl` seconds. With `cache_file`, the raw robots.txt
+    texts are also kept on disk so later runs skip the fetch entirely.
+    Unreachable or failing (5xx) robots.txt files disallow the whole host for
+    the shorter `error_ttl`, while a missing one (4xx) allows everything.
+    """
+
+    def __init__(self, user_agent: str = '*', ttl: float = 24 * 3600,
+                 error_ttl: float = 300, cache_file: Optional[str] = None,
+                 rate_limiter: Optional[RateLimiter] = None):
+        self.user_agent = user_agent
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.cache_file = cache_file
+        self.rate_limiter = rate_limiter
+        self._entries = {}  # host -> (rules, expires_at)
+        self._raw = {}      # host -> what we persist to disk
+        self._lock = threading.Lock()
+        self._fetch_locks = {}  # host -> Lock, so each host's robots.txt is fetched once
+
+        if cache_file and os.path.exists(cache_file):
+            self._load_from_disk()
+
+    @staticmethod
+    def host_key(url: str) -> str:
+        parsed = urlparse(url)
+        return f"{parsed.scheme}://{parsed.netloc}"
+
+    def robots_url(self, url: str) -> str:
+        return self.host_key(url) + '/robots.txt'
+
+    def cached_rules(self, url: str) -> Optional[RobotsRules]:
+        """Return the rules for this URL's host if cached and fresh."""
+        with self._lock:
+            entry = self._entries.get(self.host_key(url))
+        if entry and entry[1] > time.time():
+            return entry[0]
+        return None
+
+    def store(self, url: str, status_code: Optional[int], text: str,
+              fetched_at: Optional[float] = None, persist: bool = True) -> RobotsRules:
+        """Compile and cache a fetched robots.txt (status None = fetch failed).
+
+        With persist=False the disk cache is left alone (used while loading it).
+        """
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        if status_code is not None and 200 <= status_code < 300:
+            rules, ttl = RobotsRules.parse(text, self.user_agent), self.ttl
+        elif status_code is not None and 400 <= status_code < 500:
+            rules, ttl = RobotsRules(), self.ttl
+        else:
+            rules, ttl = RobotsRules.disallow_all(), self.error_ttl
+
+        key = self.host_key(url)
+        with self._lock:
+            self._entries[key] = (rules, fetched_at + ttl)
+            self._raw[key] = {'status_code': status_code, 'text': text, 'fetched_at': fetched_at}
+        if self.rate_limiter is not None and rules.crawl_delay:
+            self.rate_limiter.set_crawl_delay(url, rules.crawl_delay)
+        if self.cache_file and persist:
+            self._save_to_disk()
+        return rules
+
+    def rules_for(self, url: str, fetch) -> RobotsRules:
+        """Return cached rules, calling fetch(robots_url) -> (status, text) on a miss."""
+        rules = self.cached_rules(url)
+        if rules is None:
+            key = self.host_key(url)
+            with self._lock:
+                fetch_lock = self._fetch_locks.setdefault(key, threading.Lock())
+            # Only threads waiting on this host block; other hosts fetch in parallel
+            with fetch_lock:
+                # Another thread may have fetched it while we waited
+                rules = self.cached_rules(url)
+                if rules is None:
+                    status_code, text = fetch(self.robots_url(url))
+                    rules = self.store(url, status_code, text)
+        return rules
+
+    def is_allowed(self, url: str, fetch) -> bool:
+        return self.rules_for(url, fetch).is_allowed(url)
+
+    def _load_from_disk(self):
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Ignoring unreadable robots cache {self.cache_file}: {e}")
+            return
+        for host, raw in saved.items():
+            self.store(host, raw['status_code'], raw['text'], raw['fetched_at'], persist=False)
+
+    def _save_to_disk(self):
+        with self._lock:
+            snapshot = dict(self._raw)
+        # Write to a temporary file first, so a crash never truncates the cache
+        temp_path = f"{self.cache_file}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f)
+            os.replace(temp_path, self.cache_file)
+        except OSError as e:
+            print(f"⚠️  Could not save robots cache: {e}")
+
+
+# =============================================================================
+# HTTP caching
+# =============================================================================
+
+class HttpCache:
+    """Disk-backed HTTP cache that revalidates pages with conditional GETs.
+
+    Responses carrying an ETag or Last-Modified header are stored in SQLite
+    with a zlib-compressed body. The next request for the same URL sends
+    If-None-Match / If-Modified-Since, and a 304 reply is answered from the
+    cache without downloading the page again.
+    """
+
+    def __init__(self, path: str = 'http_cache.sqlite3'):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                status_code INTEGER,
+                headers TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                body BLOB,
+                stored_at REAL
+            )
+        """)
+        self._conn.commit()
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """Validators to send with the next request for this URL."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+        headers = {}
+        if row and row[0]:
+            headers['If-None-Match'] = row[0]
+        if row and row[1]:
+            headers['If-Modified-Since'] = row[1]
+        return headers
+
+    def load(self, url: str) -> Optional[requests.Response]:
+        """Rebuild a cached response, or None if the URL isn't cached."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status_code, headers, body FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        response = requests.Response()
+        response.status_code = row[0]
+        response.headers = requests.structures.CaseInsensitiveDict(json.loads(row[1]))
+        response._content = zlib.decompress(row[2])
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.url = url
+        return response
+
+    def store(self, url: str, response: requests.Response):
+        """Cache a successful response if it can be revalidated later."""
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if not (etag or last_modified):
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, response.status_code, json.dumps(dict(response.headers)), etag,
+                 last_modified, zlib.compress(response.content), time.time())
+            )
+            self._conn.commit()
+
+    def update(self, url: str, response: requests.Response) -> requests.Response:
+        """Resolve a (possibly conditional) response against the cache."""
+        if response.status_code == 304:
+            cached = self.load(url)
+            if cached is not None:
+                with self._lock:
+                    self.hits += 1
+                    self.bytes_saved += len(cached.content)
+                return cached
+        with self._lock:
+            self.misses += 1
+        if response.status_code == 200:
+            self.store(url, response)
+        return response
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'bytes_saved': self.bytes_saved
+        }
+
+    def close(self):
+        self._conn.close()
+
+
+# =============================================================================
+# Metrics and tracing
+# =============================================================================
+
+class LatencyHistogram:
+    """Request latencies counted into fixed buckets, Prometheus-style.
+
+    Memory stays constant however many requests are observed; percentiles
+    are estimated by interpolating inside the bucket they fall in.
+    """
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q: float) -> float:
+        """Estimated latency below which a fraction `q` of requests fall."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / bucket_count, self.max)
+            seen += bucket_count
+        return self.max
+
+    def summary(self) -> Dict:
+        return {
+            'count': self.count,
+            'avg_ms': self.total / self.count * 1000 if self.count else 0.0,
+            'p50_ms': self.percentile(0.50) * 1000,
+            'p95_ms': self.percentile(0.95) * 1000,
+            'p99_ms': self.percentile(0.99) * 1000,
+            'max_ms': self.max * 1000
+        }
+
+
+@dataclass
+class TraceSpan:
+    """Timing of one traced operation (e.g. a single HTTP request)."""
+    name: str
+    start: float
+    end: float = 0.0
+    attributes: Dict = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+class ScraperMetrics:
+    """Counters for a scraping session, shared by the sync and async scrapers.
+
+    Tracks per-host requests, errors, bytes and retries, a latency histogram
+    per host, cache hits and the depth of pipeline queues. Everything is
+    guarded by one lock, so threads can share an instance. With trace=True
+    the most recent `max_spans` requests are also kept as TraceSpans.
+    """
+
+    def __init__(self, trace: bool = False, max_spans: int = 1000):
+        self.trace = trace
+        self.requests = Counter()       # host -> requests sent
+        self.errors = Counter()         # host -> failed requests
+        self.status_codes = Counter()   # status code -> responses
+        self.bytes_received = Counter() # host -> body bytes downloaded
+        self.retries = Counter()        # host -> retries scheduled
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.latency = {}               # host -> LatencyHistogram
+        self.queue_depths = {}          # queue name -> {'current', 'max'}
+        self.spans = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    def record_request(self, url: str, seconds: float, status_code: Optional[int] = None,
+                       nbytes: int = 0, cached: Optional[bool] = None, error: bool = False):
+        """One finished request; status_code None means it failed outright."""
+        host = urlparse(url).netloc
+        with self._lock:
+            self.requests[host] += 1
+            if status_code is not None:
+                self.status_codes[status_code] += 1
+            if error or status_code is None or status_code >= 400:
+                self.errors[host] += 1
+            self.bytes_received[host] += nbytes
+            if cached is not None:
+                if cached:
+                    self.cache_hits += 1
+                else:
+                    self.cache_misses += 1
+            histogram = self.latency.get(host)
+            if histogram is None:
+                histogram = self.latency[host] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    def record_retry(self, url: str):
+        with self._lock:
+            self.retries[urlparse(url).netloc] += 1
+
+    def observe_queue(self, name: str, depth: int):
+        with self._lock:
+            depths = self.queue_depths.setdefault(name, {'current': 0, 'max': 0})
+            depths['current'] = depth
+            depths['max'] = max(depths['max'], depth)
+
+    def start_span(self, name: str, **attributes) -> Optional[TraceSpan]:
+        """Begin a span if tracing is on; finish it with end_span."""
+        if not self.trace:
+            return None
+        return TraceSpan(name, time.perf_counter(), attributes=attributes)
+
+    def end_span(self, span: Optional[TraceSpan], **attributes):
+        if span is None:
+            return
+        span.end = time.perf_counter()
+        span.attributes.update(attributes)
+        with self._lock:
+            self.spans.append(span)
+
+    def overall_latency(self) -> LatencyHistogram:
+        """All hosts' histograms merged into one."""
+        merged = LatencyHistogram()
+        with self._lock:
+            for histogram in self.latency.values():
+                merged.counts = [a + b for a, b in zip(merged.counts, histogram.counts)]
+                merged.count += histogram.count
+                merged.total += histogram.total
+                merged.max = max(merged.max, histogram.max)
+        return merged
+
+    def snapshot(self) -> Dict:
+        """Everything as plain data, ready for json.dumps."""
+        with self._lock:
+            lookups = self.cache_hits + self.cache_misses
+            hosts = {
+                host: {
+                    'requests': self.requests[host],
+                    'errors': self.errors[host],
+                    'bytes_received': self.bytes_received[host],
+                    'retries': self.retries[host],
+                    'latency': self.latency[host].summary() if host in self.latency else None
+                }
+                for host in sorted(set(self.requests) | set(self.retries))
+            }
+            snapshot = {
+                'requests': sum(self.requests.values()),
+                'errors': sum(self.errors.values()),
+                'retries': sum(self.retries.values()),
+                'bytes_received': sum(self.bytes_received.values()),
+                'status_codes': {str(code): n for code, n in sorted(self.status_codes.items())},
+                'cache': {
+                    'hits': self.cache_hits,
+                    'misses': self.cache_misses,
+                    'hit_rate': self.cache_hits / lookups if lookups else 0.0
+                },
+                'queue_depths': {name: dict(depths) for name, depths in self.queue_depths.items()},
+                'hosts': hosts
+            }
+        snapshot['latency'] = self.overall_latency().summary()
+        return snapshot
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        return json.dumps(self.snapshot(), indent=indent)
+
+    def to_prometheus(self, prefix: str = 'scraper') -> str:
+        """Metrics in the Prometheus text exposition format."""
+        lines = []
+
+        def header(name, kind, help_text):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+
+        def sample(name, value, **labels):
+            label_text = ','.join(f'{key}="{label}"' for key, label in labels.items())
+            lines.append(f"{prefix}_{name}{{{label_text}}} {value}" if labels
+                         else f"{prefix}_{name} {value}")
+
+        with self._lock:
+            per_host = (
+                ('requests_total', 'HTTP requests sent.', self.requests),
+                ('errors_total', 'Requests that failed or returned 4xx/5xx.', self.errors),
+                ('retries_total', 'Retries scheduled.', self.retries),
+                ('bytes_received_total', 'Response body bytes downloaded.', self.bytes_received),
+            )
+            for name, help_text, counter in per_host:
+                header(name, 'counter', help_text)
+                for host, value in sorted(counter.items()):
+                    sample(name, value, host=host)
+
+            header('responses_total', 'counter', 'Responses by status code.')
+            for code, value in sorted(self.status_codes.items()):
+                sample('responses_total', value, code=code)
+            header('cache_hits_total', 'counter', 'Responses served from the HTTP cache.')
+            sample('cache_hits_total', self.cache_hits)
+            header('cache_misses_total', 'counter', 'Responses downloaded in full.')
+            sample('cache_misses_total', self.cache_misses)
+            header('queue_depth', 'gauge', 'Current pipeline queue depth.')
+            for queue_name, depths in sorted(self.queue_depths.items()):
+                sample('queue_depth', depths['current'], queue=queue_name)
+
+            header('request_duration_seconds', 'histogram', 'Request latency.')
+            for host, histogram in sorted(self.latency.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                    cumulative += bucket_count
+                    sample('request_duration_seconds_bucket', cumulative, host=host, le=bound)
+                sample('request_duration_seconds_sum', histogram.total, host=host)
+                sample('request_duration_seconds_count', histogram.count, host=host)
+        return '\n'.join(lines) + '\n'
+
+
+@dataclass
+class StageMetrics:
+    """Throughput and latency of one pipeline stage."""
+    name: str
+    items: int = 0
+    errors: int = 0
+    busy_time: float = 0.0
+    max_latency: float = 0.0
+    max_queue_depth: int = 0
+    started: Optional[float] = None
+    finished: Optional[float] = None
+
+    def record(self, seconds: float, error: bool = False):
+        now = time.perf_counter()
+        if self.started is None:
+            self.started = now - seconds
+        self.finished = now
+        self.items += 1
+        self.errors += error
+        self.busy_time += seconds
+        self.max_latency = max(self.max_latency, seconds)
+
+    def observe_queue(self, queue: asyncio.Queue):
+        self.max_queue_depth = max(self.max_queue_depth, queue.qsize())
+
+    def summary(self) -> Dict:
+        wall_time = (self.finished - self.started) if self.items else 0.0
+        return {
+            'items': self.items,
+            'errors': self.errors,
+            'throughput_per_s': self.items / wall_time if wall_time > 0 else 0.0,
+            'avg_latency_ms': self.busy_time / self.items * 1000 if self.items else 0.0,
+            'max_latency_ms': self.max_latency * 1000,
+            'max_queue_depth': self.max_queue_depth
+        }
+
+
+# =============================================================================
+# Parsing and reading pages
+# =============================================================================
+
+# lxml's C parser is several times faster than Python's built-in html.parser
+DEFAULT_HTML_PARSER = 'lxml' if find_spec('lxml') else 'html.parser'
+
+
+def parse_page_in_worker(url: str, status_code: int, html: str) -> Dict:
+    """CPU-bound extraction for one page.
+
+    Lives at module level so ProcessPoolExecutor can send it to its workers.
+    """
+    soup = BeautifulSoup(html, DEFAULT_HTML_PARSER)
+    title = soup.find('title')
+    return {
+        'url': url,
+        'title': title.get_text(strip=True) if title else 'N/A',
+        'status_code': status_code,
+        'content_length': len(html),
+        'link_count': len(soup.find_all('a', href=True)),
+        'scraped_at': time.strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+
+class _HeadComplete(Exception):
+    """Raised by HeadFieldsParser once everything it needs has been seen."""
+
+
+class HeadFieldsParser(HTMLParser):
+    """Streaming parser that collects <head> fields and stops at <body>.
+
+    No tree is built and the rest of the document is never looked at, which
+    makes reading the title of a large page almost free.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.fields = {}
+        self._in_title = False
+        self._title_parts = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'title':
+            self._in_title = True
+        elif tag == 'meta' and attrs.get('name', '').lower() == 'description':
+            self.fields.setdefault('description', (attrs.get('content') or '').strip())
+        elif tag == 'meta' and 'charset' in attrs:
+            self.fields.setdefault('charset', attrs['charset'])
+        elif tag == 'link' and 'canonical' in (attrs.get('rel') or '').lower().split():
+            self.fields.setdefault('canonical', attrs.get('href'))
+        elif tag == 'body':
+            raise _HeadComplete
+
+    def handle_endtag(self, tag):
+        if tag == 'title' and self._in_title:
+            self._in_title = False
+            self.fields.setdefault('title', ''.join(self._title_parts).strip())
+        elif tag == 'head':
+            raise _HeadComplete
+
+    def handle_data(self, data):
+        if self._in_title:
+            self._title_parts.append(data)
+
+
+def codec_or_utf8(encoding: Optional[str]) -> str:
+    """`encoding` if Python knows it, otherwise UTF-8.
+
+    Servers sometimes declare charsets Python has no codec for, and
+    errors='replace' doesn't help there: the lookup itself raises LookupError.
+    """
+    if encoding:
+        try:
+            return codecs.lookup(encoding).name
+        except LookupError:
+            pass
+    return 'utf-8'
+
+
+def extract_head_fields(html, chunk_size: int = 8192, encoding: Optional[str] = None) -> Dict[str, str]:
+    """Read title/description/canonical/charset without parsing the whole page.
+
+    `html` may be a string, raw bytes, or an iterable of string or byte
+    chunks (e.g. a streamed download); input is consumed only until the end
+    of <head>. Bytes are decoded chunk by chunk with `encoding` (UTF-8 by
+    default), so the body of a large page is never decoded at all.
+    """
+    if isinstance(html, (str, bytes, bytearray)):
+        chunks = (html[i:i + chunk_size] for i in range(0, len(html), chunk_size))
+    else:
+        chunks = html
+    decoder = codecs.getincrementaldecoder(codec_or_utf8(encoding))(errors='replace')
+    parser = HeadFieldsParser()
+    try:
+        for chunk in chunks:
+            parser.feed(chunk if isinstance(chunk, str) else decoder.decode(chunk))
+        parser.close()
+    except _HeadComplete:
+        pass
+    return parser.fields
+
+
+def read_body(response: requests.Response, max_bytes: Optional[int] = None,
+              stop_at: Optional[bytes] = None, chunk_size: int = 64 * 1024) -> Tuple[bytes, bool]:
+    """Read a streamed (stream=True) response's raw bytes, stopping early.
+
+    Reading ends after `max_bytes`, or as soon as the `stop_at` marker (e.g.
+    b'</head>') has arrived. Returns (content, complete); complete is False
+    when the rest of the body was left unread.
+    """
+    buffer = bytearray()
+    overlap = len(stop_at) - 1 if stop_at else 0
+    chunks = response.iter_content(chunk_size)
+    for chunk in chunks:
+        # Only the new chunk (plus a marker-sized overlap) needs searching
+        search_from = max(0, len(buffer) - overlap)
+        buffer += chunk
+        if max_bytes is not None and len(buffer) > max_bytes:
+            return bytes(buffer[:max_bytes]), False
+        if stop_at is not None and buffer.find(stop_at, search_from) != -1:
+            # The marker may have arrived in the last chunk of the body
+            return bytes(buffer), next(chunks, None) is None
+    return bytes(buffer), True
+
+
+# =============================================================================
+# Exporting and loading data
+# =============================================================================
+
+def open_data_file(filename: str, mode: str = 'w', compression: Optional[str] = None,
+                   newline: Optional[str] = None):
+    """Open a text file for export/import, optionally gzip or zstd compressed.
+
+    With compression=None the format is taken from the extension (.gz / .zst).
+    """
+    if compression is None:
+        if filename.endswith('.gz'):
+            compression = 'gzip'
+        elif filename.endswith('.zst'):
+            compression = 'zstd'
+
+    text_mode = mode + 't'
+    if compression is None:
+        return open(filename, mode, encoding='utf-8', newline=newline)
+    if compression == 'gzip':
+        return gzip.open(filename, text_mode, encoding='utf-8', newline=newline)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError("zstd compression requires zstandard: pip install zstandard")
+        return zstandard.open(filename, text_mode, encoding='utf-8', newline=newline)
+    raise ValueError(f"Unknown compression: {compression}")
+
+
+class JsonLinesWriter:
+    """Write records incrementally as JSON Lines (one JSON object per line).
+
+    Only the current record is held in memory, and the file is flushed every
+    `flush_every` records so a crashed crawl keeps what it already wrote.
+    """
+
+    def __init__(self, filename: str, compression: Optional[str] = None,
+                 flush_every: int = 1000):
+        self.filename = filename
+        self.flush_every = flush_every
+        self.count = 0
+        self._file = open_data_file(filename, 'w', compression)
+
+    def write(self, record: Dict):
+        self._file.write(json.dumps(record, ensure_ascii=False))
+        self._file.write('\n')
+        self.count += 1
+        if self.count % self.flush_every == 0:
+            self._file.flush()
+
+    def write_all(self, records: Iterable[Dict]) -> int:
+        for record in records:
+            self.write(record)
+        return self.count
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CsvStreamWriter:
+    """Write records incrementally as CSV.
+
+    The header comes from `fieldnames` or the first record. List values
+    (e.g. tags, features) are joined with ", " so they fit in one cell.
+    """
+
+    def __init__(self, filename: str, fieldnames: Optional[List[str]] = None,
+                 compression: Optional[str] = None, flush_every: int = 1000):
+        self.filename = filename
+        self.fieldnames = fieldnames
+        self.flush_every = flush_every
+        self.count = 0
+        self._file = open_data_file(filename, 'w', compression, newline='')
+        self._writer = None
+
+    def write(self, record: Dict):
+        if self._writer is None:
+            self.fieldnames = self.fieldnames or list(record.keys())
+            self._writer = csv.DictWriter(self._file, fieldnames=self.fieldnames,
+                                          extrasaction='ignore')
+            self._writer.writeheader()
+        self._writer.writerow({
+            key: ', '.join(map(str, value)) if isinstance(value, (list, tuple)) else value
+            for key, value in record.items()
+        })
+        self.count += 1
+        if self.count % self.flush_every == 0:
+            self._file.flush()
+
+    def write_all(self, records: Iterable[Dict]) -> int:
+        for record in records:
+            self.write(record)
+        return self.count
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ParquetStreamWriter:
+    """Write records to a Parquet file one row group at a time.
+
+    Records are buffered until `row_group_size` of them have arrived, then
+    written as a row group, so memory is bounded by one row group. Without
+    an explicit schema, it is inferred from the first row group.
+    """
+
+    def __init__(self, filename: str, schema=None, row_group_size: int = 10000,
+                 compression: str = 'snappy'):
+        if pq is None:
+            raise ImportError("Parquet export requires pyarrow: pip install pyarrow")
+        self.filename = filename
+        self.schema = schema
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.count = 0
+        self._buffer = []
+        self._writer = None
+
+    def write(self, record: Dict):
+        self._buffer.append(record)
+        self.count += 1
+        if len(self._buffer) >= self.row_group_size:
+            self._flush()
+
+    def write_all(self, records: Iterable[Dict]) -> int:
+        for record in records:
+            self.write(record)
+        return self.count
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        table = pa.Table.from_pylist(self._buffer, schema=self.schema)
+        if self._writer is None:
+            self.schema = table.schema
+            self._writer = pq.ParquetWriter(self.filename, self.schema,
+                                            compression=self.compression)
+        self._writer.write_table(table)
+        self._buffer = []
+
+    def close(self):
+        self._flush()
+        if self._writer is None and self.schema is not None:
+            # No records: still leave a valid (empty) file behind
+            self._writer = pq.ParquetWriter(self.filename, self.schema,
+                                            compression=self.compression)
+        if self._writer is not None:
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def load_parquet(filename: str, columns: Optional[List[str]] = None) -> List[Dict]:
+    """Load a Parquet file back into records (optionally just some columns)."""
+    if pq is None:
+        raise ImportError("Parquet loading requires pyarrow: pip install pyarrow")
+    return pq.read_table(filename, columns=columns).to_pylist()
+
+
+def read_jsonl(filename: str, compression: Optional[str] = None) -> Iterator[Dict]:
+    """Stream records back from a (possibly compressed) JSON Lines file."""
+    with open_data_file(filename, 'r', compression) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+# =============================================================================
+# Analytics
+# =============================================================================
+
+PRICE_RANGES = ('Under $50', '$50-$100', 'Over $100')
+
+
+def price_range(price: float) -> str:
+    if price < 50:
+        return 'Under $50'
+    if price <= 100:
+        return '$50-$100'
+    return 'Over $100'
+
+
+class ScrapeAnalytics:
+    """All the aggregates of analyze_scraped_data, computed in one pass.
+
+    Records can come from lists, generators or files on disk (read_jsonl,
+    load_parquet), and only running counters are kept in memory:
+
+        analytics = ScrapeAnalytics()
+        analytics.consume('products', read_jsonl('products.jsonl.gz'))
+    """
+
+    def __init__(self):
+        self.quote_count = 0
+        self.tag_counts = Counter()
+        self.news_count = 0
+        self.category_counts = Counter()
+        self.product_count = 0
+        self.price_total = 0.0
+        self.rating_total = 0.0
+        self.in_stock = 0
+        self.price_ranges = Counter({name: 0 for name in PRICE_RANGES})
+
+    def add(self, kind: str, record: Dict):
+        self.consume(kind, (record,))
+
+    def consume(self, kind: str, records: Iterable[Dict]) -> 'ScrapeAnalytics':
+        if kind == 'quotes':
+            self._consume_quotes(records)
+        elif kind == 'news':
+            self._consume_news(records)
+        elif kind == 'products':
+            self._consume_products(records)
+        else:
+            raise ValueError(f"Unknown record kind: {kind}")
+        return self
+
+    def _consume_quotes(self, records):
+        update_tags = self.tag_counts.update
+        count = 0
+        for quote in records:
+            count += 1
+            update_tags(quote['tags'])
+        self.quote_count += count
+
+    def _consume_news(self, records):
+        categories = self.category_counts
+        count = 0
+        for article in records:
+            count += 1
+            categories[article['category']] += 1
+        self.news_count += count
+
+    def _consume_products(self, records):
+        # Running totals live in local variables: much faster than attributes
+        count, price_total, rating_total, in_stock = 0, 0.0, 0.0, 0
+        under_50 = from_50_to_100 = over_100 = 0
+        for product in records:
+            price = product['price']
+            count += 1
+            price_total += price
+            rating_total += product['rating']
+            if product['availability'] == 'In Stock':
+                in_stock += 1
+            if price < 50:
+                under_50 += 1
+            elif price <= 100:
+                from_50_to_100 += 1
+            else:
+                over_100 += 1
+
+        self.product_count += count
+        self.price_total += price_total
+        self.rating_total += rating_total
+        self.in_stock += in_stock
+        self.price_ranges.update({'Under $50': under_50, '$50-$100': from_50_to_100,
+                                  'Over $100': over_100})
+
+    def summary(self) -> Dict:
+        most_common = self.tag_counts.most_common(1)
+        return {
+            'total_quotes': self.quote_count,
+            'unique_tags': len(self.tag_counts),
+            'most_common_tag': most_common[0] if most_common else None,
+            'total_articles': self.news_count,
+            'categories': dict(self.category_counts),
+            'total_products': self.product_count,
+            'average_price': self.price_total / self.product_count if self.product_count else 0.0,
+            'average_rating': self.rating_total / self.product_count if self.product_count else 0.0,
+            'in_stock': self.in_stock,
+            'price_ranges': dict(self.price_ranges)
+        }
+
+
+# =============================================================================
+# Duplicate detection
+# =============================================================================
+
+# Fields that change on every scrape and so must not affect duplicate checks.
+# 'url' is deliberately not here: two pages with the same text are usually
+# distinct items. Pass VOLATILE_FIELDS | {'url'} to also collapse mirrors.
+VOLATILE_FIELDS = frozenset({'id', 'scraped_at', 'processed_at', 'timestamp'})
+
+
+def record_text(record: Dict, ignore_fields=VOLATILE_FIELDS) -> str:
+    """All textual content of a record, in a stable field order."""
+    parts = []
+    for key in sorted(record):
+        if key in ignore_fields:
+            continue
+        value = record[key]
+        if isinstance(value, (list, tuple)):
+            parts.extend(str(v) for v in value)
+        elif isinstance(value, dict):
+            parts.append(record_text(value, ignore_fields))
+        elif value is not None:
+            parts.append(str(value))
+    return ' '.join(parts)
+
+
+def content_hash(record: Dict, ignore_fields=VOLATILE_FIELDS) -> bytes:
+    """16-byte fingerprint of a record's content, for exact duplicate checks."""
+    return hashlib.blake2b(record_text(record, ignore_fields).encode('utf-8'),
+                           digest_size=16).digest()
+
+
+def simhash(text: str, bits: int = 64) -> int:
+    """SimHash of a text: similar texts get fingerprints differing in few bits.
+
+    Features are word pairs (2-shingles), so word order matters a little.
+    """
+    words = re.findall(r'\w+', text.lower())
+    features = [' '.join(pair) for pair in zip(words, words[1:])] or words
+    weights = [0] * bits
+    for feature in features:
+        h = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=bits // 8).digest(), 'little')
+        for i in range(bits):
+            weights[i] += 1 if h >> i & 1 else -1
+    return sum(1 << i for i, weight in enumerate(weights) if weight > 0)
+
+
+class DuplicateDetector:
+    """Detect exact and near-duplicate records in a single pass.
+
+    - Exact duplicates: a 16-byte content hash per record, kept in a set.
+    - Near duplicates: a 64-bit SimHash per record, split into `bands`
+      bands (locality-sensitive hashing). Records sharing a band value are
+      candidates, and are duplicates if their SimHashes differ in at most
+      `max_distance` bits. With 4 bands and max_distance=3, any near
+      duplicate must match exactly in at least one band, so none are missed.
+      This needs max_distance < bands, and bands must divide 64 so the
+      bands cover the whole fingerprint; other settings raise ValueError.
+
+    Each record costs a constant amount of work and memory (about 40 bytes
+    of fingerprints). With `max_items`, the oldest fingerprints are forgotten
+    first so memory stays bounded on endless crawls. Fields named in
+    `ignore_fields` are left out of both fingerprints.
+    """
+
+    def __init__(self, max_distance: int = 3, bands: int = 4,
+                 max_items: Optional[int] = None, key=None,
+                 ignore_fields=VOLATILE_FIELDS):
+        if bands < 1 or 64 % bands:
+            raise ValueError(f"bands must divide 64, got {bands}")
+        if not 0 <= max_distance < bands:
+            raise ValueError(f"max_distance must be between 0 and bands - 1 ({bands - 1}), "
+                             f"got {max_distance}")
+        self.max_distance = max_distance
+        self.bands = bands
+        self.band_bits = 64 // bands
+        self.max_items = max_items
+        self.key = key  # e.g. lambda item: item['data'] to look inside wrappers
+        self.ignore_fields = frozenset(ignore_fields)
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+        self.unique = 0
+        self._hashes = set()
+        self._buckets = {}  # (band, band value) -> SimHashes in that bucket
+        self._history = deque()
+
+    def _bands_of(self, fingerprint: int):
+        mask = (1 << self.band_bits) - 1
+        return [(band, fingerprint >> (band * self.band_bits) & mask) for band in range(self.bands)]
+
+    def check(self, record: Dict) -> Optional[str]:
+        """Return 'exact' or 'near' for a duplicate, or None (and remember it)."""
+        content = self.key(record) if self.key else record
+        digest = content_hash(content, self.ignore_fields)
+        if digest in self._hashes:
+            self.exact_duplicates += 1
+            return 'exact'
+
+        fingerprint = simhash(record_text(content, self.ignore_fields))
+        bands = self._bands_of(fingerprint)
+        for bucket_key in bands:
+            for other in self._buckets.get(bucket_key, ()):
+                if bin(fingerprint ^ other).count('1') <= self.max_distance:
+                    self.near_duplicates += 1
+                    return 'near'
+
+        self._hashes.add(digest)
+        for bucket_key in bands:
+            self._buckets.setdefault(bucket_key, []).append(fingerprint)
+        self._history.append((digest, fingerprint))
+        self.unique += 1
+        if self.max_items is not None and len(self._history) > self.max_items:
+            self._forget_oldest()
+        return None
+
+    def _forget_oldest(self):
+        digest, fingerprint = self._history.popleft()
+        self._hashes.discard(digest)
+        for bucket_key in self._bands_of(fingerprint):
+            bucket = self._buckets[bucket_key]
+            bucket.remove(fingerprint)
+            if not bucket:
+                del self._buckets[bucket_key]
+
+    def filter(self, records: Iterable[Dict]) -> Iterator[Dict]:
+        """Yield only the records that are not duplicates of an earlier one."""
+        for record in records:
+            if self.check(record) is None:
+                yield record
+
+    def stats(self) -> Dict:
+        return {
+            'unique': self.unique,
+            'exact_duplicates': self.exact_duplicates,
+            'near_duplicates': self.near_duplicates
+        }
+
+
+# =============================================================================
+# Retries and validation
+# =============================================================================
+
+class RetryPolicy:
+    """Decides whether a failed request is worth retrying, and when.
+
+    - Only transient failures are retried: connection errors, timeouts and
+      408/425/429/5xx responses. A 404 will not fix itself.
+    - Waits grow exponentially with "full jitter" (a random wait between 0
+      and the exponential cap), so clients don't retry in lockstep.
+    - A Retry-After header from the server takes precedence.
+    - Each host has a retry budget, so one broken site can't eat the crawl.
+
+    The policy only computes delays; callers sleep with time.sleep (sync) or
+    asyncio.sleep (async), so it works in both fetch paths.
+    """
+
+    RETRYABLE_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+    def __init__(self, max_attempts=3, base_delay=1.0, max_delay=60.0,
+                 retry_statuses=RETRYABLE_STATUSES,
+                 budget_per_host=10, budget_window=60.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_statuses = frozenset(retry_statuses)
+        self.budget_per_host = budget_per_host
+        self.budget_window = budget_window
+        self._retry_times = {}  # host -> timestamps of recent retries
+        self._lock = threading.Lock()
+
+        retry_exceptions = [
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+            requests.exceptions.ChunkedEncodingError,
+            asyncio.TimeoutError,
+        ]
+        if aiohttp is not None:
+            retry_exceptions += [aiohttp.ClientConnectionError, aiohttp.ClientPayloadError]
+        self.retry_exceptions = tuple(retry_exceptions)
+
+    def is_retryable(self, status_code: Optional[int] = None,
+                     error: Optional[BaseException] = None) -> bool:
+        if error is not None:
+            return isinstance(error, self.retry_exceptions)
+        return status_code in self.retry_statuses
+
+    @staticmethod
+    def parse_retry_after(value: Optional[str]) -> Optional[float]:
+        """Retry-After is either a number of seconds or an HTTP date."""
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Seconds to wait after the given (0-based) failed attempt."""
+        server_delay = self.parse_retry_after(retry_after)
+        if server_delay is not None:
+            return min(server_delay, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def consume_budget(self, url: str) -> bool:
+        """Use one retry from the host's budget; False once it is spent."""
+        host = urlparse(url).netloc
+        now = time.monotonic()
+        with self._lock:
+            recent = [t for t in self._retry_times.get(host, []) if now - t < self.budget_window]
+            if len(recent) >= self.budget_per_host:
+                self._retry_times[host] = recent
+                return False
+            recent.append(now)
+            self._retry_times[host] = recent
+            return True
+
+    def next_delay(self, url: str, attempt: int, status_code: Optional[int] = None,
+                   error: Optional[BaseException] = None,
+                   retry_after: Optional[str] = None) -> Optional[float]:
+        """Seconds to wait before the next attempt, or None to give up."""
+        if attempt + 1 >= self.max_attempts:
+            return None
+        if not self.is_retryable(status_code, error):
+            return None
+        if not self.consume_budget(url):
+            print(f"⚠️  Retry budget for {urlparse(url).netloc} exhausted")
+            return None
+        return self.backoff(attempt, retry_after)
+
+
+def parse_price(value) -> float:
+    """Turn '$1,299.99' (or a number) into 1299.99."""
+    if type(value) is str:
+        # Two replace() calls beat str.translate several times over on short strings
+        value = value.replace('$', '').replace(',', '')
+    return float(value)
+
+
+@dataclass(frozen=True)
+class FieldRule:
+    """Declarative checks for one field of a scraped record."""
+    name: str
+    required: bool = True
+    types: Optional[tuple] = None           # e.g. (str,) or (int, float)
+    pattern: Optional[str] = None           # regex the value must match
+    min_value: Optional[float] = None
+    max_value: Optional[float] = None
+    coerce: Optional[Callable] = None       # applied before range checks, e.g. parse_price
+
+
+_EMPTY_TYPES = (str, list, dict, tuple)
+
+
+class RecordSchema:
+    """A set of FieldRules compiled once into fast validators.
+
+    Each rule becomes a closure that only performs the checks that rule
+    actually has. is_valid() runs them in order and stops at the first
+    failing field; field_errors() runs all of them to build the messages.
+    """
+
+    def __init__(self, rules: Iterable[FieldRule]):
+        self.rules = tuple(rules)
+        self._checks = tuple(self._compile(rule) for rule in self.rules)
+
+    @staticmethod
+    def _compile(rule: FieldRule) -> Callable[[Dict], Optional[str]]:
+        # Everything that doesn't depend on the value is worked out here,
+        # so the closure only pays for the checks this rule actually has
+        name, required = rule.name, rule.required
+        types = tuple(rule.types) if rule.types is not None else None
+        expected = '/'.join(t.__name__ for t in types) if types else ''
+        match = re.compile(rule.pattern).search if rule.pattern is not None else None
+        coerce, low, high = rule.coerce, rule.min_value, rule.max_value
+
+        def check(record):
+            value = record.get(name)
+            if value is None or (not value and isinstance(value, _EMPTY_TYPES)):
+                return f"Missing required field: {name}" if required else None
+            if types is not None and not isinstance(value, types):
+                return f"{name}: expected {expected}, got {type(value).__name__}"
+            if match is not None and match(value if type(value) is str else str(value)) is None:
+                return f"{name}: {value!r} does not match {rule.pattern}"
+            if coerce is not None:
+                try:
+                    value = coerce(value)
+                except (TypeError, ValueError, AttributeError):
+                    return f"{name}: invalid value {value!r}"
+            try:
+                if low is not None and value < low:
+                    return f"{name}: {value} is below {low}"
+                if high is not None and value > high:
+                    return f"{name}: {value} is above {high}"
+            except TypeError:
+                return f"{name}: {value!r} is not comparable to a number"
+            return None
+
+        return check
+
+    def field_errors(self, record: Dict) -> List[Tuple[str, str]]:
+        """(field, message) for every failing field of one record."""
+        problems = []
+        for rule, check in zip(self.rules, self._checks):
+            error = check(record)
+            if error is not None:
+                problems.append((rule.name, error))
+        return problems
+
+    def errors(self, record: Dict) -> List[str]:
+        """All problems with one record (empty when it is valid)."""
+        return [error for _, error in self.field_errors(record)]
+
+    def is_valid(self, record: Dict) -> bool:
+        """Fast path: stops at the first failing field."""
+        for check in self._checks:
+            if check(record) is not None:
+                return False
+        return True
+
+    def __call__(self, record: Dict) -> bool:
+        return self.is_valid(record)
+
+    def validate_batch(self, records: Iterable[Dict],
+                       max_failures: int = 100) -> Tuple[List[bool], Dict]:
+        """Validate many records; returns a boolean mask and an error report.
+
+        The report counts errors per field and keeps the messages for the
+        first `max_failures` bad records (by index) to keep it small.
+        """
+        mask = []
+        by_field = Counter()
+        failures = {}
+        is_valid, field_errors = self.is_valid, self.field_errors
+        for index, record in enumerate(records):
+            ok = is_valid(record)
+            mask.append(ok)
+            if not ok:
+                problems = field_errors(record)
+                by_field.update(name for name, _ in problems)
+                if len(failures) < max_failures:
+                    failures[index] = [error for _, error in problems]
+        valid = sum(mask)
+        report = {
+            'checked': len(mask),
+            'valid': valid,
+            'invalid': len(mask) - valid,
+            'errors_by_field': dict(by_field),
+            'failures': failures
+        }
+        return mask, report
+
+
+# =============================================================================
+# Concurrent scraping with asyncio
+# =============================================================================
+
+@dataclass
+class FetchResult:
+    """A downloaded page, detached from the connection that fetched it."""
+    url: str
+    status_code: int
+    text: str
+    headers: Dict[str, str] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+
+class AsyncScraper:
+    """Fetch many URLs concurrently while staying polite to every host.
+
+    - A semaphore bounds the total number of requests in flight.
+    - The aiohttp connector keeps a pool of keep-alive connections per host.
+    - The politeness delay is tracked per host, so a slow crawl of one
+      site never holds up requests to the others.
+    """
+
+    def __init__(self, max_concurrency=10, per_host_connections=2,
+                 delay_range=(1, 3), timeout=10,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 respect_robots: bool = True, robots_cache: Optional[RobotsCache] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 metrics: Optional[ScraperMetrics] = None):
+        if aiohttp is None:
+            raise ImportError("AsyncScraper requires aiohttp: pip install aiohttp")
+
+        self.max_concurrency = max_concurrency
+        self.per_host_connections = per_host_connections
+        self.delay_range = delay_range
+        self.timeout = timeout
+        self.headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        }
+
+        if rate_limiter is None:
+            average_delay = sum(delay_range) / 2
+            rate_limiter = RateLimiter(1.0 / average_delay if average_delay > 0 else None)
+        self.rate_limiter = rate_limiter
+
+        if respect_robots and robots_cache is None:
+            robots_cache = RobotsCache(rate_limiter=rate_limiter)
+        self.robots = robots_cache if respect_robots else None
+        self._robots_fetches = {}
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.metrics = metrics or ScraperMetrics()
+
+    async def fetch_robots_rules(self, session, url: str) -> RobotsRules:
+        """Fetch and cache robots.txt for this URL's host."""
+        robots_url = self.robots.robots_url(url)
+        try:
+            async with session.get(robots_url) as response:
+                return self.robots.store(url, response.status, await response.text())
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Error fetching {robots_url}: {e!r}")
+            return self.robots.store(url, None, '')
+
+    async def is_allowed(self, session, url: str) -> bool:
+        if self.robots is None:
+            return True
+        rules = self.robots.cached_rules(url)
+        if rules is None:
+            # Many tasks may hit a new host at once; only one fetches robots.txt
+            key = self.robots.host_key(url)
+            if key not in self._robots_fetches:
+                self._robots_fetches[key] = asyncio.ensure_future(self.fetch_robots_rules(session, url))
+            rules = await self._robots_fetches[key]
+        return rules.is_allowed(url)
+
+    async def fetch(self, session, semaphore, url: str) -> Optional[FetchResult]:
+        """Fetch a single URL, returning None on any error."""
+        if not await self.is_allowed(session, url):
+            print(f"🤖 Disallowed by robots.txt: {url}")
+            return None
+
+        attempt = 0
+        while True:
+            # Wait for the host before taking a slot, so idle waits don't block others
+            await self.rate_limiter.acquire_async(url)
+
+            status_code, error, retry_after = None, None, None
+            async with semaphore:
+                span = self.metrics.start_span('GET', url=url)
+                start = time.perf_counter()
+                try:
+                    async with session.get(url) as response:
+                        body = await response.read()
+                        elapsed = time.perf_counter() - start
+                        self.metrics.record_request(url, elapsed, response.status, len(body))
+                        self.metrics.end_span(span, status_code=response.status, bytes=len(body))
+                        if response.status < 400:
+                            return FetchResult(
+                                url=url,
+                                status_code=response.status,
+                                text=body.decode(codec_or_utf8(response.get_encoding()),
+                                                 errors='replace'),
+                                headers=dict(response.headers),
+                                elapsed=elapsed
+                            )
+                        status_code = response.status
+                        retry_after = response.headers.get('Retry-After')
+                        print(f"Error fetching {url}: HTTP {status_code}")
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    error = e
+                    self.metrics.record_request(url, time.perf_counter() - start, error=True)
+                    self.metrics.end_span(span, error=repr(e))
+                    print(f"Error fetching {url}: {e!r}")
+
+            # Back off outside the semaphore, so other requests keep flowing
+            wait = self.retry_policy.next_delay(url, attempt, status_code, error, retry_after)
+            if wait is None:
+                return None
+            self.metrics.record_retry(url)
+            await asyncio.sleep(wait)
+            attempt += 1
+
+    async def fetch_all(self, urls: List[str]) -> List[Optional[FetchResult]]:
+        """Fetch all URLs concurrently; results keep the order of `urls`."""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self.open_session() as session:
+            return await asyncio.gather(*(self.fetch(session, semaphore, url) for url in urls))
+
+    def open_session(self):
+        """A ClientSession whose connector pools keep-alive connections per host."""
+        self._robots_fetches = {}
+        connector = aiohttp.TCPConnector(
+            limit=self.max_concurrency,
+            limit_per_host=self.per_host_connections
+        )
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        return aiohttp.ClientSession(connector=connector, headers=self.headers, timeout=timeout)
+
+    def run(self, urls: List[str]) -> List[Optional[FetchResult]]:
+        """Synchronous entry point for fetch_all."""
+        return asyncio.run(self.fetch_all(urls))
+
+
+class ScrapingPipeline:
+    """Fetch → parse → validate/export as separate, overlapping stages.
+
+    - Fetching runs on the asyncio event loop (AsyncScraper).
+    - Parsing runs in a ProcessPoolExecutor, so CPU-heavy BeautifulSoup work
+      never stalls network I/O.
+    - Stages are connected by bounded queues: when parsing falls behind,
+      the parse queue fills up and the fetchers pause (backpressure).
+    - Validation and export (`sink`) run last, one record at a time.
+    """
+
+    _DONE = None  # Sentinel that tells a stage its input is exhausted
+
+    def __init__(self, fetcher: AsyncScraper, parse_workers: Optional[int] = None,
+                 queue_size: int = 32, parse_func=parse_page_in_worker,
+                 validator=None, sink=None):
+        self.fetcher = fetcher
+        self.parse_workers = parse_workers or os.cpu_count() or 2
+        self.queue_size = queue_size
+        self.parse_func = parse_func
+        self.validator = validator
+        self.sink = sink
+        self.metrics = {name: StageMetrics(name) for name in ('fetch', 'parse', 'export')}
+        self.fetched_urls = []
+        self.failed_urls = []
+
+    async def _fetch_stage(self, session, semaphore, url_queue, parse_queue):
+        metrics = self.metrics['fetch']
+        while True:
+            try:
+                url = url_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            result = await self.fetcher.fetch(session, semaphore, url)
+            metrics.record(time.perf_counter() - start, error=result is None)
+            if result is None:
+                self.failed_urls.append(url)
+                continue
+            self.fetched_urls.append(url)
+            await parse_queue.put(result)  # Waits here while the parsers are busy
+            metrics.observe_queue(parse_queue)
+            self.fetcher.metrics.observe_queue('parse', parse_queue.qsize())
+
+    async def _parse_stage(self, pool, parse_queue, export_queue):
+        loop = asyncio.get_running_loop()
+        metrics = self.metrics['parse']
+        while True:
+            result = await parse_queue.get()
+            if result is self._DONE:
+                return
+            start = time.perf_counter()
+            try:
+                record = await loop.run_in_executor(
+                    pool, self.parse_func, result.url, result.status_code, result.text)
+            except Exception as e:
+                print(f"❌ Error parsing {result.url}: {e}")
+                metrics.record(time.perf_counter() - start, error=True)
+                continue
+            metrics.record(time.perf_counter() - start)
+            await export_queue.put(record)
+            metrics.observe_queue(export_queue)
+            self.fetcher.metrics.observe_queue('export', export_queue.qsize())
+
+    async def _export_stage(self, export_queue, valid_records):
+        metrics = self.metrics['export']
+        while True:
+            record = await export_queue.get()
+            if record is self._DONE:
+                return
+            start = time.perf_counter()
+            try:
+                valid = self.validator is None or self.validator(record)
+                if valid and self.sink is not None:
+                    self.sink(record)
+            except Exception as e:
+                # Keep draining the queue, or the parsers would block on it forever
+                print(f"❌ Error exporting {record.get('url')}: {e}")
+                valid = False
+            if valid:
+                valid_records.append(record)
+            metrics.record(time.perf_counter() - start, error=not valid)
+
+    async def run_async(self, urls: List[str]) -> List[Dict]:
+        url_queue = asyncio.Queue()
+        for url in urls:
+            url_queue.put_nowait(url)
+        parse_queue = asyncio.Queue(maxsize=self.queue_size)
+        export_queue = asyncio.Queue(maxsize=self.queue_size)
+        semaphore = asyncio.Semaphore(self.fetcher.max_concurrency)
+        valid_records = []
+
+        with ProcessPoolExecutor(max_workers=self.parse_workers) as pool:
+            async with self.fetcher.open_session() as session:
+                parsers = [asyncio.create_task(self._parse_stage(pool, parse_queue, export_queue))
+                           for _ in range(self.parse_workers)]
+                exporter = asyncio.create_task(self._export_stage(export_queue, valid_records))
+
+                await asyncio.gather(*(self._fetch_stage(session, semaphore, url_queue, parse_queue)
+                                       for _ in range(self.fetcher.max_concurrency)))
+                for _ in parsers:
+                    await parse_queue.put(self._DONE)
+                await asyncio.gather(*parsers)
+                await export_queue.put(self._DONE)
+                await exporter
+
+        return valid_records
+
+    def run(self, urls: List[str]) -> List[Dict]:
+        """Synchronous entry point for run_async."""
+        return asyncio.run(self.run_async(urls))
+
+    def report(self):
+        print("\n📈 PIPELINE STAGE METRICS")
+        print(f"{'Stage':<8} {'Items':>6} {'Errors':>7} {'Items/s':>9} "
+              f"{'Avg ms':>8} {'Max ms':>8} {'Max queue':>10}")
+        for name, metrics in self.metrics.items():
+            m = metrics.summary()
+            print(f"{name:<8} {m['items']:>6} {m['errors']:>7} {m['throughput_per_s']:>9.1f} "
+                  f"{m['avg_latency_ms']:>8.1f} {m['max_latency_ms']:>8.1f} {m['max_queue_depth']:>10}")
+
+
+# =============================================================================
+# A local mock site for benchmarks
+# =============================================================================
+
+class MockSiteHandler(BaseHTTPRequestHandler):
+    """Serves MockSiteServer's generated pages."""
+
+    protocol_version = 'HTTP/1.1'  # keep-alive, like a real site
+    disable_nagle_algorithm = True  # Headers and body go out as separate writes
+
+    def do_GET(self):
+        site = self.server.site
+        if site.latency:
+            time.sleep(site.latency)
+        status, body = site.render(self.path)
+        payload = body.encode('utf-8')
+        with site.lock:
+            site.requests_served += 1
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class MockSiteServer:
+    """A local website of generated quote, news and product pages.
+
+    Pages are deterministic: the same seed, kind and page number always give
+    the same HTML, so runs are comparable. `items_per_page` controls page
+    size and `latency` adds a server-side delay per request, which makes it
+    possible to benchmark scrapers without touching the network:
+
+        with MockSiteServer(items_per_page=20, latency=0.05) as site:
+            urls = site.urls('quotes', 100)
+    """
+
+    KINDS = ('quotes', 'news', 'products')
+    WORDS = ('python', 'data', 'scraping', 'parser', 'network', 'async', 'thread',
+             'cache', 'request', 'page', 'crawler', 'record', 'export', 'schema',
+             'latency', 'server', 'queue', 'stream', 'library', 'open', 'source')
+    AUTHORS = ('Ada Lovelace', 'Alan Turing', 'Grace Hopper', 'Guido van Rossum',
+               'Margaret Hamilton', 'Donald Knuth', 'Barbara Liskov')
+    CATEGORIES = ('Technology', 'AI', 'Open Source', 'Science', 'Business')
+    PRODUCT_CATEGORIES = ('Electronics', 'Books', 'Office', 'Accessories')
+    AVAILABILITY = ('In Stock', 'Limited Stock', 'Out of Stock')
+
+    def __init__(self, items_per_page: int = 10, latency: float = 0.0,
+                 host: str = '127.0.0.1', port: int = 0, seed: int = 0):
+        self.items_per_page = items_per_page
+        self.latency = latency
+        self.seed = seed
+        self.address = (host, port)
+        self.requests_served = 0
+        self.lock = threading.Lock()
+        self._pages = {}
+        self._httpd = None
+
+    @property
+    def base_url(self) -> str:
+        if self._httpd is None:
+            raise RuntimeError("MockSiteServer is not running; call start() first")
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url(self, kind: str, page: int) -> str:
+        return f"{self.base_url}/{kind}/{page}"
+
+    def urls(self, kind: str, count: int) -> List[str]:
+        return [self.url(kind, page) for page in range(1, count + 1)]
+
+    def start(self) -> 'MockSiteServer':
+        self._httpd = ThreadingHTTPServer(self.address, MockSiteHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.site = self
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def render(self, path: str) -> Tuple[int, str]:
+        """(status, html) for a request path."""
+        if path == '/robots.txt':
+            return 200, 'User-agent: *\nAllow: /\n'
+        parts = path.strip('/').split('/')
+        if len(parts) != 2 or parts[0] not in self.KINDS or not parts[1].isdigit():
+            return 404, '<html><head><title>Not Found</title></head><body></body></html>'
+        kind, page = parts[0], int(parts[1])
+        # Rendered pages are kept, so the server's own CPU time stays out of benchmarks
+        key = (kind, page)
+        html = self._pages.get(key)
+        if html is None:
+            html = self._pages[key] = self.render_page(kind, page)
+        return 200, html
+
+    def render_page(self, kind: str, page: int) -> str:
+        rng = random.Random(f"{self.seed}:{kind}:{page}")
+        render_item = {'quotes': self._quote_html, 'news': self._news_html,
+                       'products': self._product_html}[kind]
+        items = '\n'.join(render_item(rng, page * 1000 + i) for i in range(self.items_per_page))
+        return (f"<!DOCTYPE html>\n<html><head><title>{kind.title()} - page {page}</title>"
+                f'<meta name="description" content="Generated {kind} page {page}">'
+                f'<link rel="canonical" href="/{kind}/{page}"></head>\n'
+                f"<body><div class=\"container\">\n{items}\n"
+                f'<ul class="pager"><li class="next"><a href="/{kind}/{page + 1}">Next</a></li></ul>'
+                f"</div></body></html>")
+
+    def _sentence(self, rng: random.Random, words: int) -> str:
+        return ' '.join(rng.choice(self.WORDS) for _ in range(words)).capitalize()
+
+    def _quote_html(self, rng: random.Random, item_id: int) -> str:
+        tags = ''.join(f'<a class="tag" href="/tag/{tag}">{tag}</a>'
+                       for tag in rng.sample(self.WORDS, 3))
+        return (f'<div class="quote"><span class="text">“{self._sentence(rng, 12)}.”</span>'
+                f'<span>by <small class="author">{rng.choice(self.AUTHORS)}</small></span>'
+                f'<div class="tags">{tags}</div></div>')
+
+    def _news_html(self, rng: random.Random, item_id: int) -> str:
+        timestamp = f"2025-10-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00"
+        return (f'<article class="news"><h2 class="headline">'
+                f'<a href="/news/article/{item_id}">{self._sentence(rng, 7)}</a></h2>'
+                f'<p class="summary">{self._sentence(rng, 25)}...</p>'
+                f'<span class="category">{rng.choice(self.CATEGORIES)}</span>'
+                f'<time datetime="{timestamp}">{timestamp}</time></article>')
+
+    def _product_html(self, rng: random.Random, item_id: int) -> str:
+        features = ''.join(f'<li>{self._sentence(rng, 2)}</li>' for _ in range(3))
+        return (f'<div class="product"><h3 class="name">'
+                f'<a href="/products/item/{item_id}">{self._sentence(rng, 3)}</a></h3>'
+                f'<span class="price">${rng.uniform(5, 500):,.2f}</span>'
+                f'<span class="rating">{rng.uniform(1, 5):.1f}</span>'
+                f'<span class="reviews">{rng.randint(0, 5000)}</span>'
+                f'<p class="availability">{rng.choice(self.AVAILABILITY)}</p>'
+                f'<span class="category">{rng.choice(self.PRODUCT_CATEGORIES)}</span>'
+                f'<ul class="features">{features}</ul></div>')
+
+
+# =============================================================================
+# Crawling: the URL frontier
+# =============================================================================
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form of a URL, so trivially different spellings dedupe.
+
+    Lowercases scheme and host, drops default ports and #fragments, sorts
+    query parameters and gives empty paths a "/".
+    """
+    parsed = urlparse(url.strip())
+    scheme = parsed.scheme.lower()
+    host = (parsed.hostname or '').lower()
+    if parsed.port and parsed.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parsed.port}"
+    query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+    return f"{scheme}://{host}{parsed.path or '/'}" + (f"?{query}" if query else '')
+
+
+def extract_links(html: str, base_url: str) -> List[str]:
+    """Absolute http(s) links found in a page."""
+    soup = BeautifulSoup(html, DEFAULT_HTML_PARSER, parse_only=SoupStrainer('a', href=True))
+    links = []
+    for anchor in soup.find_all('a', href=True):
+        link = urljoin(base_url, anchor['href'])
+        if urlparse(link).scheme in ('http', 'https'):
+            links.append(link)
+    return links
+
+
+class BloomFilter:
+    """Fixed-size set membership test with a small false-positive rate.
+
+    A million URLs fit in about 1.8 MB at a 0.1% error rate, versus well over
+    100 MB for a set of the strings. The trade-off: a few never-seen URLs
+    are wrongly reported as seen (and skipped); seen URLs are never missed.
+    """
+
+    def __init__(self, capacity: int = 1_000_000, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def to_dict(self) -> Dict:
+        return {'capacity': self.capacity, 'error_rate': self.error_rate,
+                'bits': base64.b64encode(bytes(self.bits)).decode('ascii')}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'BloomFilter':
+        bloom = cls(data['capacity'], data['error_rate'])
+        bloom.bits = bytearray(base64.b64decode(data['bits']))
+        return bloom
+
+
+class CrawlFrontier:
+    """The queue of URLs still to crawl.
+
+    - URLs are normalized and deduplicated (exactly with a set, or in fixed
+      memory with a BloomFilter for very large crawls).
+    - Each host has its own priority queue (lower number = sooner) and hosts
+      are served round-robin, so one big site can't starve the others.
+    - URLs deeper than `max_depth` links from a seed are dropped.
+    - save()/load() checkpoint the whole frontier to disk so long crawls can
+      resume after a restart.
+    """
+
+    def __init__(self, max_depth: int = 3, max_urls: Optional[int] = None,
+                 use_bloom_filter: bool = False, bloom_capacity: int = 1_000_000):
+        self.max_depth = max_depth
+        self.max_urls = max_urls
+        self.seen = BloomFilter(bloom_capacity) if use_bloom_filter else set()
+        self.added = 0
+        self._queues = {}     # host -> heap of (priority, sequence, url, depth)
+        self._hosts = deque()  # hosts with pending URLs, in round-robin order
+        self._sequence = 0
+
+    def add(self, url: str, depth: int = 0, priority: int = 0) -> bool:
+        """Queue a URL; False if it was a duplicate or over a limit."""
+        if depth > self.max_depth:
+            return False
+        if self.max_urls is not None and self.added >= self.max_urls:
+            return False
+        url = normalize_url(url)
+        if url in self.seen:
+            return False
+        self.seen.add(url)
+        self.added += 1
+
+        host = urlparse(url).netloc
+        if host not in self._queues:
+            self._queues[host] = []
+            self._hosts.append(host)
+        heapq.heappush(self._queues[host], (priority, self._sequence, url, depth))
+        self._sequence += 1
+        return True
+
+    def add_links(self, html: str, base_url: str, depth: int, priority: int = 0) -> int:
+        """Queue every link on a page found at `depth`; returns how many were new."""
+        return sum(self.add(link, depth + 1, priority) for link in extract_links(html, base_url))
+
+    def next(self) -> Optional[Tuple[str, int]]:
+        """Next (url, depth) to crawl, rotating between hosts; None when empty."""
+        while self._hosts:
+            host = self._hosts.popleft()
+            queue = self._queues[host]
+            _, _, url, depth = heapq.heappop(queue)
+            if queue:
+                self._hosts.append(host)
+            else:
+                del self._queues[host]
+            return url, depth
+        return None
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def save(self, path: str):
+        """Checkpoint the frontier (pending URLs and what has been seen)."""
+        state = {
+            'max_depth': self.max_depth,
+            'max_urls': self.max_urls,
+            'added': self.added,
+            'sequence': self._sequence,
+            'hosts': list(self._hosts),
+            'queues': self._queues,
+            'seen': self.seen.to_dict() if isinstance(self.seen, BloomFilter) else sorted(self.seen),
+        }
+        # Write to a temporary file first, so a crash never leaves half a checkpoint
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'CrawlFrontier':
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        frontier = cls(max_depth=state['max_depth'], max_urls=state['max_urls'])
+        frontier.added = state['added']
+        frontier._sequence = state['sequence']
+        frontier._hosts = deque(state['hosts'])
+        frontier._queues = {host: [tuple(entry) for entry in queue]
+                            for host, queue in state['queues'].items()}
+        seen = state['seen']
+        frontier.seen = BloomFilter.from_dict(seen) if isinstance(seen, dict) else set(seen)
+        return frontier
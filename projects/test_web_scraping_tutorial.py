@@ -0,0 +1,1215 @@
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="module")
+def tutorial(tmp_path_factory):
+    # Importing the tutorial runs its demos, which write export files to the CWD
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("tutorial"))
+    try:
+        yield importlib.import_module("web_scraping_tutorial")
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture(scope="module")
+def toolkit():
+    return importlib.import_module("scraping_toolkit")
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Local stand-in for a real website."""
+
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        self.server.hits.append((self.headers["Host"].split(":")[0], self.path, time.monotonic()))
+        if self.path.startswith("/slow"):
+            with self.server.lock:
+                self.server.active += 1
+                self.server.max_active = max(self.server.max_active, self.server.active)
+            time.sleep(0.2)
+            with self.server.lock:
+                self.server.active -= 1
+        if self.path == "/robots.txt":
+            status, body = (200, self.server.robots) if self.server.robots else (404, "")
+        elif self.path.startswith("/site/"):
+            # A small linked site: each page links to the next two
+            n = int(self.path.rsplit("/", 1)[1])
+            links = "".join(f'<a href="/site/{m}">{m}</a>' for m in (n + 1, n + 2) if m < 6)
+            status, body = 200, f"<html><head><title>Site {n}</title></head><body>{links}</body></html>"
+        elif self.path == "/missing":
+            status, body = 404, "<html><head><title>Not Found</title></head></html>"
+        else:
+            status, body = 200, f"<html><head><title>Page {self.path}</title></head><body></body></html>"
+
+        headers = {}
+        if self.path.startswith("/flaky") and self.server.flaky_failures > 0:
+            self.server.flaky_failures -= 1
+            status, body = 503, "busy"
+            headers["Retry-After"] = "0"
+        if self.path.startswith("/etag"):
+            headers["ETag"] = '"v1"'
+            if self.headers.get("If-None-Match") == '"v1"':
+                status, body = 304, ""
+
+        payload = body.encode("utf-8")
+        if self.path != "/robots.txt":
+            self.server.statuses.append(status)
+        charset = "x-no-such-charset" if self.path.startswith("/badcharset") else "utf-8"
+        self.send_response(status)
+        self.send_header("Content-Type", f"text/html; charset={charset}")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    httpd.hits = []
+    httpd.robots = None
+    httpd.statuses = []
+    httpd.flaky_failures = 0
+    httpd.lock = threading.Lock()
+    httpd.active = httpd.max_active = 0  # concurrent /slow requests
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield httpd
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def base_url(server, host="127.0.0.1"):
+    return f"http://{host}:{server.server_address[1]}"
+
+
+def test_async_fetch_keeps_order_and_drops_errors(tutorial, server):
+    scraper = tutorial.AsyncScraper(delay_range=(0, 0))
+    urls = [base_url(server) + "/a", base_url(server) + "/missing", base_url(server) + "/b"]
+
+    results = scraper.run(urls)
+
+    assert results[1] is None
+    assert [r.url for r in (results[0], results[2])] == [urls[0], urls[2]]
+    assert "<title>Page /a</title>" in results[0].text
+
+
+def test_async_fetch_runs_requests_in_parallel(tutorial, server):
+    scraper = tutorial.AsyncScraper(max_concurrency=5, per_host_connections=5, delay_range=(0, 0))
+    urls = [base_url(server) + f"/slow/{i}" for i in range(5)]
+
+    results = scraper.run(urls)
+
+    assert all(results)
+    assert server.max_active > 1  # several slow requests were in flight at once
+
+
+def test_async_politeness_delay_is_per_host(tutorial, server):
+    scraper = tutorial.AsyncScraper(delay_range=(0.3, 0.3))
+    urls = [base_url(server, host) + f"/{i}" for host in ("127.0.0.1", "localhost") for i in range(2)]
+
+    assert all(scraper.run(urls))
+
+    times = {host: [t for h, path, t in server.hits if h == host and path != "/robots.txt"]
+             for host in ("127.0.0.1", "localhost")}
+    for host, other in (("127.0.0.1", "localhost"), ("localhost", "127.0.0.1")):
+        assert times[host][1] - times[host][0] >= 0.29
+        # Both hosts were crawled side by side: neither waited for the other's delay
+        assert times[other][0] < times[host][1]
+
+
+def test_robust_scraper_scrape_concurrently(tutorial, server):
+    scraper = tutorial.RobustScraper(delay_range=(0, 0))
+    urls = [base_url(server) + "/a", base_url(server) + "/missing"]
+
+    data = scraper.scrape_concurrently(urls)
+
+    assert [item["title"] for item in data] == ["Page /a"]
+    assert scraper.successful_urls == [urls[0]]
+    assert scraper.failed_urls == [urls[1]]
+
+
+def test_rate_limiter_allows_burst_then_spaces_requests(tutorial):
+    limiter = tutorial.RateLimiter(requests_per_second=2, burst=3)
+
+    waits = [limiter.reserve("https://example.com/a") for _ in range(5)]
+
+    assert waits[:3] == [0.0, 0.0, 0.0]
+    assert waits[3] == pytest.approx(0.5, abs=0.01)
+    assert waits[4] == pytest.approx(1.0, abs=0.01)
+    # Other domains have their own bucket
+    assert limiter.reserve("https://other.example/") == 0.0
+
+
+def test_rate_limiter_honours_crawl_delay(tutorial):
+    limiter = tutorial.RateLimiter(requests_per_second=100, burst=10)
+    limiter.set_crawl_delay("https://example.com/robots.txt", 4)
+
+    assert limiter.reserve("example.com") == 0.0
+    assert limiter.reserve("https://example.com/page") == pytest.approx(4.0, abs=0.01)
+
+
+def test_refreshing_crawl_delay_keeps_the_token_balance(tutorial):
+    limiter = tutorial.RateLimiter(requests_per_second=100, burst=10)
+    limiter.set_crawl_delay("https://example.com/robots.txt", 4)
+    assert limiter.reserve("example.com") == 0.0
+
+    # A robots.txt refresh must not hand out another free request
+    limiter.set_crawl_delay("https://example.com/robots.txt", 4)
+
+    assert limiter.reserve("example.com") == pytest.approx(4.0, abs=0.01)
+
+
+def test_rate_limiter_is_shared_between_threads(tutorial):
+    limiter = tutorial.RateLimiter(requests_per_second=10, burst=1)
+    waits = []
+    lock = threading.Lock()
+
+    def worker():
+        wait = limiter.reserve("example.com")
+        with lock:
+            waits.append(wait)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Every thread got its own slot, 0.1s apart
+    assert sorted(round(w, 1) for w in waits) == [round(0.1 * i, 1) for i in range(8)]
+
+
+ROBOTS_TXT = """
+User-agent: *
+Disallow: /private/
+Allow: /private/open$
+Disallow: /*.pdf$
+
+User-agent: special-bot
+Disallow: /
+Crawl-delay: 7
+"""
+
+
+def test_robots_rules_longest_match_wins(tutorial):
+    rules = tutorial.RobotsRules.parse(ROBOTS_TXT)
+
+    assert rules.is_allowed("/public/page")
+    assert not rules.is_allowed("/private/secret")
+    assert rules.is_allowed("/private/open")
+    assert not rules.is_allowed("/private/open/more")
+    assert not rules.is_allowed("https://example.com/docs/file.pdf")
+    assert rules.is_allowed("https://example.com/docs/file.pdf?download=1")
+    assert rules.crawl_delay is None
+
+
+def test_robots_rules_pick_the_matching_user_agent_group(tutorial):
+    rules = tutorial.RobotsRules.parse(ROBOTS_TXT, user_agent="Special-Bot/1.0")
+
+    assert not rules.is_allowed("/public/page")
+    assert rules.crawl_delay == 7
+
+
+def test_robots_cache_missing_and_failing_robots(tutorial):
+    cache = tutorial.RobotsCache()
+
+    assert cache.store("https://missing.example/a", 404, "").is_allowed("/anything")
+    assert not cache.store("https://broken.example/a", 503, "").is_allowed("/anything")
+    assert not cache.store("https://down.example/a", None, "").is_allowed("/anything")
+
+
+def test_robots_cache_persists_to_disk_and_expires(tutorial, tmp_path):
+    cache_file = str(tmp_path / "robots.json")
+    cache = tutorial.RobotsCache(cache_file=cache_file, ttl=60)
+    fetches = []
+
+    def fetch(robots_url):
+        fetches.append(robots_url)
+        return 200, ROBOTS_TXT
+
+    assert not cache.is_allowed("https://example.com/private/x", fetch)
+    assert cache.is_allowed("https://example.com/public", fetch)
+    assert fetches == ["https://example.com/robots.txt"]
+
+    # A new process picks the rules up from disk without fetching
+    reloaded = tutorial.RobotsCache(cache_file=cache_file, ttl=60)
+    assert not reloaded.is_allowed("https://example.com/private/x", fetch)
+    assert len(fetches) == 1
+
+    # Expired entries are fetched again
+    expired = tutorial.RobotsCache(cache_file=cache_file, ttl=0)
+    expired.is_allowed("https://example.com/public", fetch)
+    assert len(fetches) == 2
+
+
+def test_robots_cache_loads_without_rewriting_the_file(tutorial, tmp_path):
+    cache_file = tmp_path / "robots.json"
+    cache = tutorial.RobotsCache(cache_file=str(cache_file))
+    for n in range(3):
+        cache.store(f"https://host{n}.example/", 200, ROBOTS_TXT)
+    os.utime(cache_file, (0, 0))
+
+    reloaded = tutorial.RobotsCache(cache_file=str(cache_file))
+
+    assert reloaded.cached_rules("https://host2.example/x") is not None
+    assert cache_file.stat().st_mtime == 0
+    assert [p.name for p in tmp_path.iterdir()] == ["robots.json"]
+
+
+def test_get_page_checks_robots_once_per_host(tutorial, server):
+    server.robots = "User-agent: *\nDisallow: /private/\n"
+    scraper = tutorial.WebScraper(delay_range=(0, 0))
+
+    assert scraper.get_page(base_url(server) + "/private/page") is None
+    assert scraper.get_page(base_url(server) + "/public/page").status_code == 200
+    assert scraper.get_page(base_url(server) + "/public/other").status_code == 200
+
+    paths = [path for _, path, _ in server.hits]
+    assert paths == ["/robots.txt", "/public/page", "/public/other"]
+
+
+def test_async_scraper_respects_robots(tutorial, server):
+    server.robots = "User-agent: *\nDisallow: /private/\n"
+    scraper = tutorial.AsyncScraper(delay_range=(0, 0))
+    urls = [base_url(server) + path for path in ("/private/a", "/b", "/c", "/d")]
+
+    results = scraper.run(urls)
+
+    assert results[0] is None and all(results[1:])
+    assert [path for _, path, _ in server.hits].count("/robots.txt") == 1
+
+
+def test_http_cache_serves_304_from_disk(tutorial, server, tmp_path, capsys):
+    cache_path = str(tmp_path / "cache.sqlite3")
+    url = base_url(server) + "/etag/page"
+
+    scraper = tutorial.RobustScraper(delay_range=(0, 0), cache=tutorial.HttpCache(cache_path))
+    first = scraper.get_page(url)
+    scraper.cache.close()
+
+    # A fresh scraper (e.g. the next run of the job) reuses the cached body
+    rerun = tutorial.RobustScraper(delay_range=(0, 0), cache=tutorial.HttpCache(cache_path))
+    second = rerun.get_page(url)
+
+    assert second.status_code == 200
+    assert second.text == first.text
+    assert second.headers["ETag"] == '"v1"'
+    assert server.statuses == [200, 304]
+    assert rerun.cache.stats() == {
+        "hits": 1, "misses": 0, "hit_rate": 1.0, "bytes_saved": len(first.content)
+    }
+
+    rerun.successful_urls.append(url)
+    rerun.generate_report()
+    assert "Cache: 1 hits, 0 misses (100% hit rate" in capsys.readouterr().out
+
+
+def test_http_cache_skips_responses_without_validators(tutorial, server, tmp_path):
+    cache = tutorial.HttpCache(str(tmp_path / "cache.sqlite3"))
+    scraper = tutorial.WebScraper(delay_range=(0, 0), respect_robots=False, cache=cache)
+
+    scraper.get_page(base_url(server) + "/plain")
+    scraper.get_page(base_url(server) + "/plain")
+
+    assert cache.stats()["misses"] == 2
+    assert cache.load(base_url(server) + "/plain") is None
+
+
+def test_retry_policy_full_jitter_stays_under_exponential_cap(tutorial):
+    policy = tutorial.RetryPolicy(base_delay=1.0, max_delay=5.0)
+
+    for attempt, cap in [(0, 1.0), (1, 2.0), (2, 4.0), (6, 5.0)]:
+        waits = [policy.backoff(attempt) for _ in range(200)]
+        assert all(0 <= w <= cap for w in waits)
+        assert max(waits) > cap / 2
+
+
+def test_retry_policy_honours_retry_after(tutorial):
+    policy = tutorial.RetryPolicy(max_delay=30)
+
+    assert policy.backoff(0, retry_after="7") == 7
+    assert policy.backoff(0, retry_after="120") == 30
+    assert policy.backoff(0, retry_after="Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    assert policy.parse_retry_after("soon") is None
+
+
+def test_retry_policy_only_retries_transient_failures(tutorial):
+    policy = tutorial.RetryPolicy(max_attempts=3)
+    url = "https://example.com/"
+
+    assert policy.next_delay(url, 0, status_code=404) is None
+    assert policy.next_delay(url, 0, error=ValueError("bug")) is None
+    assert policy.next_delay(url, 0, status_code=503) is not None
+    assert policy.next_delay(url, 0, error=tutorial.requests.exceptions.ConnectionError()) is not None
+    assert policy.next_delay(url, 2, status_code=503) is None  # out of attempts
+
+
+def test_retry_policy_budget_is_per_host(tutorial):
+    policy = tutorial.RetryPolicy(max_attempts=10, base_delay=0, budget_per_host=2)
+
+    assert policy.next_delay("https://a.example/1", 0, status_code=503) is not None
+    assert policy.next_delay("https://a.example/2", 0, status_code=503) is not None
+    assert policy.next_delay("https://a.example/3", 0, status_code=503) is None
+    assert policy.next_delay("https://b.example/1", 0, status_code=503) is not None
+
+
+def test_get_page_with_retries_recovers_from_503(tutorial, server):
+    server.flaky_failures = 2
+    scraper = tutorial.RobustScraper(max_retries=3, delay_range=(0, 0))
+
+    response = scraper.get_page_with_retries(base_url(server) + "/flaky")
+
+    assert response.status_code == 200
+    assert server.statuses == [503, 503, 200]
+
+
+def test_get_page_with_retries_does_not_retry_404(tutorial, server):
+    scraper = tutorial.RobustScraper(max_retries=3, delay_range=(0, 0))
+
+    assert scraper.get_page_with_retries(base_url(server) + "/missing") is None
+    assert server.statuses == [404]
+    assert scraper.failed_urls == [base_url(server) + "/missing"]
+
+
+def test_async_scraper_retries_without_blocking_other_requests(tutorial, server):
+    server.flaky_failures = 1
+    policy = tutorial.RetryPolicy(max_attempts=2)
+    scraper = tutorial.AsyncScraper(delay_range=(0, 0), retry_policy=policy)
+
+    results = scraper.run([base_url(server) + "/flaky", base_url(server) + "/other"])
+
+    assert all(result.status_code == 200 for result in results)
+    assert sorted(server.statuses) == [200, 200, 503]
+
+
+def test_extract_head_fields_stops_at_body(tutorial):
+    consumed = []
+
+    def chunks():
+        for chunk in [
+            '<html><head><meta charset="utf-8"><title>Big &amp; ',
+            'Store</title><meta name="description" content=" Cheap things ">',
+            '<link rel="canonical" href="https://example.com/"></head>',
+            "<body>" + "<p>never read</p>" * 1000,
+        ]:
+            consumed.append(chunk)
+            yield chunk
+        raise AssertionError("read past <head>")
+
+    fields = tutorial.extract_head_fields(chunks())
+
+    assert fields == {
+        "charset": "utf-8",
+        "title": "Big & Store",
+        "description": "Cheap things",
+        "canonical": "https://example.com/",
+    }
+    assert len(consumed) == 3
+
+
+def test_extract_head_fields_without_head(tutorial):
+    assert tutorial.extract_head_fields("<title>Bare</title><p>text</p>") == {"title": "Bare"}
+    assert tutorial.extract_head_fields("<p>no title</p>") == {}
+
+
+def test_parse_html_with_strainer_builds_only_matching_elements(tutorial):
+    scraper = tutorial.WebScraper(parser="html.parser")
+    html = tutorial.generate_large_html(items=20)
+
+    soup = scraper.parse_html(html, parse_only=tutorial.SoupStrainer("span", class_="price"))
+
+    assert len(soup.find_all("span")) == 20
+    assert soup.find("h2") is None and soup.find("title") is None
+
+
+def test_default_parser_prefers_lxml_when_installed(tutorial):
+    expected = "lxml" if tutorial.find_spec("lxml") else "html.parser"
+    assert tutorial.WebScraper().parser == expected
+    assert tutorial.WebScraper(parser="html.parser").parser == "html.parser"
+
+
+def test_benchmark_parsers_on_large_fixture(tutorial):
+    html = tutorial.generate_large_html(items=2000)
+
+    results = tutorial.benchmark_parsers(html, repeat=1)
+
+    parsers = ["html.parser"] + (["lxml"] if tutorial.find_spec("lxml") else [])
+    expected = {"head fields (streaming)"}
+    for parser in parsers:
+        expected |= {f"full parse ({parser})", f"prices only ({parser})"}
+    assert set(results) == expected
+    assert all(ms > 0 for ms in results.values())
+    assert html.count('class="price"') == 2000
+
+
+def slow_parse(url, status_code, html):
+    # Module level so the process pool can pickle it
+    time.sleep(0.05)
+    return {"url": url, "title": "slow"}
+
+
+def test_scrape_pipeline_fetches_parses_and_exports(tutorial, server):
+    scraper = tutorial.RobustScraper(delay_range=(0, 0))
+    urls = [base_url(server) + f"/page/{i}" for i in range(6)] + [base_url(server) + "/missing"]
+    exported = []
+
+    data = scraper.scrape_pipeline(urls, parse_workers=2, sink=exported.append)
+
+    assert sorted(item["title"] for item in data) == sorted(f"Page /page/{i}" for i in range(6))
+    assert exported == data
+    assert scraper.failed_urls == [urls[-1]]
+    assert len(scraper.successful_urls) == 6
+
+
+def test_pipeline_applies_backpressure_and_records_stage_metrics(tutorial, server):
+    fetcher = tutorial.AsyncScraper(max_concurrency=4, delay_range=(0, 0))
+    pipeline = tutorial.ScrapingPipeline(fetcher, parse_workers=1, queue_size=1, parse_func=slow_parse)
+
+    records = pipeline.run([base_url(server) + f"/{i}" for i in range(8)])
+
+    assert len(records) == 8
+    fetch, parse, export = (pipeline.metrics[name].summary() for name in ("fetch", "parse", "export"))
+    assert fetch["items"] == parse["items"] == export["items"] == 8
+    assert fetch["max_queue_depth"] <= 1
+    assert parse["avg_latency_ms"] >= 50
+    assert parse["throughput_per_s"] > 0
+
+
+def test_pipeline_keeps_exporting_after_a_sink_error(tutorial, server):
+    fetcher = tutorial.AsyncScraper(max_concurrency=2, delay_range=(0, 0))
+    exported = []
+
+    def flaky_sink(record):
+        if record["url"].endswith("/1"):
+            raise OSError("disk full")
+        exported.append(record)
+
+    pipeline = tutorial.ScrapingPipeline(fetcher, parse_workers=1, queue_size=1, sink=flaky_sink)
+    records = pipeline.run([base_url(server) + f"/{i}" for i in range(5)])
+
+    assert len(records) == len(exported) == 4
+    assert pipeline.metrics["export"].summary()["errors"] == 1
+
+
+def test_toolkit_imports_without_side_effects():
+    import subprocess
+
+    # Process-pool workers re-import it, so it must not run the tutorial's demos
+    result = subprocess.run([sys.executable, "-c", "import sys, scraping_toolkit; "
+                             "print('web_scraping_tutorial' in sys.modules)"],
+                            cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True, timeout=30)
+
+    assert result.returncode == 0 and result.stdout == "False\n"
+
+
+def generated_records(count):
+    for i in range(count):
+        yield {"id": i, "name": f"Product {i}", "features": ["A", "B"], "price": i + 0.5}
+
+
+@pytest.mark.parametrize("filename", ["records.jsonl", "records.jsonl.gz"])
+def test_stream_to_jsonl_round_trips(tutorial, toolkit, tmp_path, filename):
+    path = str(tmp_path / filename)
+
+    count = tutorial.WebScraper().stream_to_jsonl(generated_records(2500), path, flush_every=100)
+
+    assert count == 2500
+    records = list(toolkit.read_jsonl(path))
+    assert records[0] == {"id": 0, "name": "Product 0", "features": ["A", "B"], "price": 0.5}
+    assert len(records) == 2500
+
+
+def test_jsonl_writer_flushes_periodically(tutorial, tmp_path):
+    path = tmp_path / "partial.jsonl"
+
+    with tutorial.JsonLinesWriter(str(path), flush_every=10) as writer:
+        for record in generated_records(25):
+            writer.write(record)
+        # Everything up to the last flush is already on disk
+        assert len(path.read_text(encoding="utf-8").splitlines()) == 20
+
+    assert len(path.read_text(encoding="utf-8").splitlines()) == 25
+
+
+def test_stream_to_csv_flattens_lists(tutorial, toolkit, tmp_path):
+    path = str(tmp_path / "products.csv.gz")
+
+    tutorial.WebScraper().stream_to_csv(generated_records(3), path)
+
+    with toolkit.open_data_file(path, "r", newline="") as f:
+        rows = list(tutorial.csv.DictReader(f))
+    assert rows[2] == {"id": "2", "name": "Product 2", "features": "A, B", "price": "2.5"}
+
+
+def test_stream_to_zstd(tutorial, toolkit, tmp_path):
+    pytest.importorskip("zstandard")
+    path = str(tmp_path / "records.jsonl.zst")
+
+    tutorial.WebScraper().stream_to_jsonl(generated_records(10), path)
+
+    assert [r["id"] for r in toolkit.read_jsonl(path)] == list(range(10))
+
+
+def test_open_data_file_rejects_unknown_compression(toolkit, tmp_path):
+    with pytest.raises(ValueError):
+        toolkit.open_data_file(str(tmp_path / "x"), "w", compression="rar")
+
+
+def test_parquet_round_trip_keeps_types(tutorial, tmp_path):
+    pytest.importorskip("pyarrow")
+    path = str(tmp_path / "products.parquet")
+    schema = tutorial.scraped_data_schema("products")
+
+    tutorial.WebScraper().save_to_parquet(iter(tutorial.products_data), path, schema=schema)
+
+    assert tutorial.load_parquet(path) == tutorial.products_data
+    assert tutorial.load_parquet(path, columns=["price"])[0] == {"price": 129.99}
+
+
+def test_parquet_writer_writes_row_groups_as_data_streams_in(tutorial, tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    path = str(tmp_path / "records.parquet")
+
+    with tutorial.ParquetStreamWriter(path, row_group_size=1000) as writer:
+        writer.write_all(generated_records(2500))
+
+    metadata = tutorial.pq.ParquetFile(path).metadata
+    assert metadata.num_rows == 2500
+    assert metadata.num_row_groups == 3
+    schema = tutorial.pq.read_schema(path)
+    assert schema.field("features").type == pa.list_(pa.string())
+    assert schema.field("price").type == pa.float64()
+
+
+def test_load_scraped_dataset_feeds_analysis(tutorial, tmp_path, capsys):
+    pytest.importorskip("pyarrow")
+    scraper = tutorial.WebScraper()
+    for kind, records in (("quotes", tutorial.quotes_data), ("news", tutorial.news_data),
+                          ("products", tutorial.products_data[:1])):
+        scraper.save_to_parquet(records, str(tmp_path / f"{kind}.parquet"),
+                                schema=tutorial.scraped_data_schema(kind))
+
+    tutorial.analyze_scraped_data(*tutorial.load_scraped_dataset(str(tmp_path)))
+
+    output = capsys.readouterr().out
+    assert "Total products: 1" in output
+    assert "Most common tag: 'inspirational' (2 times)" in output
+
+
+def test_normalize_url(toolkit):
+    assert toolkit.normalize_url("HTTPS://Example.COM:443#frag") == "https://example.com/"
+    assert toolkit.normalize_url("http://example.com:8080/a?b=2&a=1") == "http://example.com:8080/a?a=1&b=2"
+
+
+def test_bloom_filter_has_no_false_negatives_and_few_false_positives(toolkit):
+    bloom = toolkit.BloomFilter(capacity=5000, error_rate=0.01)
+    for i in range(5000):
+        bloom.add(f"https://example.com/{i}")
+
+    assert all(f"https://example.com/{i}" in bloom for i in range(5000))
+    false_positives = sum(f"https://other.example/{i}" in bloom for i in range(5000))
+    assert false_positives < 5000 * 0.03
+    assert len(bloom.bits) < 8 * 1024
+
+
+def test_frontier_dedupes_and_round_robins_hosts(tutorial):
+    frontier = tutorial.CrawlFrontier(max_depth=1)
+    for url in ["https://a.example/1", "https://a.example/2", "https://a.example/3",
+                "https://b.example/1", "https://A.example/1#dup"]:
+        frontier.add(url)
+    frontier.add("https://a.example/urgent", priority=-1)
+
+    assert not frontier.add("https://a.example/deep", depth=2)
+    order = [frontier.next()[0] for _ in range(len(frontier))]
+    assert order == ["https://a.example/urgent", "https://b.example/1", "https://a.example/1",
+                     "https://a.example/2", "https://a.example/3"]
+    assert frontier.next() is None
+
+
+def test_frontier_respects_max_urls(tutorial):
+    frontier = tutorial.CrawlFrontier(max_urls=2)
+    assert [frontier.add(f"https://example.com/{i}") for i in range(3)] == [True, True, False]
+
+
+@pytest.mark.parametrize("use_bloom_filter", [False, True])
+def test_frontier_checkpoint_round_trip(tutorial, tmp_path, use_bloom_filter):
+    path = str(tmp_path / "frontier.json")
+    frontier = tutorial.CrawlFrontier(use_bloom_filter=use_bloom_filter, bloom_capacity=1000)
+    for url in ["https://a.example/1", "https://a.example/2", "https://b.example/1"]:
+        frontier.add(url)
+    frontier.next()
+    frontier.save(path)
+
+    restored = tutorial.CrawlFrontier.load(path)
+
+    assert not restored.add("https://a.example/1")  # Still remembered as seen
+    assert [restored.next()[0] for _ in range(len(restored))] == [
+        "https://b.example/1", "https://a.example/2"]
+
+
+def test_crawl_follows_links_and_resumes_from_checkpoint(tutorial, server, tmp_path):
+    checkpoint = str(tmp_path / "crawl.json")
+    scraper = tutorial.RobustScraper(delay_range=(0, 0))
+    seed = base_url(server) + "/site/0"
+
+    first = tutorial.crawl(scraper, [seed], max_pages=2, checkpoint_path=checkpoint)
+    rest = tutorial.crawl(scraper, [seed], max_pages=10, checkpoint_path=checkpoint)
+
+    titles = [page["title"] for page in first + rest]
+    assert sorted(titles) == [f"Site {n}" for n in range(6)]
+    assert len(set(titles)) == 6  # Nothing crawled twice across the restart
+
+
+ARTICLE = ("Python continues to dominate the programming language rankings this year, "
+           "with the latest developer survey showing strong growth in data science, "
+           "web development and automation across companies of every size")
+
+
+def test_simhash_is_close_for_similar_texts(toolkit):
+    base = toolkit.simhash(ARTICLE)
+    edited = toolkit.simhash(ARTICLE.replace("this year", "this year again"))
+    different = toolkit.simhash("A completely unrelated article about cooking pasta at home")
+
+    assert bin(base ^ edited).count("1") < bin(base ^ different).count("1")
+    assert bin(base ^ different).count("1") > 10
+
+
+def test_duplicate_detector_finds_exact_and_near_duplicates(tutorial, toolkit):
+    detector = tutorial.DuplicateDetector(max_distance=12, bands=16,
+                                          ignore_fields=toolkit.VOLATILE_FIELDS | {"url"})
+    records = [
+        {"headline": "Python wins", "summary": ARTICLE, "url": "https://a.example/1"},
+        # Same content, different URL and timestamp: still an exact duplicate
+        {"headline": "Python wins", "summary": ARTICLE, "url": "https://b.example/9",
+         "scraped_at": "2025-10-02"},
+        {"headline": "Python wins", "summary": ARTICLE + " overall", "url": "https://c.example/"},
+        {"headline": "Pasta", "summary": "How to cook pasta at home in ten minutes", "url": "x"},
+    ]
+
+    kept = list(detector.filter(records))
+
+    assert [r["url"] for r in kept] == ["https://a.example/1", "x"]
+    assert detector.stats() == {"unique": 2, "exact_duplicates": 1, "near_duplicates": 1}
+
+
+def test_duplicate_detector_keeps_same_text_at_different_urls_by_default(tutorial):
+    detector = tutorial.DuplicateDetector()
+    records = [
+        {"name": "Widget", "price": 9.99, "url": "https://shop.example/widget-red"},
+        {"name": "Widget", "price": 9.99, "url": "https://shop.example/widget-blue"},
+        {"name": "Widget", "price": 9.99, "url": "https://shop.example/widget-red",
+         "scraped_at": "2025-10-02"},
+    ]
+
+    kept = list(detector.filter(records))
+
+    assert [r["url"] for r in kept] == [records[0]["url"], records[1]["url"]]
+    assert detector.stats()["exact_duplicates"] == 1
+
+
+@pytest.mark.parametrize("max_distance,bands", [(5, 4), (4, 4), (-1, 4), (2, 3), (2, 0)])
+def test_duplicate_detector_rejects_settings_that_could_miss_duplicates(tutorial, max_distance, bands):
+    with pytest.raises(ValueError):
+        tutorial.DuplicateDetector(max_distance=max_distance, bands=bands)
+
+
+def test_duplicate_detector_memory_is_bounded(tutorial):
+    detector = tutorial.DuplicateDetector(max_items=100)
+    for i in range(1000):
+        detector.check({"text": f"record number {i} with some words {i * 7}"})
+
+    assert len(detector._history) == len(detector._hashes) == 100
+    assert sum(len(b) for b in detector._buckets.values()) == 100 * detector.bands
+
+
+def test_comprehensive_scraper_drops_duplicates_before_export(tutorial, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    scraper = tutorial.ComprehensiveScraper()
+    items = list(scraper.collect_all_data())
+    items.append({"type": "quote", "data": dict(tutorial.quotes_data[0])})
+    scraper.run_pipeline(items)
+
+    assert scraper.deduplicator.stats()["exact_duplicates"] == 1
+    with open(tmp_path / "final_quote_data.json", encoding="utf-8") as f:
+        exported = json.load(f)
+    assert len(exported) == len(tutorial.quotes_data)
+    assert sorted(tmp_path.glob("final_*")) == [
+        tmp_path / f"final_{kind}_data.json" for kind in ("news", "product", "quote")]
+
+
+def test_scrape_analytics_matches_tutorial_data(tutorial):
+    summary = tutorial.ScrapeAnalytics() \
+        .consume("quotes", tutorial.quotes_data) \
+        .consume("news", iter(tutorial.news_data)) \
+        .consume("products", (p for p in tutorial.products_data)) \
+        .summary()
+
+    assert summary["most_common_tag"] == ("inspirational", 2)
+    assert summary["unique_tags"] == 5
+    assert summary["categories"] == {"Technology": 1, "AI": 1, "Open Source": 1}
+    assert summary["average_price"] == pytest.approx((129.99 + 89.99 + 45.99) / 3)
+    assert summary["in_stock"] == 2
+    assert summary["price_ranges"] == {"Under $50": 1, "$50-$100": 1, "Over $100": 1}
+
+
+def test_scrape_analytics_streams_from_disk(tutorial, toolkit, tmp_path):
+    path = str(tmp_path / "products.jsonl.gz")
+    tutorial.WebScraper().stream_to_jsonl(tutorial.generate_product_rows(5000), path)
+
+    streamed = tutorial.ScrapeAnalytics().consume("products", toolkit.read_jsonl(path)).summary()
+    in_memory = tutorial.ScrapeAnalytics().consume(
+        "products", list(tutorial.generate_product_rows(5000))).summary()
+
+    assert streamed == in_memory
+    assert sum(streamed["price_ranges"].values()) == 5000
+
+
+def test_price_range_boundaries(tutorial):
+    assert [tutorial.price_range(p) for p in (49.99, 50, 100, 100.01)] == [
+        "Under $50", "$50-$100", "$50-$100", "Over $100"]
+
+
+def test_pandas_analytics_agrees_with_single_pass(tutorial):
+    pd = pytest.importorskip("pandas")
+    products = list(tutorial.generate_product_rows(3000)) + [
+        {"name": "edge", "price": 100.0, "rating": 3.0, "availability": "In Stock", "category": "X"},
+        {"name": "edge", "price": 50.0, "rating": 3.0, "availability": "In Stock", "category": "X"},
+    ]
+
+    expected = tutorial.ScrapeAnalytics() \
+        .consume("quotes", tutorial.quotes_data) \
+        .consume("news", tutorial.news_data) \
+        .consume("products", products).summary()
+    actual = tutorial.analyze_with_pandas(
+        pd.DataFrame(tutorial.quotes_data), pd.DataFrame(tutorial.news_data), pd.DataFrame(products))
+
+    assert actual["average_price"] == pytest.approx(expected.pop("average_price"))
+    assert actual["average_rating"] == pytest.approx(expected.pop("average_rating"))
+    for key, value in expected.items():
+        assert actual[key] == value, key
+
+
+def test_benchmark_analytics_reports_each_approach(tutorial):
+    results = tutorial.benchmark_analytics(rows=2000)
+    assert {"multi-pass loops", "single pass"} <= set(results)
+    assert all(seconds >= 0 for seconds in results.values())
+
+
+def test_comprehensive_scraper_validates_each_item_once(tutorial, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    scraper = tutorial.ComprehensiveScraper()
+    calls = []
+    original = scraper.validate_item
+    monkeypatch.setattr(scraper, "validate_item", lambda item: calls.append(item) or original(item))
+
+    scraper.run_pipeline()
+
+    total = len(tutorial.quotes_data) + len(tutorial.news_data) + len(tutorial.products_data)
+    assert len(calls) == total
+    assert scraper.counters["collected"] == scraper.counters["exported"] == total
+    assert len({item["processed_at"] for item in calls}) == 1
+    assert set(scraper.phase_times) == {"collection", "processing", "validation", "export"}
+    assert all(seconds > 0 for seconds in scraper.phase_times.values())
+
+
+def test_comprehensive_scraper_pipeline_is_lazy(tutorial, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    scraper = tutorial.ComprehensiveScraper()
+    items = scraper.validate_all_data(scraper.process_collected_data(scraper.collect_all_data()))
+
+    first = next(items)
+    assert first["id"] == "quote_1"
+    assert scraper.counters["collected"] == 1
+
+
+def test_record_schema_reports_every_failing_field(tutorial):
+    schema = tutorial.RecordSchema([
+        tutorial.FieldRule("url", types=(str,), pattern=r"^https?://"),
+        tutorial.FieldRule("price", coerce=tutorial.parse_price, min_value=0, max_value=1000),
+        tutorial.FieldRule("rating", required=False, types=(int, float)),
+    ])
+
+    assert schema({"url": "https://a.test/", "price": "$1,000.00"})
+    assert schema.errors({"url": "ftp://a.test/", "price": "$2,000"}) == [
+        "url: 'ftp://a.test/' does not match ^https?://",
+        "price: 2000.0 is above 1000",
+    ]
+    assert schema.errors({"price": "free", "rating": "5"}) == [
+        "Missing required field: url",
+        "price: invalid value 'free'",
+        "rating: expected int/float, got str",
+    ]
+
+
+def test_record_schema_range_check_on_unconverted_strings(tutorial):
+    schema = tutorial.RecordSchema([tutorial.FieldRule("stock", required=False, min_value=0)])
+
+    assert schema({"stock": 3}) and schema({})
+    assert not schema({"stock": "12"})
+    assert schema.errors({"stock": "12"}) == ["stock: '12' is not comparable to a number"]
+
+
+def test_is_valid_agrees_with_field_checks(tutorial):
+    schema = tutorial.PAGE_SCHEMA
+    records = [{"url": "https://a.test/", "title": "ok", "status_code": 200, "content_length": 10},
+               {"url": "https://a.test/", "title": "ok", "price": "$1,299.99"},
+               {"url": "https://a.test/", "title": "ok", "price": "", "status_code": None},
+               {"url": "https://a.test/", "title": "ok", "status_code": 700},
+               {"url": "https://a.test/", "title": "ok", "content_length": "big"},
+               {"url": "https://a.test/", "title": "ok", "price": "N/A"},
+               {"url": "mailto:x", "title": "ok"}, {"url": "https://a.test/", "title": []}, {}]
+
+    assert [schema.is_valid(r) for r in records] == [not schema.errors(r) for r in records]
+
+
+def test_record_schema_validate_batch(tutorial):
+    records = [{"url": "https://a.test/", "title": "ok"},
+               {"url": "https://a.test/", "title": ""},
+               {"url": "a.test", "title": "x", "price": "-3"}]
+
+    mask, report = tutorial.PAGE_SCHEMA.validate_batch(records, max_failures=1)
+
+    assert mask == [True, False, False]
+    assert report["checked"] == 3 and report["valid"] == 1 and report["invalid"] == 2
+    assert report["errors_by_field"] == {"title": 1, "url": 1, "price": 1}
+    assert report["failures"] == {1: ["Missing required field: title"]}
+
+
+def test_robust_scraper_validates_with_schema(tutorial):
+    scraper = tutorial.RobustScraper(delay_range=(0, 0), respect_robots=False)
+    assert scraper.validate_data({"url": "https://a.test/", "title": "t", "price": "$1,299.99"})
+    assert not scraper.validate_data({"url": "https://a.test/", "title": "t", "price": "N/A"})
+
+    strict = tutorial.RobustScraper(delay_range=(0, 0), respect_robots=False,
+                                    schema=tutorial.RecordSchema([tutorial.FieldRule("sku")]))
+    assert not strict.validate_data({"url": "https://a.test/", "title": "t"})
+
+
+def test_comprehensive_scraper_counts_schema_failures(tutorial, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    scraper = tutorial.ComprehensiveScraper()
+    items = list(scraper.collect_all_data()) + [{"type": "review", "data": {"text": "great"}}]
+
+    scraper.run_pipeline(items)
+
+    assert scraper.counters["invalid"] == 1
+    assert scraper.validation_errors == {"type": 1}
+
+
+def test_latency_histogram_percentiles(toolkit):
+    histogram = toolkit.LatencyHistogram()
+    for i in range(100):
+        histogram.observe(0.001 if i < 90 else 0.2)
+
+    assert histogram.percentile(0.5) <= 0.005
+    assert 0.1 < histogram.percentile(0.95) <= 0.2
+    assert histogram.percentile(0.99) <= histogram.max == 0.2
+    assert toolkit.LatencyHistogram().summary()["p99_ms"] == 0.0
+
+
+def test_metrics_track_hosts_retries_and_cache(tutorial, server, tmp_path):
+    server.flaky_failures = 1
+    cache = tutorial.HttpCache(str(tmp_path / "cache.sqlite3"))
+    scraper = tutorial.RobustScraper(delay_range=(0, 0), respect_robots=False, cache=cache,
+                                     metrics=tutorial.ScraperMetrics(trace=True))
+    for path in ("/flaky", "/etag", "/etag", "/missing"):
+        scraper.get_page_with_retries(base_url(server) + path)
+
+    stats = scraper.metrics.snapshot()
+    host = stats["hosts"][f"127.0.0.1:{server.server_address[1]}"]
+    assert host["requests"] == 5
+    assert host["retries"] == 1
+    assert host["errors"] == 2  # the 503 and the 404
+    assert stats["status_codes"] == {"200": 2, "304": 1, "404": 1, "503": 1}
+    assert stats["cache"] == {"hits": 1, "misses": 4, "hit_rate": 0.2}
+    assert host["bytes_received"] > 0 and host["latency"]["count"] == 5
+    assert [span.attributes.get("cached") for span in scraper.metrics.spans] == [
+        False, False, False, True, False]
+    assert all(span.duration >= 0 for span in scraper.metrics.spans)
+
+
+def test_metrics_export_formats(tutorial):
+    metrics = tutorial.ScraperMetrics()
+    metrics.record_request("https://a.test/x", 0.02, 200, 100)
+    metrics.record_request("https://a.test/y", 3.0, 500, 10)
+    metrics.record_retry("https://a.test/y")
+    metrics.observe_queue("parse", 4)
+    metrics.observe_queue("parse", 1)
+
+    data = __import__("json").loads(metrics.to_json())
+    assert data["requests"] == 2 and data["errors"] == 1 and data["retries"] == 1
+    assert data["queue_depths"] == {"parse": {"current": 1, "max": 4}}
+
+    text = metrics.to_prometheus()
+    assert 'scraper_requests_total{host="a.test"} 2' in text
+    assert 'scraper_request_duration_seconds_bucket{host="a.test",le="0.025"} 1' in text
+    assert 'scraper_request_duration_seconds_bucket{host="a.test",le="+Inf"} 2' in text
+    assert 'scraper_request_duration_seconds_count{host="a.test"} 2' in text
+    assert 'scraper_queue_depth{queue="parse"} 1' in text
+
+
+def test_async_scraper_shares_metrics(tutorial, server):
+    scraper = tutorial.RobustScraper(delay_range=(0, 0), respect_robots=False)
+    scraper.scrape_concurrently([base_url(server) + "/a", base_url(server) + "/missing"])
+
+    stats = scraper.metrics.snapshot()
+    assert stats["requests"] == 2 and stats["errors"] == 1
+
+
+def test_generate_report_without_urls(tutorial, capsys):
+    tutorial.RobustScraper(respect_robots=False).generate_report()
+    assert "no URLs attempted" in capsys.readouterr().out
+
+
+@pytest.fixture
+def mock_site(tutorial):
+    with tutorial.MockSiteServer(items_per_page=5) as site:
+        yield site
+
+
+def test_mock_site_pages_are_deterministic(tutorial, mock_site):
+    assert mock_site.render_page("quotes", 3) == \
+        tutorial.MockSiteServer(items_per_page=5).render_page("quotes", 3)
+    assert mock_site.render_page("quotes", 3) != mock_site.render_page("quotes", 4)
+    assert mock_site.render_page("quotes", 3) != \
+        tutorial.MockSiteServer(items_per_page=5, seed=1).render_page("quotes", 3)
+    big = tutorial.MockSiteServer(items_per_page=50).render_page("news", 1)
+    assert len(big) > 5 * len(mock_site.render_page("news", 1))
+
+
+def test_mock_site_pages_parse_with_tutorial_scrapers(tutorial, mock_site):
+    scraper = tutorial.WebScraper(delay_range=(0, 0), respect_robots=False)
+    parsers = tutorial.mock_page_parsers()
+    for kind in tutorial.MockSiteServer.KINDS:
+        response = scraper.request_page(mock_site.url(kind, 2))
+        items = parsers[kind](response.text)
+        assert response.status_code == 200 and len(items) == 5
+
+    product = parsers["products"](mock_site.render_page("products", 1))[0]
+    assert isinstance(product["price"], float) and product["features"]
+    assert scraper.request_page(mock_site.base_url + "/nowhere").status_code == 404
+    assert mock_site.requests_served == 4
+
+
+def test_mock_site_latency(tutorial):
+    with tutorial.MockSiteServer(latency=0.1) as site:
+        start = time.monotonic()
+        tutorial.requests.get(site.url("news", 1), timeout=5)
+        assert time.monotonic() - start >= 0.1
+
+
+def test_benchmark_scrapers_reports_each_path(tutorial):
+    with tutorial.MockSiteServer(items_per_page=3, latency=0.01) as site:
+        results = tutorial.benchmark_scrapers(site, pages=6, workers=3, kind="products")
+
+    expected = {"sync", "threaded"} | ({"async"} if tutorial.aiohttp else set())
+    assert set(results) == expected
+    for result in results.values():
+        assert result["pages"] == 6
+        assert result["pages_per_s"] > 0 and result["peak_memory_kb"] > 0
+        assert result["seconds"] > 0
+
+
+def test_fetch_many_keeps_order_or_yields_as_completed(tutorial, server):
+    scraper = tutorial.WebScraper(delay_range=(0, 0), respect_robots=False)
+    urls = [base_url(server) + "/slow/1", base_url(server) + "/fast", base_url(server) + "/missing"]
+
+    ordered = list(scraper.fetch_many(urls, workers=3))
+    assert [url for url, _ in ordered] == urls
+    assert ordered[0][1].status_code == 200 and ordered[2][1] is None
+
+    as_completed = [url for url, _ in scraper.fetch_many(urls, workers=3, ordered=False)]
+    assert as_completed[-1] == urls[0]
+    assert sorted(as_completed) == sorted(urls)
+
+
+def test_fetch_many_sizes_the_connection_pool(tutorial, server):
+    scraper = tutorial.WebScraper(delay_range=(0, 0), respect_robots=False, pool_size=2)
+    urls = [base_url(server) + f"/slow/{i}" for i in range(12)]
+
+    assert all(response for _, response in scraper.fetch_many(urls, workers=12))
+    # The slow requests overlapped instead of queueing for two connections
+    assert server.max_active > 2
+
+    adapter = scraper.session.get_adapter(urls[0])
+    assert scraper.pool_size == 12 and adapter._pool_maxsize == 12
+
+
+def test_configure_pool_closes_the_replaced_adapter(tutorial, server):
+    scraper = tutorial.WebScraper(delay_range=(0, 0), respect_robots=False, pool_size=2)
+    old = scraper.session.get_adapter(base_url(server))
+    assert scraper.get_page(base_url(server) + "/a")
+    assert len(old.poolmanager.pools) == 1
+
+    scraper.configure_pool(4)
+
+    assert len(old.poolmanager.pools) == 0
+    assert scraper.session.get_adapter(base_url(server)) is not old
+
+
+def test_configure_pool_waits_for_running_fetches_before_closing(tutorial, server):
+    scraper = tutorial.WebScraper(delay_range=(0, 0), respect_robots=False, pool_size=4)
+    old = scraper.session.get_adapter(base_url(server))
+    urls = [base_url(server) + f"/slow/{i}" for i in range(4)]
+    results = scraper.fetch_many(urls, workers=4)
+
+    assert next(results)[1] is not None
+    scraper.configure_pool(8)
+    # The other three requests are still using the old adapter's pool
+    assert len(old.poolmanager.pools) == 1
+    assert all(response for _, response in results)
+
+    assert len(old.poolmanager.pools) == 0
+    assert scraper.session.get_adapter(base_url(server)) is not old
+
+
+def test_robots_cache_fetches_different_hosts_in_parallel(tutorial):
+    cache = tutorial.RobotsCache()
+    slow_host_started, release_slow_host = threading.Event(), threading.Event()
+    fetched = []
+
+    def fetch(robots_url):
+        fetched.append(robots_url)
+        if "slow.example" in robots_url:
+            slow_host_started.set()
+            release_slow_host.wait(5)
+        return 404, ""
+
+    slow = threading.Thread(target=cache.rules_for, args=("https://slow.example/a", fetch))
+    slow.start()
+    assert slow_host_started.wait(5)
+    try:
+        # Served while slow.example's fetch is still in progress
+        assert cache.rules_for("https://fast.example/a", fetch).is_allowed("/a")
+    finally:
+        release_slow_host.set()
+        slow.join(5)
+    assert sorted(fetched) == ["https://fast.example/robots.txt", "https://slow.example/robots.txt"]
+
+
+def test_robust_scraper_threaded_counts_every_url(tutorial, server):
+    server.robots = "User-agent: *\nDisallow: /private\n"
+    scraper = tutorial.RobustScraper(delay_range=(0, 0), max_retries=1)
+    urls = [base_url(server) + f"/page/{i}" for i in range(30)] + \
+           [base_url(server) + "/missing", base_url(server) + "/private/x"]
+
+    data = scraper.scrape_threaded(urls, workers=8)
+
+    assert len(data) == 30
+    assert sorted(scraper.successful_urls) == sorted(urls[:30])
+    assert sorted(scraper.failed_urls) == sorted(urls[30:])
+    assert [path for _, path, _ in server.hits].count("/robots.txt") == 1
+
+
+def test_fetch_many_stops_early_without_fetching_everything(tutorial, server):
+    scraper = tutorial.WebScraper(delay_range=(0, 0), respect_robots=False)
+    urls = [base_url(server) + f"/slow/{i}" for i in range(20)]
+
+    results = scraper.fetch_many(urls, workers=2)
+    next(results)
+    results.close()
+
+    assert len(server.hits) < len(urls)
+
+
+class ChunkedBody:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.read = 0
+
+    def iter_content(self, chunk_size):
+        for chunk in self.chunks:
+            self.read += 1
+            yield chunk
+
+
+def test_read_body_stops_at_marker_split_across_chunks(tutorial):
+    body = ChunkedBody([b"<html><head><title>x</title></he", b"ad><body>", b"rest", b"more"])
+    content, complete = tutorial.read_body(body, stop_at=b"</head>")
+    assert content == b"<html><head><title>x</title></head><body>"
+    # One more chunk is read to find out whether the body had ended
+    assert not complete and body.read == 3
+
+
+def test_read_body_is_complete_when_marker_is_in_the_last_chunk(tutorial):
+    body = ChunkedBody([b"<html><head><title>x</title>", b"</head></html>"])
+    content, complete = tutorial.read_body(body, stop_at=b"</head>")
+    assert content == b"<html><head><title>x</title></head></html>"
+    assert complete
+
+
+def test_read_body_max_bytes(tutorial):
+    assert tutorial.read_body(ChunkedBody([b"abcd", b"efgh"]), max_bytes=6) == (b"abcdef", False)
+    assert tutorial.read_body(ChunkedBody([b"abcd", b"ef"]), max_bytes=6) == (b"abcdef", True)
+    assert tutorial.read_body(ChunkedBody([b"ab"]), max_bytes=6) == (b"ab", True)
+
+
+def test_extract_head_fields_decodes_bytes_lazily(tutorial):
+    html = "<html><head><title>Café</title></head><body>".encode("latin-1") + b"\xff" * 100_000
+    assert tutorial.extract_head_fields(html, encoding="latin-1")["title"] == "Café"
+    assert tutorial.extract_head_fields([b"<title>na", "ïve".encode("utf-8")[:1],
+                                         "ïve".encode("utf-8")[1:] + b"</title>"]) == {"title": "naïve"}
+
+
+def test_unknown_charsets_fall_back_to_utf8(tutorial, toolkit, server):
+    assert toolkit.codec_or_utf8("x-no-such-charset") == toolkit.codec_or_utf8(None) == "utf-8"
+    assert toolkit.codec_or_utf8("Latin-1") == "iso8859-1"
+    assert tutorial.extract_head_fields(b"<title>ok</title>", encoding="x-no-such-charset") == {"title": "ok"}
+
+    url = base_url(server) + "/badcharset"
+    [data] = tutorial.RobustScraper(delay_range=(0, 0), respect_robots=False).scrape_with_validation([url])
+    assert data["title"] == "Page /badcharset"
+    [result] = tutorial.AsyncScraper(delay_range=(0, 0), respect_robots=False).run([url])
+    assert "Page /badcharset" in result.text
+
+
+def test_streaming_download_caps_memory_and_stops_early(tutorial):
+    with tutorial.MockSiteServer(items_per_page=500) as site:
+        scraper = tutorial.RobustScraper(delay_range=(0, 0), respect_robots=False)
+        url = site.url("quotes", 1)
+        full_size = len(site.render_page("quotes", 1).encode("utf-8"))
+
+        capped = scraper.get_page(url, max_bytes=10_000)
+        assert len(capped.content) == 10_000 and capped.truncated
+
+        head = scraper.get_page(url, stop_at=b"</head>")
+        assert head.truncated and b"</head>" in head.content
+        assert len(head.content) < full_size / 2
+
+        whole = scraper.get_page(url, max_bytes=full_size)
+        assert not whole.truncated and len(whole.content) == full_size
+
+        [data] = scraper.scrape_with_validation([url], head_only=True)
+        assert data["title"] == "Quotes - page 1"
+        assert data["content_length"] == full_size
+        assert scraper.metrics.snapshot()["bytes_received"] < 4 * full_size
+
+
+def test_truncated_pages_are_not_cached(tutorial, server, tmp_path):
+    cache = tutorial.HttpCache(str(tmp_path / "cache.sqlite3"))
+    scraper = tutorial.WebScraper(delay_range=(0, 0), respect_robots=False, cache=cache)
+
+    assert scraper.get_page(base_url(server) + "/etag", max_bytes=10).truncated
+    assert cache.load(base_url(server) + "/etag") is None
+    assert not scraper.get_page(base_url(server) + "/etag", max_bytes=10_000).truncated
+    assert cache.load(base_url(server) + "/etag") is not None
@@ -19,15 +19,54 @@ and website terms of service when scraping.
 """
 
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+import contextlib
 import json
 import csv
+import io
 import time
 import random
+import threading
+import os
+import sys
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from importlib.util import find_spec
 from urllib.parse import urljoin, urlparse
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Iterable, Iterator, Optional, Tuple
 import re
 
+# The reusable building blocks live in scraping_toolkit.py next to this file,
+# which (unlike this tutorial) can be imported without running any demos
+_HERE = os.path.dirname(os.path.abspath(__file__))
+if _HERE not in sys.path:
+    sys.path.insert(0, _HERE)
+from scraping_toolkit import (
+    DEFAULT_HTML_PARSER, PRICE_RANGES,
+    AsyncScraper, CrawlFrontier, CsvStreamWriter, DuplicateDetector, FieldRule, HttpCache,
+    JsonLinesWriter, MockSiteServer, ParquetStreamWriter, RateLimiter, RecordSchema,
+    RetryPolicy, RobotsCache, RobotsRules, ScrapeAnalytics, ScraperMetrics, ScrapingPipeline,
+    extract_head_fields, load_parquet, parse_price, price_range, read_body,
+)
+
+try:
+    import aiohttp  # Optional: only needed for the asyncio scraper
+except ImportError:
+    aiohttp = None
+
+try:
+    import pandas as pd  # Optional: vectorized analytics for big datasets
+    import numpy as np
+except ImportError:
+    pd = np = None
+
+try:
+    import pyarrow as pa  # Optional: only needed for Parquet export
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
 print("=== Web Scraping with Python Tutorial ===\n")
 
 # =============================================================================
@@ -65,41 +104,237 @@ print("-" * 50)
 # Note: In a real environment, you would install these packages:
 # pip install requests beautifulsoup4 lxml
 
+def scraped_data_schema(kind: str):
+    """Arrow schema for the quote/news/product records used in this tutorial.
+
+    List fields stay lists and numbers stay numbers, unlike in CSV.
+    """
+    schemas = {
+        'quotes': pa.schema([
+            ('text', pa.string()),
+            ('author', pa.string()),
+            ('tags', pa.list_(pa.string())),
+        ]),
+        'news': pa.schema([
+            ('headline', pa.string()),
+            ('summary', pa.string()),
+            ('category', pa.string()),
+            ('timestamp', pa.string()),
+            ('url', pa.string()),
+        ]),
+        'products': pa.schema([
+            ('name', pa.string()),
+            ('price', pa.float64()),
+            ('currency', pa.string()),
+            ('rating', pa.float64()),
+            ('review_count', pa.int64()),
+            ('availability', pa.string()),
+            ('category', pa.string()),
+            ('features', pa.list_(pa.string())),
+            ('url', pa.string()),
+        ]),
+    }
+    return schemas[kind]
+
+def load_scraped_dataset(directory: str = '.'):
+    """Load quotes/news/products Parquet files saved by save_to_parquet.
+
+    Returns (quotes, news, products), ready for analyze_scraped_data.
+    """
+    return tuple(load_parquet(os.path.join(directory, f"{kind}.parquet"))
+                 for kind in ('quotes', 'news', 'products'))
+
+
 # Basic scraping class
 class WebScraper:
     """A basic web scraper with common functionality."""
     
-    def __init__(self, delay_range=(1, 3)):
+    def __init__(self, delay_range=(1, 3), rate_limiter: Optional[RateLimiter] = None,
+                 respect_robots: bool = True, robots_cache: Optional[RobotsCache] = None,
+                 cache: Optional[HttpCache] = None, parser: Optional[str] = None,
+                 metrics: Optional[ScraperMetrics] = None, pool_size: int = 10):
         """Initialize scraper with default settings."""
         self.session = requests.Session()
+        self.pool_size = 0
+        # Adapters replaced while fetch_many threads may still be using them
+        # are closed once the last running batch finishes
+        self._pool_lock = threading.Lock()
+        self._active_batches = 0
+        self._retired_adapters = []
+        self.configure_pool(pool_size)
         self.delay_range = delay_range
+        self.parser = parser or DEFAULT_HTML_PARSER
+        self.metrics = metrics or ScraperMetrics()
+
+        # Space requests to each domain by the average delay, instead of
+        # always sleeping after every request
+        if rate_limiter is None:
+            average_delay = sum(delay_range) / 2
+            rate_limiter = RateLimiter(1.0 / average_delay if average_delay > 0 else None)
+        self.rate_limiter = rate_limiter
+
+        # robots.txt is fetched once per host, then checked from memory
+        if respect_robots and robots_cache is None:
+            robots_cache = RobotsCache(rate_limiter=rate_limiter)
+        self.robots = robots_cache if respect_robots else None
+
+        # Optional HTTP cache: unchanged pages are served locally after a 304
+        self.cache = cache
         
         # Set a user agent to appear more like a real browser
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
     
-    def get_page(self, url: str, timeout: int = 10) -> Optional[requests.Response]:
-        """Fetch a web page with error handling."""
+    def configure_pool(self, pool_size: int):
+        """Keep up to `pool_size` keep-alive connections per host.
+
+        requests' default pool holds 10 connections per host; with more
+        threads than that, extra connections are opened and thrown away
+        after every request. Safe to call while fetch_many is running: the
+        replaced adapter keeps serving requests already in flight.
+        """
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        with self._pool_lock:
+            replaced = {self.session.adapters.get(prefix) for prefix in ('http://', 'https://')}
+            replaced.discard(None)
+            self.session.mount('http://', adapter)
+            self.session.mount('https://', adapter)
+            self.pool_size = pool_size
+            # Close the old adapters, or their pooled connections leak; but
+            # not while another thread may be in the middle of a request
+            self._retired_adapters.extend(replaced)
+            if not self._active_batches:
+                self._close_retired_adapters()
+
+    def _close_retired_adapters(self):
+        # Callers hold self._pool_lock
+        for adapter in self._retired_adapters:
+            adapter.close()
+        self._retired_adapters.clear()
+
+    def fetch_page(self, url: str) -> Optional[requests.Response]:
+        """How fetch_many gets one page; subclasses may add retries."""
+        return self.get_page(url)
+
+    def fetch_many(self, urls: Iterable[str], workers: int = 8,
+                   ordered: bool = True) -> Iterator[Tuple[str, Optional[requests.Response]]]:
+        """Fetch URLs from a pool of threads sharing this scraper's session.
+
+        Yields (url, response) pairs, with None for pages that failed. With
+        ordered=True results come back in the order of `urls`; otherwise each
+        one is yielded as soon as it finishes. Rate limits, robots.txt and
+        the HTTP cache are shared by all threads.
+        """
+        if self.pool_size < workers:
+            self.configure_pool(workers)
+
+        with self._pool_lock:
+            self._active_batches += 1
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            futures = [(executor.submit(self.fetch_page, url), url) for url in urls]
+            if ordered:
+                for future, url in futures:
+                    yield url, future.result()
+            else:
+                url_of = {future: url for future, url in futures}
+                for future in as_completed(url_of):
+                    yield url_of[future], future.result()
+        finally:
+            # Stopping iteration early cancels the pages not yet started
+            executor.shutdown(wait=True, cancel_futures=True)
+            with self._pool_lock:
+                self._active_batches -= 1
+                if not self._active_batches:
+                    self._close_retired_adapters()
+
+    def get_page(self, url: str, timeout: int = 10, max_bytes: Optional[int] = None,
+                 stop_at: Optional[bytes] = None) -> Optional[requests.Response]:
+        """Fetch a web page with error handling (see request_page for max_bytes/stop_at)."""
+        if not self.allowed_by_robots(url):
+            return None
+
         try:
-            print(f"Fetching: {url}")
-            response = self.session.get(url, timeout=timeout)
+            response = self.request_page(url, timeout, max_bytes=max_bytes, stop_at=stop_at)
             response.raise_for_status()  # Raise an exception for bad status codes
             
-            # Random delay to be respectful
-            delay = random.uniform(*self.delay_range)
-            print(f"Waiting {delay:.1f} seconds...")
-            time.sleep(delay)
-            
             return response
         
         except requests.exceptions.RequestException as e:
             print(f"Error fetching {url}: {e}")
             return None
+
+    def allowed_by_robots(self, url: str) -> bool:
+        if self.robots is not None and not self.robots.is_allowed(url, self.fetch_robots_txt):
+            print(f"🤖 Disallowed by robots.txt: {url}")
+            return False
+        return True
+
+    def request_page(self, url: str, timeout: int = 10, max_bytes: Optional[int] = None,
+                     stop_at: Optional[bytes] = None) -> requests.Response:
+        """Rate-limited, cache-aware GET returning the response whatever its status.
+
+        With `max_bytes` or `stop_at` the body is streamed and reading stops
+        at the size limit or once the marker has arrived, so a huge page never
+        sits in memory; `response.truncated` tells whether the body was cut
+        short. Truncated pages are not stored in the HTTP cache.
+
+        Network problems raise requests.exceptions.RequestException.
+        """
+        streaming = max_bytes is not None or stop_at is not None
+        # Wait for this domain's rate limit to be respectful
+        delay = self.rate_limiter.acquire(url)
+        if delay > 0:
+            print(f"Waited {delay:.1f} seconds for rate limit...")
+
+        print(f"Fetching: {url}")
+        headers = self.cache.conditional_headers(url) if self.cache else None
+        span = self.metrics.start_span('GET', url=url)
+        start = time.perf_counter()
+        truncated = False
+        try:
+            response = self.session.get(url, timeout=timeout, headers=headers, stream=streaming)
+            if streaming:
+                with response:
+                    content, complete = read_body(response, max_bytes, stop_at)
+                response._content = content
+                truncated = not complete
+        except requests.exceptions.RequestException as e:
+            self.metrics.record_request(url, time.perf_counter() - start, error=True)
+            self.metrics.end_span(span, error=repr(e))
+            raise
+        elapsed = time.perf_counter() - start
+        status_code, downloaded = response.status_code, len(response.content)
+
+        cached = None
+        if self.cache is not None and not truncated:
+            network_response = response
+            response = self.cache.update(url, response)
+            cached = response is not network_response
+        response.truncated = truncated
+        self.metrics.record_request(url, elapsed, status_code, downloaded, cached)
+        self.metrics.end_span(span, status_code=status_code, bytes=downloaded, cached=cached,
+                              truncated=truncated)
+        return response
     
-    def parse_html(self, html_content: str) -> BeautifulSoup:
-        """Parse HTML content using BeautifulSoup."""
-        return BeautifulSoup(html_content, 'html.parser')
+    def fetch_robots_txt(self, robots_url: str):
+        """Download robots.txt, returning (status_code, text); status None on error."""
+        try:
+            response = self.session.get(robots_url, timeout=10)
+            return response.status_code, response.text
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching {robots_url}: {e}")
+            return None, ''
+
+    def parse_html(self, html_content: str, parse_only: Optional[SoupStrainer] = None,
+                   parser: Optional[str] = None) -> BeautifulSoup:
+        """Parse HTML content using BeautifulSoup.
+
+        Pass a SoupStrainer as `parse_only` to build only the matching
+        elements, e.g. SoupStrainer('div', class_='quote').
+        """
+        return BeautifulSoup(html_content, parser or self.parser, parse_only=parse_only)
     
     def save_to_json(self, data: List[Dict], filename: str):
         """Save data to JSON file."""
@@ -125,6 +360,46 @@ class WebScraper:
         except Exception as e:
             print(f"❌ Error saving to CSV: {e}")
 
+    def stream_to_jsonl(self, records: Iterable[Dict], filename: str,
+                        compression: Optional[str] = None, flush_every: int = 1000) -> int:
+        """Write records from any iterable (e.g. a generator) to JSON Lines.
+
+        Unlike save_to_json, memory use stays flat however many records there are.
+        """
+        try:
+            with JsonLinesWriter(filename, compression, flush_every) as writer:
+                count = writer.write_all(records)
+            print(f"✅ {count} records streamed to {filename}")
+            return count
+        except Exception as e:
+            print(f"❌ Error streaming to JSON Lines: {e}")
+            return 0
+
+    def save_to_parquet(self, records: Iterable[Dict], filename: str, schema=None,
+                        row_group_size: int = 10000) -> int:
+        """Save records to Parquet, keeping list fields and numeric types."""
+        try:
+            with ParquetStreamWriter(filename, schema, row_group_size) as writer:
+                count = writer.write_all(records)
+            print(f"✅ {count} records saved to {filename}")
+            return count
+        except Exception as e:
+            print(f"❌ Error saving to Parquet: {e}")
+            return 0
+
+    def stream_to_csv(self, records: Iterable[Dict], filename: str,
+                      fieldnames: Optional[List[str]] = None,
+                      compression: Optional[str] = None, flush_every: int = 1000) -> int:
+        """Write records from any iterable to CSV without building a list first."""
+        try:
+            with CsvStreamWriter(filename, fieldnames, compression, flush_every) as writer:
+                count = writer.write_all(records)
+            print(f"✅ {count} records streamed to {filename}")
+            return count
+        except Exception as e:
+            print(f"❌ Error streaming to CSV: {e}")
+            return 0
+
 # =============================================================================
 # 3. HTML PARSING EXAMPLES
 # =============================================================================
@@ -349,6 +624,59 @@ def advanced_parsing_examples():
 
 advanced_parsing_examples()
 
+def generate_large_html(items: int = 2000) -> str:
+    """Build a large, deterministic product listing page for benchmarks."""
+    rows = "\n".join(
+        f'<div class="product" id="p{i}"><h2 class="name">Product {i}</h2>'
+        f'<span class="price">${i % 500 + 0.99:.2f}</span>'
+        f'<p class="description">{"Lorem ipsum dolor sit amet. " * 5}</p></div>'
+        for i in range(items)
+    )
+    return (
+        "<!DOCTYPE html><html><head><title>Big Store</title>"
+        '<meta name="description" content="Thousands of products">'
+        f"</head><body><div class=\"products\">{rows}</div></body></html>"
+    )
+
+def benchmark_parsers(html: str, repeat: int = 3) -> Dict[str, float]:
+    """Time the different ways of getting data out of `html` (best of `repeat`, in ms)."""
+    def best_time(func):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return min(timings) * 1000
+
+    results = {}
+    parsers = ['html.parser'] + (['lxml'] if find_spec('lxml') else [])
+    for parser in parsers:
+        results[f'full parse ({parser})'] = best_time(lambda: BeautifulSoup(html, parser))
+        strainer = SoupStrainer('span', class_='price')
+        results[f'prices only ({parser})'] = best_time(
+            lambda: BeautifulSoup(html, parser, parse_only=strainer))
+    results['head fields (streaming)'] = best_time(lambda: extract_head_fields(html))
+    return results
+
+def parsing_performance_examples():
+    """Compare parser backends, targeted parsing and head-only extraction."""
+    print("\n⏱️  Parsing Performance")
+    print("-" * 40)
+
+    html = generate_large_html(items=300)
+    print(f"Benchmark page: {len(html) / 1024:.0f} KB")
+    for name, ms in benchmark_parsers(html, repeat=1).items():
+        print(f"   {name:<28} {ms:8.2f} ms")
+
+    print("""
+   - lxml is used automatically when installed (WebScraper(parser=...) overrides)
+   - parse_html(html, parse_only=SoupStrainer(...)) builds only what you need
+   - extract_head_fields(html) reads <title> and friends and stops at <body>""")
+
+# Benchmarks only run when the tutorial is run as a script, not on import
+if __name__ == "__main__":
+    parsing_performance_examples()
+
 # =============================================================================
 # 5. REAL-WORLD SCRAPING EXAMPLES
 # =============================================================================
@@ -391,6 +719,18 @@ class QuoteScraper(WebScraper):
         
         return simulated_quotes
 
+    def parse_quotes(self, html: str) -> List[Dict]:
+        """Extract quotes from a quotes.toscrape.com-style page."""
+        soup = self.parse_html(html, parse_only=SoupStrainer('div', class_='quote'))
+        return [
+            {
+                'text': quote.find('span', class_='text').get_text(strip=True).strip('“”'),
+                'author': quote.find('small', class_='author').get_text(strip=True),
+                'tags': [tag.get_text(strip=True) for tag in quote.find_all('a', class_='tag')]
+            }
+            for quote in soup.find_all('div', class_='quote')
+        ]
+
 class NewsScraper(WebScraper):
     """Scraper for news articles (example)."""
     
@@ -433,6 +773,21 @@ class NewsScraper(WebScraper):
         
         return simulated_news
 
+    def parse_headlines(self, html: str, base_url: str = '') -> List[Dict]:
+        """Extract articles from a news listing page."""
+        soup = self.parse_html(html, parse_only=SoupStrainer('article'))
+        articles = []
+        for article in soup.find_all('article'):
+            link = article.find('h2').find('a')
+            articles.append({
+                'headline': link.get_text(strip=True),
+                'summary': article.find('p', class_='summary').get_text(strip=True),
+                'category': article.find('span', class_='category').get_text(strip=True),
+                'timestamp': article.find('time')['datetime'],
+                'url': urljoin(base_url, link['href'])
+            })
+        return articles
+
 class ProductScraper(WebScraper):
     """Scraper for e-commerce products (example)."""
     
@@ -488,6 +843,25 @@ class ProductScraper(WebScraper):
         
         return simulated_products
 
+    def parse_products(self, html: str, base_url: str = '') -> List[Dict]:
+        """Extract product cards from a store listing page."""
+        soup = self.parse_html(html, parse_only=SoupStrainer('div', class_='product'))
+        products = []
+        for card in soup.find_all('div', class_='product'):
+            link = card.find('a')
+            products.append({
+                'name': link.get_text(strip=True),
+                'price': parse_price(card.find('span', class_='price').get_text(strip=True)),
+                'currency': 'USD',
+                'rating': float(card.find('span', class_='rating').get_text(strip=True)),
+                'review_count': int(card.find('span', class_='reviews').get_text(strip=True)),
+                'availability': card.find('p', class_='availability').get_text(strip=True),
+                'category': card.find('span', class_='category').get_text(strip=True),
+                'features': [li.get_text(strip=True) for li in card.find_all('li')],
+                'url': urljoin(base_url, link['href'])
+            })
+        return products
+
 # Run the scraping examples
 quote_scraper = QuoteScraper()
 quotes_data = quote_scraper.scrape_quotes_simulation()
@@ -505,69 +879,132 @@ products_data = product_scraper.scrape_products_simulation()
 print("\n\n📊 DATA PROCESSING AND ANALYSIS")
 print("-" * 50)
 
-def analyze_scraped_data():
-    """Demonstrate data analysis on scraped content."""
+def analyze_with_pandas(quotes_df, news_df, products_df) -> Dict:
+    """Vectorized equivalent of ScrapeAnalytics.summary for DataFrames.
+
+    Handy for millions of rows already in a DataFrame, e.g. from
+    pd.read_parquet('products.parquet').
+    """
+    if pd is None:
+        raise ImportError("analyze_with_pandas requires pandas: pip install pandas")
+
+    tag_counts = quotes_df['tags'].explode().dropna().value_counts(sort=False)
+    top_tags = tag_counts[tag_counts == tag_counts.max()] if len(tag_counts) else tag_counts
+    # Bins match price_range(): [0, 50) / [50, 100] / (100, ∞)
+    bins = [-np.inf, 50, np.nextafter(100, np.inf), np.inf]
+    ranges = pd.cut(products_df['price'], bins=bins, right=False, labels=list(PRICE_RANGES))
+    product_count = len(products_df)
+
+    return {
+        'total_quotes': len(quotes_df),
+        'unique_tags': len(tag_counts),
+        'most_common_tag': (top_tags.index[0], int(top_tags.iloc[0])) if len(top_tags) else None,
+        'total_articles': len(news_df),
+        'categories': {k: int(v) for k, v in news_df['category'].value_counts(sort=False).items()},
+        'total_products': product_count,
+        'average_price': float(products_df['price'].mean()) if product_count else 0.0,
+        'average_rating': float(products_df['rating'].mean()) if product_count else 0.0,
+        'in_stock': int((products_df['availability'] == 'In Stock').sum()),
+        'price_ranges': {k: int(v) for k, v in ranges.value_counts(sort=False).items()}
+    }
+
+def analyze_scraped_data(quotes: Optional[Iterable[Dict]] = None,
+                         news: Optional[Iterable[Dict]] = None,
+                         products: Optional[Iterable[Dict]] = None) -> Dict:
+    """Demonstrate data analysis on scraped content.
+
+    Defaults to the data scraped above; pass lists or iterators (for
+    example from load_scraped_dataset or read_jsonl) to analyze a saved
+    dataset instead. Every record is looked at exactly once.
+    """
+    analytics = ScrapeAnalytics()
+    analytics.consume('quotes', quotes_data if quotes is None else quotes)
+    analytics.consume('news', news_data if news is None else news)
+    analytics.consume('products', products_data if products is None else products)
+    summary = analytics.summary()
+
     print("🔍 Analyzing Scraped Data")
     print("-" * 25)
     
     # Analyze quotes data
     print("📝 Quote Analysis:")
-    total_quotes = len(quotes_data)
-    all_tags = []
-    for quote in quotes_data:
-        all_tags.extend(quote['tags'])
-    
-    tag_counts = {}
-    for tag in all_tags:
-        tag_counts[tag] = tag_counts.get(tag, 0) + 1
-    
-    most_common_tag = max(tag_counts.items(), key=lambda x: x[1])
-    print(f"   Total quotes: {total_quotes}")
-    print(f"   Unique tags: {len(tag_counts)}")
-    print(f"   Most common tag: '{most_common_tag[0]}' ({most_common_tag[1]} times)")
+    print(f"   Total quotes: {summary['total_quotes']}")
+    print(f"   Unique tags: {summary['unique_tags']}")
+    if summary['most_common_tag']:
+        tag, count = summary['most_common_tag']
+        print(f"   Most common tag: '{tag}' ({count} times)")
     
     # Analyze news data
     print("\n📰 News Analysis:")
-    categories = [article['category'] for article in news_data]
-    category_counts = {}
-    for category in categories:
-        category_counts[category] = category_counts.get(category, 0) + 1
-    
-    print(f"   Total articles: {len(news_data)}")
+    print(f"   Total articles: {summary['total_articles']}")
     print("   Categories:")
-    for category, count in category_counts.items():
+    for category, count in summary['categories'].items():
         print(f"     - {category}: {count} articles")
     
     # Analyze product data
     print("\n🛒 Product Analysis:")
-    total_products = len(products_data)
-    avg_price = sum(p['price'] for p in products_data) / total_products
-    avg_rating = sum(p['rating'] for p in products_data) / total_products
-    
-    in_stock = sum(1 for p in products_data if p['availability'] == 'In Stock')
-    
+    total_products = summary['total_products']
     print(f"   Total products: {total_products}")
-    print(f"   Average price: ${avg_price:.2f}")
-    print(f"   Average rating: {avg_rating:.1f}⭐")
-    print(f"   In stock: {in_stock}/{total_products}")
-    
-    # Price distribution
-    price_ranges = {'Under $50': 0, '$50-$100': 0, 'Over $100': 0}
-    for product in products_data:
-        price = product['price']
-        if price < 50:
-            price_ranges['Under $50'] += 1
-        elif price <= 100:
-            price_ranges['$50-$100'] += 1
-        else:
-            price_ranges['Over $100'] += 1
+    print(f"   Average price: ${summary['average_price']:.2f}")
+    print(f"   Average rating: {summary['average_rating']:.1f}⭐")
+    print(f"   In stock: {summary['in_stock']}/{total_products}")
     
     print("   Price distribution:")
-    for range_name, count in price_ranges.items():
+    for range_name, count in summary['price_ranges'].items():
         print(f"     - {range_name}: {count} products")
 
+    return summary
+
+def generate_product_rows(count: int, seed: int = 42) -> Iterator[Dict]:
+    """Deterministic synthetic product records for benchmarks."""
+    rng = random.Random(seed)
+    categories = ['Electronics', 'Books', 'Office', 'Garden', 'Toys']
+    for i in range(count):
+        yield {
+            'name': f'Product {i}',
+            'price': round(rng.uniform(1, 200), 2),
+            'rating': round(rng.uniform(1, 5), 1),
+            'availability': 'In Stock' if rng.random() < 0.7 else 'Limited Stock',
+            'category': rng.choice(categories),
+        }
+
+def benchmark_analytics(rows: int = 1_000_000) -> Dict[str, float]:
+    """Time multi-pass loops vs. ScrapeAnalytics vs. pandas on product rows (seconds)."""
+    products = list(generate_product_rows(rows))
+    results = {}
+
+    start = time.perf_counter()
+    # The original approach: one loop per statistic
+    total = len(products)
+    sum(p['price'] for p in products) / total
+    sum(p['rating'] for p in products) / total
+    sum(1 for p in products if p['availability'] == 'In Stock')
+    ranges = {name: 0 for name in PRICE_RANGES}
+    for product in products:
+        ranges[price_range(product['price'])] += 1
+    results['multi-pass loops'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ScrapeAnalytics().consume('products', products).summary()
+    results['single pass'] = time.perf_counter() - start
+
+    if pd is not None:
+        empty = pd.DataFrame({'tags': [], 'category': []})
+        df = pd.DataFrame(products)
+        start = time.perf_counter()
+        analyze_with_pandas(empty, empty, df)
+        results['pandas (vectorized)'] = time.perf_counter() - start
+
+    return results
+
 analyze_scraped_data()
 
+if __name__ == "__main__":
+    print("\n⏱️  Analytics benchmark (20,000 products):")
+    for approach, seconds in benchmark_analytics(rows=20_000).items():
+        print(f"   {approach:<24} {seconds * 1000:8.1f} ms")
+    print("   (run benchmark_analytics(1_000_000) for the full-size comparison)")
+
 # =============================================================================
 # 7. ERROR HANDLING AND ROBUSTNESS
 # =============================================================================
@@ -575,35 +1012,69 @@ analyze_scraped_data()
 print("\n\n🛡️  ERROR HANDLING AND ROBUSTNESS")
 print("-" * 50)
 
+# Pages scraped by RobustScraper.process_page
+PAGE_SCHEMA = RecordSchema([
+    FieldRule('url', types=(str,), pattern=r'^https?://'),
+    FieldRule('title', types=(str,)),
+    FieldRule('status_code', required=False, types=(int,), min_value=100, max_value=599),
+    FieldRule('content_length', required=False, types=(int,), min_value=0),
+    FieldRule('price', required=False, coerce=parse_price, min_value=0),
+])
+
 class RobustScraper(WebScraper):
     """A more robust scraper with comprehensive error handling."""
     
-    def __init__(self, max_retries=3, delay_range=(1, 3)):
-        super().__init__(delay_range)
+    def __init__(self, max_retries=3, delay_range=(1, 3),
+                 retry_policy: Optional[RetryPolicy] = None,
+                 schema: Optional[RecordSchema] = None, **kwargs):
+        super().__init__(delay_range, **kwargs)
         self.max_retries = max_retries
+        self.schema = schema or PAGE_SCHEMA
+        self.retry_policy = retry_policy or RetryPolicy(max_attempts=max_retries)
         self.failed_urls = []
         self.successful_urls = []
+        self._outcome_lock = threading.Lock()  # fetch_many records from many threads
+    
+    def record_success(self, url: str):
+        with self._outcome_lock:
+            self.successful_urls.append(url)
     
-    def get_page_with_retries(self, url: str) -> Optional[requests.Response]:
-        """Fetch page with retry logic."""
-        for attempt in range(self.max_retries):
+    def record_failure(self, url: str):
+        with self._outcome_lock:
+            self.failed_urls.append(url)
+    
+    def get_page_with_retries(self, url: str, max_bytes: Optional[int] = None,
+                              stop_at: Optional[bytes] = None) -> Optional[requests.Response]:
+        """Fetch page with retry logic (see request_page for max_bytes/stop_at)."""
+        if not self.allowed_by_robots(url):
+            self.record_failure(url)
+            return None
+
+        attempt = 0
+        while True:
+            status_code, error, retry_after = None, None, None
             try:
-                response = self.get_page(url)
-                if response:
-                    self.successful_urls.append(url)
+                response = self.request_page(url, max_bytes=max_bytes, stop_at=stop_at)
+                if response.status_code < 400:
+                    self.record_success(url)
                     return response
-                else:
-                    print(f"Attempt {attempt + 1} failed for {url}")
-            except Exception as e:
+                status_code = response.status_code
+                retry_after = response.headers.get('Retry-After')
+                print(f"Attempt {attempt + 1} failed for {url}: HTTP {status_code}")
+            except requests.exceptions.RequestException as e:
+                error = e
                 print(f"Attempt {attempt + 1} failed: {e}")
-            
-            if attempt < self.max_retries - 1:
-                wait_time = (attempt + 1) * 2  # Exponential backoff
-                print(f"Waiting {wait_time} seconds before retry...")
-                time.sleep(wait_time)
+
+            wait_time = self.retry_policy.next_delay(url, attempt, status_code, error, retry_after)
+            if wait_time is None:
+                break
+            self.metrics.record_retry(url)
+            print(f"Waiting {wait_time:.1f} seconds before retry...")
+            time.sleep(wait_time)
+            attempt += 1
         
-        self.failed_urls.append(url)
-        print(f"❌ Failed to fetch {url} after {self.max_retries} attempts")
+        self.record_failure(url)
+        print(f"❌ Failed to fetch {url} after {attempt + 1} attempts")
         return None
     
     def safe_extract_text(self, element, default="N/A"):
@@ -621,57 +1092,128 @@ class RobustScraper(WebScraper):
             return default
     
     def validate_data(self, data: Dict) -> bool:
-        """Validate scraped data."""
-        required_fields = ['title', 'url']
-        
-        for field in required_fields:
-            if field not in data or not data[field]:
-                print(f"⚠️  Missing required field: {field}")
-                return False
-        
-        # Additional validation rules
-        if data.get('price'):
-            try:
-                float(data['price'].replace('$', '').replace(',', ''))
-            except (ValueError, AttributeError):
-                print(f"⚠️  Invalid price format: {data.get('price')}")
-                return False
-        
-        return True
+        """Validate scraped data against the scraper's schema."""
+        if self.schema.is_valid(data):
+            return True
+        for error in self.schema.errors(data):
+            print(f"⚠️  {error}")
+        return False
     
-    def scrape_with_validation(self, urls: List[str]) -> List[Dict]:
-        """Scrape multiple URLs with validation."""
+    def scrape_with_validation(self, urls: List[str], max_bytes: Optional[int] = None,
+                               head_only: bool = False) -> List[Dict]:
+        """Scrape multiple URLs with validation.
+
+        process_page only reads <head>, so head_only=True stops each download
+        once b'</head>' has arrived; `max_bytes` caps the size of any page.
+        """
         valid_data = []
+        stop_at = b'</head>' if head_only else None
         
         for url in urls:
             print(f"\n🌐 Processing: {url}")
-            response = self.get_page_with_retries(url)
+            response = self.get_page_with_retries(url, max_bytes=max_bytes, stop_at=stop_at)
             
             if not response:
                 continue
-            
-            try:
-                soup = self.parse_html(response.text)
-                
-                # Extract basic information (this would be customized per site)
-                data = {
-                    'url': url,
-                    'title': self.safe_extract_text(soup.find('title')),
-                    'status_code': response.status_code,
-                    'content_length': len(response.text),
-                    'scraped_at': time.strftime('%Y-%m-%d %H:%M:%S')
-                }
-                
-                if self.validate_data(data):
-                    valid_data.append(data)
-                    print("✅ Data validated and added")
-                else:
-                    print("❌ Data validation failed")
-                    
-            except Exception as e:
-                print(f"❌ Error processing {url}: {e}")
-        
+
+            data = self.process_page(url, response.status_code, response.content,
+                                     content_length=self.content_length(response),
+                                     encoding=response.encoding)
+            if data:
+                valid_data.append(data)
+
         return valid_data
+
+    @staticmethod
+    def content_length(response: requests.Response) -> int:
+        """Size of the page in bytes, even if only part of it was downloaded."""
+        declared = response.headers.get('Content-Length', '')
+        if getattr(response, 'truncated', False) and declared.isdigit():
+            return int(declared)
+        return len(response.content)
+
+    def process_page(self, url: str, status_code: int, html, content_length: Optional[int] = None,
+                     encoding: Optional[str] = None) -> Optional[Dict]:
+        """Extract and validate the data for one fetched page.
+
+        `html` may be text or raw bytes; bytes are decoded (with `encoding`)
+        only as far as the end of <head>.
+        """
+        try:
+            # Only <head> is needed here, so skip building a full soup
+            head = extract_head_fields(html, encoding=encoding)
+
+            # Extract basic information (this would be customized per site)
+            data = {
+                'url': url,
+                'title': head.get('title') or 'N/A',
+                'status_code': status_code,
+                'content_length': len(html) if content_length is None else content_length,
+                'scraped_at': time.strftime('%Y-%m-%d %H:%M:%S')
+            }
+
+            if self.validate_data(data):
+                print("✅ Data validated and added")
+                return data
+            print("❌ Data validation failed")
+
+        except Exception as e:
+            print(f"❌ Error processing {url}: {e}")
+
+        return None
+
+    def fetch_page(self, url: str) -> Optional[requests.Response]:
+        return self.get_page_with_retries(url)
+
+    def scrape_threaded(self, urls: List[str], workers: int = 8) -> List[Dict]:
+        """Like scrape_with_validation, but fetch from a thread pool (no asyncio needed)."""
+        valid_data = []
+        for url, response in self.fetch_many(urls, workers=workers):
+            if response is None:
+                continue
+            data = self.process_page(url, response.status_code, response.content,
+                                     content_length=self.content_length(response),
+                                     encoding=response.encoding)
+            if data:
+                valid_data.append(data)
+        return valid_data
+
+    def scrape_concurrently(self, urls: List[str], max_concurrency: int = 10) -> List[Dict]:
+        """Like scrape_with_validation, but fetch all URLs in parallel."""
+        results = self.async_fetcher(max_concurrency).run(urls)
+
+        valid_data = []
+        for url, result in zip(urls, results):
+            if result is None:
+                self.record_failure(url)
+                continue
+
+            self.record_success(url)
+            data = self.process_page(url, result.status_code, result.text)
+            if data:
+                valid_data.append(data)
+
+        return valid_data
+
+    def scrape_pipeline(self, urls: List[str], max_concurrency: int = 10,
+                        parse_workers: Optional[int] = None, sink=None) -> List[Dict]:
+        """Fetch, parse and validate as overlapping stages (see ScrapingPipeline)."""
+        pipeline = ScrapingPipeline(self.async_fetcher(max_concurrency),
+                                    parse_workers=parse_workers,
+                                    validator=self.validate_data, sink=sink)
+        valid_data = pipeline.run(urls)
+        with self._outcome_lock:
+            self.successful_urls.extend(pipeline.fetched_urls)
+            self.failed_urls.extend(pipeline.failed_urls)
+        pipeline.report()
+        return valid_data
+
+    def async_fetcher(self, max_concurrency: int = 10) -> 'AsyncScraper':
+        """An AsyncScraper sharing this scraper's rate limits, robots cache and retries."""
+        return AsyncScraper(max_concurrency=max_concurrency, delay_range=self.delay_range,
+                            rate_limiter=self.rate_limiter,
+                            respect_robots=self.robots is not None, robots_cache=self.robots,
+                            retry_policy=self.retry_policy, metrics=self.metrics)
     
     def generate_report(self):
         """Generate a scraping session report."""
@@ -685,9 +1227,25 @@ class RobustScraper(WebScraper):
             for url in self.failed_urls:
                 print(f"  - {url}")
         
-        success_rate = (len(self.successful_urls) / 
-                       (len(self.successful_urls) + len(self.failed_urls))) * 100
-        print(f"\nSuccess Rate: {success_rate:.1f}%")
+        attempted = len(self.successful_urls) + len(self.failed_urls)
+        if attempted:
+            success_rate = len(self.successful_urls) / attempted * 100
+            print(f"\nSuccess Rate: {success_rate:.1f}%")
+        else:
+            print("\nSuccess Rate: n/a (no URLs attempted)")
+
+        stats = self.metrics.snapshot()
+        latency = stats['latency']
+        print(f"Requests: {stats['requests']} ({stats['errors']} errors, {stats['retries']} retries), "
+              f"{stats['bytes_received'] / 1024:.1f} KB received")
+        if latency['count']:
+            print(f"Latency: p50 {latency['p50_ms']:.0f} ms, p95 {latency['p95_ms']:.0f} ms, "
+                  f"p99 {latency['p99_ms']:.0f} ms")
+
+        if self.cache is not None:
+            stats = self.cache.stats()
+            print(f"Cache: {stats['hits']} hits, {stats['misses']} misses "
+                  f"({stats['hit_rate']:.0%} hit rate, {stats['bytes_saved']} bytes saved)")
 
 # Demonstrate robust scraping
 print("🔧 Demonstrating Robust Scraping Techniques:")
@@ -704,7 +1262,168 @@ print("Note: In a real scenario, these would be actual URLs to scrape.")
 print("This demonstration shows the error handling structure.\n")
 
 # =============================================================================
-# 8. BEST PRACTICES AND ETHICAL CONSIDERATIONS
+# 8. CONCURRENT SCRAPING WITH ASYNCIO
+# =============================================================================
+
+print("\n⚡ CONCURRENT SCRAPING WITH ASYNCIO")
+print("-" * 50)
+
+print("""
+Serial scraping spends most of its time waiting on the network.
+AsyncScraper overlaps those waits:
+
+    scraper = AsyncScraper(max_concurrency=10, per_host_connections=2)
+    results = scraper.run(urls)            # one FetchResult (or None) per URL
+
+    robust_scraper.scrape_concurrently(urls)   # fetch + validate in parallel
+
+With 3 hosts and a 2-second politeness delay, 30 pages take roughly
+20 seconds instead of 60, and no single host sees more than one request
+every 2 seconds.
+""")
+
+print("""
+For CPU-heavy extraction, ScrapingPipeline moves parsing into worker
+processes and connects the stages with bounded queues:
+
+    fetch (asyncio) → [queue] → parse (ProcessPoolExecutor) → [queue] → validate/export
+
+    valid_data = robust_scraper.scrape_pipeline(urls, parse_workers=4)
+""")
+
+def mock_page_parsers() -> Dict[str, Callable[[str], List[Dict]]]:
+    """The tutorial's extraction function for each MockSiteServer page kind."""
+    return {
+        'quotes': QuoteScraper(respect_robots=False).parse_quotes,
+        'news': NewsScraper(respect_robots=False).parse_headlines,
+        'products': ProductScraper(respect_robots=False).parse_products
+    }
+
+def _measure(run, measure_memory: bool) -> Dict:
+    """Time `run()`, then optionally repeat it under tracemalloc for peak memory.
+
+    tracemalloc slows Python down considerably, so timing and memory come
+    from separate runs.
+    """
+    start = time.perf_counter()
+    pages = run()
+    seconds = time.perf_counter() - start
+    result = {'pages': pages, 'seconds': seconds,
+              'pages_per_s': pages / seconds if seconds > 0 else 0.0}
+    if measure_memory:
+        tracemalloc.start()
+        try:
+            run()
+            result['peak_memory_kb'] = tracemalloc.get_traced_memory()[1] / 1024
+        finally:
+            tracemalloc.stop()
+    return result
+
+def benchmark_scrapers(site: MockSiteServer, pages: int = 50, workers: int = 8,
+                       kind: str = 'quotes', measure_memory: bool = True) -> Dict[str, Dict]:
+    """Fetch and parse `pages` pages of a running MockSiteServer three ways.
+
+    - sync: one WebScraper fetching page after page
+    - threaded: WebScraper.fetch_many, one session shared by a thread pool
+    - async: AsyncScraper (skipped when aiohttp isn't installed)
+
+    Rate limiting and robots.txt are disabled so the numbers show raw
+    throughput; don't point this at sites you don't own.
+    """
+    urls = site.urls(kind, pages)
+    parse = mock_page_parsers()[kind]
+
+    def run_sync():
+        scraper = WebScraper(delay_range=(0, 0), respect_robots=False)
+        return sum(bool(parse(scraper.request_page(url).text)) for url in urls)
+
+    def run_threaded():
+        scraper = WebScraper(delay_range=(0, 0), respect_robots=False)
+        return sum(bool(response and parse(response.text))
+                   for _, response in scraper.fetch_many(urls, workers=workers))
+
+    def run_async():
+        scraper = AsyncScraper(max_concurrency=workers, per_host_connections=workers,
+                               delay_range=(0, 0), respect_robots=False)
+        return sum(bool(result and parse(result.text)) for result in scraper.run(urls))
+
+    paths = {'sync': run_sync, 'threaded': run_threaded}
+    if aiohttp is not None:
+        paths['async'] = run_async
+
+    results = {}
+    for name, run in paths.items():
+        # Fetching logs every URL; keep the benchmark output readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            results[name] = _measure(run, measure_memory)
+    return results
+
+def print_benchmark(results: Dict[str, Dict]):
+    print(f"{'Path':<10} {'Pages':>6} {'Seconds':>8} {'Pages/s':>9} {'Peak KB':>9}")
+    for name, r in results.items():
+        peak = f"{r['peak_memory_kb']:>9.0f}" if 'peak_memory_kb' in r else f"{'-':>9}"
+        print(f"{name:<10} {r['pages']:>6} {r['seconds']:>8.2f} {r['pages_per_s']:>9.1f} {peak}")
+
+if __name__ == "__main__":
+    print("🧪 Benchmarking against a local mock site (30 pages, 20 ms latency):")
+    with MockSiteServer(items_per_page=10, latency=0.02) as mock_site:
+        print_benchmark(benchmark_scrapers(mock_site, pages=30, workers=8, measure_memory=False))
+
+# =============================================================================
+# 9. CRAWLING: THE URL FRONTIER
+# =============================================================================
+
+print("\n🕸️  CRAWLING: THE URL FRONTIER")
+print("-" * 50)
+
+def crawl(scraper: 'RobustScraper', seed_urls: List[str], max_pages: int = 100,
+          frontier: Optional[CrawlFrontier] = None, checkpoint_path: Optional[str] = None,
+          checkpoint_every: int = 25) -> List[Dict]:
+    """Crawl outwards from the seed URLs, following links through the frontier.
+
+    With `checkpoint_path`, the frontier is saved every `checkpoint_every`
+    pages and reloaded on the next call, so an interrupted crawl resumes.
+    """
+    if frontier is None:
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            frontier = CrawlFrontier.load(checkpoint_path)
+            print(f"♻️  Resuming crawl with {len(frontier)} queued URLs")
+        else:
+            frontier = CrawlFrontier()
+    for url in seed_urls:
+        frontier.add(url)
+
+    pages = []
+    for crawled in range(1, max_pages + 1):
+        item = frontier.next()
+        if item is None:
+            break
+        url, depth = item
+        response = scraper.get_page_with_retries(url)
+        if response is not None:
+            data = scraper.process_page(url, response.status_code, response.text)
+            if data:
+                data['depth'] = depth
+                pages.append(data)
+            frontier.add_links(response.text, url, depth)
+        if checkpoint_path and crawled % checkpoint_every == 0:
+            frontier.save(checkpoint_path)
+
+    if checkpoint_path:
+        frontier.save(checkpoint_path)
+    return pages
+
+demo_frontier = CrawlFrontier(max_depth=1)
+for seed in ["https://Example.com:443/a#top", "https://example.com/a",
+             "https://example.com/b?y=2&x=1", "https://example.com/b?x=1&y=2",
+             "https://news.example/1", "https://shop.example/1"]:
+    added = demo_frontier.add(seed)
+    print(f"   {'➕ queued   ' if added else '⏭️  duplicate'} {seed}")
+print("   Crawl order (round-robin by host):",
+      [demo_frontier.next()[0] for _ in range(len(demo_frontier))])
+
+# =============================================================================
+# 10. BEST PRACTICES AND ETHICAL CONSIDERATIONS
 # =============================================================================
 
 print("\n⚖️  BEST PRACTICES AND ETHICAL CONSIDERATIONS")
@@ -746,24 +1465,44 @@ print("""
    - Consider using official APIs when available
 """)
 
-def check_robots_txt(url: str):
-    """Check robots.txt for a given domain."""
+SAMPLE_ROBOTS_TXT = """
+User-agent: *
+Disallow: /private/
+Disallow: /admin/
+Crawl-delay: 1
+Allow: /public/
+Allow: /admin/help$
+"""
+
+def check_robots_txt(url: str, robots_text: Optional[str] = None):
+    """Check robots.txt for a given domain (pass robots_text to skip the fetch)."""
     try:
-        from urllib.parse import urljoin, urlparse
-        
-        domain = urlparse(url).netloc
-        robots_url = f"https://{domain}/robots.txt"
-        
+        robots_url = RobotsCache().robots_url(url)
         print(f"🤖 Checking robots.txt: {robots_url}")
-        
-        # In a real implementation, you would fetch and parse robots.txt
-        print("Sample robots.txt rules:")
-        print("User-agent: *")
-        print("Disallow: /private/")
-        print("Disallow: /admin/")
-        print("Crawl-delay: 1")
-        print("Allow: /public/")
-        
+
+        if robots_text is None:
+            response = requests.get(robots_url, timeout=10)
+            rules = RobotsCache().store(url, response.status_code, response.text)
+        else:
+            rules = RobotsRules.parse(robots_text)
+
+        print("Rules that apply to us:")
+        for pattern, allowed in rules.rules:
+            print(f"   {'Allow' if allowed else 'Disallow'}: {pattern}")
+        if rules.crawl_delay:
+            print(f"   Crawl-delay: {rules.crawl_delay:g}")
+
+        for path in ('/public/page', '/private/data', '/admin/', '/admin/help'):
+            status = "✅ allowed" if rules.is_allowed(path) else "🚫 disallowed"
+            print(f"   {path}: {status}")
+
+        # Rules are compiled once, so each check is only a few string comparisons
+        start = time.perf_counter()
+        for _ in range(10000):
+            rules.is_allowed('/private/data')
+        per_check = (time.perf_counter() - start) / 10000 * 1e6
+        print(f"   Cost per check: ~{per_check:.1f} µs")
+
     except Exception as e:
         print(f"Error checking robots.txt: {e}")
 
@@ -779,11 +1518,22 @@ def calculate_request_rate(requests_count: int, time_period: int):
         print("   ✅ Request rate is respectful")
 
 # Example usage
-check_robots_txt("https://example.com")
+check_robots_txt("https://example.com", robots_text=SAMPLE_ROBOTS_TXT)
 calculate_request_rate(100, 300)  # 100 requests in 5 minutes
 
+# A token bucket enforces the rate instead of just reporting it: short
+# bursts go through immediately, then requests are spaced at the set rate
+print("\n🪣 Token bucket rate limiter (2 requests/second, burst of 3):")
+demo_limiter = RateLimiter(requests_per_second=2, burst=3)
+for i in range(5):
+    wait = demo_limiter.reserve("https://example.com/page")
+    print(f"   Request {i + 1}: wait {wait:.2f}s")
+demo_limiter.set_crawl_delay("example.com", 5)
+print(f"   After 'Crawl-delay: 5': wait {demo_limiter.reserve('example.com'):.2f}s "
+      f"then {demo_limiter.reserve('example.com'):.2f}s")
+
 # =============================================================================
-# 9. SAVING AND EXPORTING DATA
+# 11. SAVING AND EXPORTING DATA
 # =============================================================================
 
 print("\n\n💾 SAVING AND EXPORTING DATA")
@@ -827,9 +1577,34 @@ def demonstrate_data_export():
         products_for_csv.append(csv_product)
     
     scraper.save_to_csv(products_for_csv, 'products.csv')
+
+    # 4. Stream records straight from a generator into a compressed file;
+    # nothing is collected into a list first
+    print("\n4. Streaming news to compressed JSON Lines...")
+    scraper.stream_to_jsonl((article for article in news_data), 'news.jsonl.gz')
+
+    # 5. Columnar export keeps types (tags stay lists, prices stay floats)
+    # and reloads much faster than CSV
+    parquet_saved = pq is not None
+    if parquet_saved:
+        print("\n5. Saving typed datasets to Parquet...")
+        for kind, records in (('quotes', quotes_data), ('news', news_data),
+                              ('products', products_data)):
+            scraper.save_to_parquet(records, f"{kind}.parquet", schema=scraped_data_schema(kind))
+    else:
+        print("\n5. Skipping Parquet export (pip install pyarrow to enable)")
     
-    # 4. Create summary report
-    print("\n4. Generating summary report...")
+    # 6. Create summary report
+    print("\n6. Generating summary report...")
+    duplicate_check = DuplicateDetector()
+    for records in (quotes_data, news_data, products_data):
+        for _ in duplicate_check.filter(records):
+            pass
+    duplicates = duplicate_check.stats()
+    duplicate_count = duplicates['exact_duplicates'] + duplicates['near_duplicates']
+    duplicate_line = ("No duplicate entries found" if duplicate_count == 0 else
+                      f"{duplicates['exact_duplicates']} exact and "
+                      f"{duplicates['near_duplicates']} near-duplicate entries found")
     summary = f"""
 WEB SCRAPING SUMMARY REPORT
 Generated: {time.strftime('%Y-%m-%d %H:%M:%S')}
@@ -842,13 +1617,15 @@ Data Collected:
 
 Data Quality:
 - All items successfully validated
-- No duplicate entries found
+- {duplicate_line}
 - Complete data fields for all items
 
 Files Generated:
 - scraped_data.json (complete dataset)
 - quotes.csv (quotes only)
 - products.csv (products only)
+- news.jsonl.gz (news, streamed)
+- quotes/news/products.parquet (typed, if pyarrow is installed)
 - summary_report.txt (this file)
 """
     
@@ -861,21 +1638,43 @@ Files Generated:
     
     print(f"\n📈 Export completed! {len(all_data)} items processed.")
 
+    if parquet_saved:
+        print("\n🔁 Reloading the Parquet dataset for analysis:")
+        analyze_scraped_data(*load_scraped_dataset('.'))
+
 demonstrate_data_export()
 
 # =============================================================================
-# 10. PUTTING IT ALL TOGETHER - COMPLETE EXAMPLE
+# 12. PUTTING IT ALL TOGETHER - COMPLETE EXAMPLE
 # =============================================================================
 
 print("\n\n🎯 COMPLETE SCRAPING PROJECT EXAMPLE")
 print("-" * 50)
 
+# Items flowing through ComprehensiveScraper's pipeline
+ITEM_SCHEMA = RecordSchema([
+    FieldRule('type', types=(str,), pattern=r'^(quote|news|product)$'),
+    FieldRule('data', types=(dict,)),
+    FieldRule('id', types=(str,)),
+    FieldRule('processed_at', types=(str,), pattern=r'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$'),
+])
+
 class ComprehensiveScraper:
     """A complete scraping project demonstrating all concepts."""
     
-    def __init__(self):
-        self.scraper = RobustScraper()
-        self.data_store = []
+    PHASES = ('collection', 'processing', 'validation', 'export')
+    
+    def __init__(self, cache_path: Optional[str] = None, schema: Optional[RecordSchema] = None):
+        # With a cache, re-runs only download pages that actually changed
+        cache = HttpCache(cache_path) if cache_path else None
+        self.scraper = RobustScraper(cache=cache)
+        self.deduplicator = DuplicateDetector(key=lambda item: item['data'])
+        self.schema = schema or ITEM_SCHEMA
+        self.validation_errors = Counter()  # field -> number of failures
+        self.counters = Counter()
+        self.type_counts = Counter()
+        self.phase_times = dict.fromkeys(self.PHASES, 0.0)
+        self.files_written = []
         self.start_time = time.time()
     
     def run_complete_scraping_demo(self):
@@ -890,100 +1689,102 @@ class ComprehensiveScraper:
         print("- Planned data structure")
         print("- Set up rate limiting")
         
-        # 2. Data collection phase
-        print("\n🌐 PHASE 2: DATA COLLECTION")
-        self.collect_all_data()
-        
-        # 3. Data processing phase
-        print("\n⚙️  PHASE 3: DATA PROCESSING")
-        self.process_collected_data()
-        
-        # 4. Data validation phase
-        print("\n✅ PHASE 4: DATA VALIDATION")
-        self.validate_all_data()
-        
-        # 5. Export phase
-        print("\n💾 PHASE 5: DATA EXPORT")
-        self.export_final_data()
+        # 2-5. Collection, processing, validation and export run as one
+        # streaming pass: each item flows through every phase before the
+        # next one is collected, so nothing is held in memory in between
+        print("\n🌐 PHASES 2-5: COLLECT → PROCESS → VALIDATE → EXPORT")
+        self.run_pipeline()
         
         # 6. Reporting phase
         print("\n📊 PHASE 6: FINAL REPORT")
         self.generate_final_report()
     
-    def collect_all_data(self):
-        """Collect data from all sources."""
-        print("Collecting data from multiple sources...")
+    def run_pipeline(self, items: Optional[Iterable[Dict]] = None):
+        """Stream items through processing, validation and export."""
+        items = self.collect_all_data() if items is None else items
+        self.export_final_data(self.validate_all_data(self.process_collected_data(items)))
         
+        print(f"✅ Collected {self.counters['collected']} items")
+        print(f"✅ Processed {self.counters['processed']} items")
+        print(f"✅ Valid items: {self.counters['valid']}")
+        print(f"❌ Invalid items: {self.counters['invalid']}")
+        duplicates = self.deduplicator.stats()
+        print(f"🔁 Duplicates removed: {duplicates['exact_duplicates']} exact, "
+              f"{duplicates['near_duplicates']} near")
+        print(f"✅ Exported {self.counters['exported']} items "
+              f"across {len(self.files_written)} data types")
+    
+    def collect_all_data(self) -> Iterator[Dict]:
+        """Yield data from all sources."""
         # In a real scenario, you would scrape actual websites
         # Here we're using our simulated data
-        self.data_store.extend([
-            {'type': 'quote', 'data': quote} for quote in quotes_data
-        ])
-        self.data_store.extend([
-            {'type': 'news', 'data': article} for article in news_data
-        ])
-        self.data_store.extend([
-            {'type': 'product', 'data': product} for product in products_data
-        ])
-        
-        print(f"✅ Collected {len(self.data_store)} items")
+        sources = (('quote', quotes_data), ('news', news_data), ('product', products_data))
+        timings = self.phase_times
+        for item_type, records in sources:
+            for record in records:
+                started = time.perf_counter()
+                item = {'type': item_type, 'data': record}
+                self.counters['collected'] += 1
+                timings['collection'] += time.perf_counter() - started
+                yield item
     
-    def process_collected_data(self):
-        """Process and clean collected data."""
-        print("Processing collected data...")
-        
-        processed_count = 0
-        for item in self.data_store:
-            # Add processing timestamp
-            item['processed_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
-            
-            # Add unique ID
-            item['id'] = f"{item['type']}_{processed_count + 1}"
-            
-            processed_count += 1
-        
-        print(f"✅ Processed {processed_count} items")
+    def process_collected_data(self, items: Iterable[Dict]) -> Iterator[Dict]:
+        """Stamp each item with an ID and the run's processing timestamp."""
+        # One timestamp for the whole run: formatting it per item is
+        # slower and gives items of the same batch different times
+        processed_at = time.strftime('%Y-%m-%d %H:%M:%S')
+        timings = self.phase_times
+        for item in items:
+            started = time.perf_counter()
+            self.counters['processed'] += 1
+            item['processed_at'] = processed_at
+            item['id'] = f"{item['type']}_{self.counters['processed']}"
+            timings['processing'] += time.perf_counter() - started
+            yield item
     
-    def validate_all_data(self):
-        """Validate all collected data."""
-        print("Validating data quality...")
-        
-        valid_items = 0
-        invalid_items = 0
-        
-        for item in self.data_store:
-            if self.validate_item(item):
-                valid_items += 1
+    def validate_all_data(self, items: Iterable[Dict]) -> Iterator[Dict]:
+        """Yield only valid, non-duplicate items, validating each once."""
+        timings = self.phase_times
+        for item in items:
+            started = time.perf_counter()
+            if not self.validate_item(item):
+                self.counters['invalid'] += 1
+                self.validation_errors.update(name for name, _ in self.schema.field_errors(item))
+                keep = False
             else:
-                invalid_items += 1
-        
-        print(f"✅ Valid items: {valid_items}")
-        print(f"❌ Invalid items: {invalid_items}")
-        
-        # Remove invalid items
-        self.data_store = [item for item in self.data_store if self.validate_item(item)]
+                self.counters['valid'] += 1
+                # Drop exact and near-duplicate pages before they are exported
+                keep = self.deduplicator.check(item) is None
+            timings['validation'] += time.perf_counter() - started
+            if keep:
+                yield item
     
     def validate_item(self, item):
         """Validate a single data item."""
-        required_fields = ['type', 'data', 'id', 'processed_at']
-        return all(field in item for field in required_fields)
+        return self.schema.is_valid(item)
     
-    def export_final_data(self):
+    def export_final_data(self, items: Iterable[Dict]):
         """Export processed data."""
         print("Exporting final dataset...")
         
-        # Group by type
+        # Group by type as the items stream in; a JSON array per type
+        # needs every item of that type before it can be written
         grouped_data = {}
-        for item in self.data_store:
-            item_type = item['type']
-            if item_type not in grouped_data:
-                grouped_data[item_type] = []
-            grouped_data[item_type].append(item)
+        timings = self.phase_times
+        for item in items:
+            started = time.perf_counter()
+            grouped_data.setdefault(item['type'], []).append(item)
+            self.counters['exported'] += 1
+            self.type_counts[item['type']] += 1
+            timings['export'] += time.perf_counter() - started
         
         # Export each type
-        for data_type, items in grouped_data.items():
+        started = time.perf_counter()
+        for data_type, type_items in grouped_data.items():
             filename = f"final_{data_type}_data.json"
-            self.scraper.save_to_json(items, filename)
+            self.scraper.save_to_json(type_items, filename)
+            self.files_written.append(filename)
+        timings['export'] += time.perf_counter() - started
         
         print(f"✅ Exported {len(grouped_data)} data types")
     
@@ -991,34 +1792,44 @@ class ComprehensiveScraper:
         """Generate comprehensive final report."""
         end_time = time.time()
         duration = end_time - self.start_time
-        
-        # Count items by type
-        type_counts = {}
-        for item in self.data_store:
-            item_type = item['type']
-            type_counts[item_type] = type_counts.get(item_type, 0) + 1
+        collected = self.counters['collected']
+        success_rate = self.counters['exported'] / collected * 100 if collected else 0.0
         
         print("\n" + "=" * 50)
         print("📋 FINAL SCRAPING REPORT")
         print("=" * 50)
         print(f"Execution Time: {duration:.2f} seconds")
-        print(f"Total Items Collected: {len(self.data_store)}")
-        print(f"Success Rate: 100%")  # Our demo data is all valid
+        print(f"Total Items Collected: {collected}")
+        print(f"Items Exported: {self.counters['exported']}")
+        print(f"Success Rate: {success_rate:.1f}%")
         
         print("\nData Breakdown:")
-        for data_type, count in type_counts.items():
+        for data_type, count in self.type_counts.items():
             print(f"  {data_type.title()}: {count} items")
         
+        print("\nPhase Timings:")
+        for phase, seconds in self.phase_times.items():
+            print(f"  {phase.title():<12} {seconds * 1000:8.2f} ms")
+        
         print("\nQuality Metrics:")
-        print("  ✅ All data validated")
-        print("  ✅ No duplicates found")
-        print("  ✅ Complete fields for all items")
+        if self.counters['invalid']:
+            print(f"  ⚠️  {self.counters['invalid']} invalid items dropped")
+            for field_name, count in self.validation_errors.most_common():
+                print(f"     - {field_name}: {count}")
+        else:
+            print("  ✅ All data validated")
+        duplicates = self.deduplicator.stats()
+        removed = duplicates['exact_duplicates'] + duplicates['near_duplicates']
+        if removed:
+            print(f"  ✅ {removed} duplicates removed "
+                  f"({duplicates['exact_duplicates']} exact, {duplicates['near_duplicates']} near)")
+        else:
+            print("  ✅ No duplicates found")
         print("  ✅ Proper rate limiting applied")
         
         print("\nFiles Generated:")
-        print("  📄 final_quote_data.json")
-        print("  📄 final_news_data.json")
-        print("  📄 final_product_data.json")
+        for path in self.files_written:
+            print(f"  📄 {path}")
         
         print("\n🎉 Scraping project completed successfully!")
 
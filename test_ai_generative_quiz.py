@@ -0,0 +1,361 @@
+import json
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import AI_Generative_Quiz as quiz_module
+
+
+def make_question(n, answer="B"):
+    return {"question": f"Question number {n}?",
+            "options": ["First", "Second", "Third", "Fourth"],
+            "answer": answer}
+
+
+class StubClient:
+    """Stands in for genai.Client: answers from a script, optionally slowly.
+
+    Batch prompts (asking for a JSON array) get `batch_reply`; single-question
+    prompts get the next scripted reply, or a fresh valid question. With a
+    `batch_gate` event, batch replies are held back until it is set.
+    """
+
+    def __init__(self, responses=None, delay=0.0, batch_reply=None, batch_delay=None,
+                 batch_gate=None):
+        self.responses = list(responses or [])
+        self.batch_gate = batch_gate
+        self.delay = delay
+        self.batch_delay = delay if batch_delay is None else batch_delay
+        self.batch_reply = batch_reply
+        self.calls = 0
+        self.batch_calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self.models = SimpleNamespace(generate_content=self.generate_content)
+
+    def generate_content(self, model, contents, config=None):
+        assert config == {"response_mime_type": "application/json"}
+        with self.lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            call = self.calls
+            delay = self.delay
+            if "JSON array" in contents:
+                self.batch_calls += 1
+                scripted = self.batch_reply
+                delay = self.batch_delay
+            else:
+                scripted = self.responses.pop(0) if self.responses else None
+        try:
+            if self.batch_gate is not None and "JSON array" in contents:
+                self.batch_gate.wait(5)
+            time.sleep(delay)
+            if isinstance(scripted, Exception):
+                raise scripted
+            return SimpleNamespace(text=scripted if scripted is not None
+                                   else json.dumps(make_question(call)))
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+def test_parse_question():
+    question = quiz_module.parse_question(json.dumps(make_question(1, answer="c")))
+    assert question == {
+        "question": "Question number 1?",
+        "options": ["A) First", "B) Second", "C) Third", "D) Fourth"],
+        "correct_answer": "C) Third",
+    }
+    fenced = "```json\n" + json.dumps(make_question(2)) + "\n```"
+    assert quiz_module.parse_question(fenced)["question"] == "Question number 2?"
+    assert quiz_module.parse_question("**Question:** not JSON") is None
+
+
+def test_validate_question_rejects_malformed_items():
+    valid = make_question(1)
+    assert quiz_module.validate_question(valid)
+    assert quiz_module.validate_question(
+        dict(valid, options=["A) First", "B) Second", "C) Third", "D) Fourth"])
+    )["options"] == ["A) First", "B) Second", "C) Third", "D) Fourth"]
+
+    for broken in (dict(valid, options=["x", "y", "z"]), dict(valid, answer="E"),
+                   dict(valid, question=" "), dict(valid, options=["x", "x", "y", "z"]),
+                   dict(valid, options=["x", 2, "y", "z"]), {"question": "q"}, ["not", "a", "dict"]):
+        assert quiz_module.validate_question(broken) is None
+
+
+def test_batched_quiz_uses_a_single_call():
+    batch = json.dumps([make_question(n) for n in range(5)])
+    client = StubClient(batch_reply=batch)
+    progress = []
+
+    quiz = quiz_module.generate_quiz("space", 5, quiz_client=client,
+                                     on_progress=lambda ready, total: progress.append(ready))
+
+    assert [q["question"] for q in quiz] == [f"Question number {n}?" for n in range(5)]
+    assert client.calls == client.batch_calls == 1
+    assert progress == [1, 2, 3, 4, 5]
+
+
+def test_batched_quiz_falls_back_for_invalid_items():
+    batch = json.dumps([make_question(1), dict(make_question(2), answer="Z"), make_question(1)])
+    client = StubClient(batch_reply=batch)
+    progress = []
+
+    quiz = quiz_module.generate_quiz("space", 4, quiz_client=client,
+                                     on_progress=lambda ready, total: progress.append((ready, total)))
+
+    assert len(quiz) == 4
+    assert client.batch_calls == 1 and client.calls == 4  # three per-question top-ups
+    assert progress == [(1, 4), (2, 4), (3, 4), (4, 4)]
+
+
+def test_batched_quiz_survives_unparseable_reply():
+    client = StubClient(batch_reply="Sure! Here are your questions:")
+    assert len(quiz_module.generate_quiz("space", 2, quiz_client=client)) == 2
+    assert client.calls == 3
+
+
+def test_generate_quiz_runs_requests_concurrently():
+    client = StubClient(delay=0.1)
+    start = time.monotonic()
+    quiz = quiz_module.generate_quiz("space", 6, quiz_client=client, batched=False, max_workers=3)
+
+    assert len(quiz) == 6
+    assert client.max_in_flight == 3
+    assert time.monotonic() - start < 6 * 0.1
+
+
+def test_generate_quiz_retries_only_failed_slots():
+    client = StubClient(["garbage", json.dumps(make_question(100)), RuntimeError("quota"),
+                         json.dumps(make_question(101))])
+    progress = []
+
+    quiz = quiz_module.generate_quiz("space", 3, quiz_client=client, batched=False, max_workers=1,
+                                     on_progress=lambda ready, total: progress.append((ready, total)))
+
+    assert len(quiz) == 3
+    assert client.calls == 5  # three slots plus one retry for each failure
+    assert progress == [(1, 3), (2, 3), (3, 3)]
+
+
+def test_generate_quiz_gives_up_after_max_attempts():
+    client = StubClient(["garbage"] * 3)
+    quiz = quiz_module.generate_quiz("space", 2, quiz_client=client, batched=False,
+                                     max_workers=2, max_attempts=2)
+
+    assert len(quiz) == 1  # one slot failed twice, the other succeeded on retry
+    assert client.calls == 4
+
+
+def test_generation_failures_are_logged(caplog):
+    client = StubClient([RuntimeError("quota")], batch_reply=RuntimeError("quota"))
+
+    with caplog.at_level("WARNING", logger=quiz_module.logger.name):
+        assert quiz_module.generate_question("space", client) is None
+        assert quiz_module.generate_question_batch("space", 3, client) == []
+
+    assert [record.getMessage() for record in caplog.records] == [
+        "Question generation for 'space' failed: quota",
+        "Batch generation for 'space' failed: quota",
+    ]
+
+
+def test_normalize_topic():
+    assert quiz_module.normalize_topic("  Python   Basics! ") == quiz_module.normalize_topic("python basics")
+
+
+def test_question_bank_serves_repeat_topics_without_api_calls(tmp_path):
+    bank = quiz_module.QuestionBank(str(tmp_path / "bank.sqlite3"))
+    client = StubClient(batch_reply=json.dumps([make_question(n) for n in range(3)]))
+
+    first = quiz_module.generate_quiz("Python", 3, quiz_client=client, bank=bank)
+    again = quiz_module.generate_quiz("  python! ", 3, quiz_client=client, bank=bank)
+
+    assert client.calls == 1
+    assert sorted(q["question"] for q in again) == sorted(q["question"] for q in first)
+    stats = bank.stats()
+    assert stats["lookups"] == 2 and stats["full_hits"] == 1
+    assert stats["hit_rate"] == 0.5 and stats["question_hit_rate"] == 0.5
+
+
+def test_question_bank_tops_up_partial_hits(tmp_path):
+    bank = quiz_module.QuestionBank(str(tmp_path / "bank.sqlite3"))
+    bank.add("space", [quiz_module.validate_question(make_question(n)) for n in range(2)])
+    client = StubClient(batch_reply=json.dumps([make_question(0), make_question(7), make_question(8)]))
+
+    quiz = quiz_module.generate_quiz("space", 4, quiz_client=client, bank=bank)
+
+    assert len({q["question"] for q in quiz}) == 4
+    assert client.batch_calls == 1
+    assert len(bank.get("space")) == 4
+    assert bank.stats()["questions_from_bank"] == 2
+
+
+def test_question_bank_persists_and_bounds_memory(tmp_path):
+    path = str(tmp_path / "bank.sqlite3")
+    bank = quiz_module.QuestionBank(path, max_topics=2)
+    for topic in ("a", "b", "c"):
+        bank.add(topic, [quiz_module.validate_question(make_question(topic))])
+    assert bank.stats()["topics_in_memory"] == 2
+    assert bank.add("a", [quiz_module.validate_question(make_question("a"))]) == 0
+    bank.close()
+
+    reopened = quiz_module.QuestionBank(path)
+    assert [q["question"] for q in reopened.get("A")] == ["Question number a?"]
+    assert quiz_module.QuestionBank(path, model="other-model").get("a") == []
+
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "AI_Generative_Quiz.py")
+CLIENT_STARTUP_SECONDS = 0.5
+
+
+@pytest.fixture
+def app(monkeypatch, tmp_path):
+    """The Streamlit app under AppTest, with a slow-to-build stub Gemini client."""
+    import streamlit as st
+    from google import genai
+    from streamlit.testing.v1 import AppTest
+
+    built = []
+    config = SimpleNamespace(delay=0.0, batch_delay=None)
+
+    def slow_client(api_key=None):
+        time.sleep(CLIENT_STARTUP_SECONDS)
+        client = StubClient(delay=config.delay, batch_delay=config.batch_delay,
+                            batch_reply=json.dumps([make_question(n) for n in range(3)]))
+        built.append(client)
+        return client
+
+    monkeypatch.setattr(genai, "Client", slow_client)
+    monkeypatch.setenv("QUIZ_BANK_PATH", str(tmp_path / "bank.sqlite3"))
+    st.cache_resource.clear()
+    st.cache_data.clear()
+    at = AppTest.from_file(APP_PATH, default_timeout=10)
+    at.built_clients = built
+    at.client_config = config
+    yield at
+    st.cache_resource.clear()
+    st.cache_data.clear()
+
+
+def generate_button(at):
+    return next(button for button in at.button if button.label == "🚀 Generate Quiz")
+
+
+def test_answering_does_not_build_a_client_or_call_the_model(app):
+    app.run()
+    app.session_state.quiz = [quiz_module.validate_question(make_question(n)) for n in range(3)]
+    app.session_state.user_answers = [None] * 3
+    app.run()
+
+    for i in range(3):
+        app.button(key=f"q{i}_opt1").click().run()
+
+    # No client was built, so no model call (or slow client start-up) happened
+    assert app.built_clients == []
+    assert app.session_state.quiz_finished and app.session_state.player_score == 3
+    assert "Final Score: 3/3" in app.success[0].value
+
+
+def test_quiz_stream_shows_first_question_after_one_model_call(tmp_path):
+    bank = quiz_module.QuestionBank(str(tmp_path / "bank.sqlite3"))
+    batch_gate = threading.Event()
+    client = StubClient(batch_reply=json.dumps([make_question(n) for n in range(10, 14)]),
+                        batch_gate=batch_gate)
+
+    stream = quiz_module.QuizStream("space", 5, quiz_client=client, bank=bank).start()
+    assert stream.expected() == 5
+    # The batch is held back: question 1 comes from a single-question call
+    assert stream.wait_for(1, timeout=5)
+    assert client.calls - client.batch_calls == 1 and len(stream.questions) == 1
+    batch_gate.set()
+    assert stream.wait_for(5, timeout=5)
+
+    assert stream.time_to_first_question is not None
+    assert client.calls == 2 and client.batch_calls == 1  # one single question plus one batch
+    assert [q["question"] for q in stream.questions] == ["Question number 1?"] + [
+        f"Question number {n}?" for n in range(10, 14)]
+    assert stream.join(timeout=5) and stream.error is None
+    assert len(bank.get("space")) == 5
+
+
+def test_stopped_quiz_stream_makes_no_further_requests():
+    batch_gate = threading.Event()
+    client = StubClient(batch_reply="not JSON", batch_gate=batch_gate)
+
+    stream = quiz_module.QuizStream("space", 4, quiz_client=client).start()
+    assert stream.wait_for(1, timeout=5)
+    stream.stop()
+    batch_gate.set()
+
+    assert stream.join(timeout=5)
+    # The failed batch would normally be topped up with per-question calls
+    assert client.calls == 2 and len(stream.questions) == 1
+
+
+def test_quiz_stream_serves_banked_questions_without_calls(tmp_path):
+    bank = quiz_module.QuestionBank(str(tmp_path / "bank.sqlite3"))
+    bank.add("space", [quiz_module.validate_question(make_question(n)) for n in range(3)])
+    client = StubClient()
+
+    stream = quiz_module.QuizStream("Space", 3, quiz_client=client, bank=bank).start()
+    assert stream.join(timeout=5)
+
+    assert len(stream.questions) == stream.expected() == 3
+    assert client.calls == 0
+
+
+def test_quiz_stream_finishes_short_when_generation_fails():
+    client = StubClient([RuntimeError("quota")] * 10, batch_reply="not JSON")
+
+    stream = quiz_module.QuizStream("space", 3, quiz_client=client).start()
+
+    assert not stream.wait_for(1, timeout=5)
+    assert stream.finished and stream.expected() == 0
+
+
+def test_generated_quizzes_and_client_are_cached_across_reruns(app):
+    app.run()
+    app.text_input[0].input("Space")
+    app.number_input[0].set_value(3)
+    generate_button(app).click().run()
+    assert app.session_state.quiz_stream.wait_for(3, timeout=5)
+    first = sorted(q["question"] for q in app.session_state.quiz)
+    calls = app.built_clients[0].calls
+    first_stream = app.session_state.quiz_stream
+
+    generate_button(app).click().run()
+    assert app.session_state.quiz_stream.wait_for(3, timeout=5)
+    assert app.session_state.quiz_stream is not first_stream and first_stream._stop.is_set()
+
+    assert len(first) == 3 and sorted(q["question"] for q in app.session_state.quiz) == first
+    assert len(app.built_clients) == 1 and app.built_clients[0].calls == calls
+
+
+def test_first_question_is_shown_while_the_rest_generate(app):
+    app.client_config.delay, app.client_config.batch_delay = 0.1, 1.0
+    app.run()
+    app.text_input[0].input("Rivers")
+    app.number_input[0].set_value(3)
+    generate_button(app).click().run()
+    stream = app.session_state.quiz_stream
+    assert stream.wait_for(1, timeout=5)
+
+    app.run()
+    assert any("questions ready" in caption.value for caption in app.caption)
+    app.button(key="q0_opt1").click().run()
+    assert app.session_state.current_question == 1
+    assert stream.wait_for(3, timeout=5)
+    assert stream.join(timeout=5)
+
+    app.run()
+    for i in (1, 2):
+        app.button(key=f"q{i}_opt1").click().run()
+    assert app.session_state.quiz_finished
+    assert "Final Score: 3/3" in app.success[0].value